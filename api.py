@@ -0,0 +1,245 @@
+# API HTTP com os resultados ponderados do dashboard, para relatórios
+# automáticos que hoje precisariam passar pelo layout e pelos callbacks do Dash.
+#
+#   GET  /api/freq?col=<coluna>[&col=<coluna>...]&filters=<json>&onda=<onda>&format=json|csv
+#   GET  /api/crosstab?index=<coluna>&columns=<coluna>&filters=<json>&onda=<onda>&format=json|csv
+#   POST /api/batch  {"filters": {...}, "onda": ..., "freq": [colunas], "crosstab": [[index, columns], ...]}
+#   GET  /api/colunas?onda=<onda>
+#
+# `filters` segue o formato do dcc.Store dos filtros ({"cidade": ["Aracaju"], ...}).
+# Cada percentual vem com o erro padrão (pontos percentuais) e o intervalo de
+# confiança de 95%; as frequências trazem também o tamanho efetivo de amostra (Kish).
+# Os erros são analíticos por padrão; o parâmetro variancia=bootstrap em
+# /freq e /crosstab (ou "variancia": "bootstrap" no /batch) usa os pesos replicados.
+# As respostas são geradas em partes (streaming). As rotas GET levam um ETag
+# derivado da versão dos dados e dos parâmetros, então um GET condicional
+# (If-None-Match) com os dados inalterados responde 304 sem refazer as agregações.
+import csv
+import hashlib
+import io
+import json
+
+import flask
+
+from result_cache import chave_filtros
+
+CAMPOS_FREQUENCIA = ['percentual', 'erro_padrao', 'ic_inferior', 'ic_superior', 'n_efetivo']
+
+
+class ErroApi(Exception):
+    def __init__(self, mensagem, status=400):
+        super().__init__(mensagem)
+        self.status = status
+
+
+# Função para verificar se um valor do pedido é uma lista de textos
+def _lista_de_textos(valores):
+    return isinstance(valores, list) and all(isinstance(valor, str) for valor in valores)
+
+
+# Função para criar o blueprint da API.
+#   visao(filtros, onda) -> dados filtrados da onda
+#   dimensoes -> filtros aceitos em `filters` (os mesmos do dcc.Store dos filtros)
+#   assinatura(onda) -> identificação do conteúdo da onda (entra no ETag)
+#   ondas() -> nomes das ondas disponíveis; onda_padrao é usada quando não informada
+#   percentual(df, coluna) -> tabela com percentual, erro_padrao, ic_inferior, ic_superior e n_efetivo
+#   crosstab(df, index, columns) e crosstab_erros(df, index, columns) -> percentuais e erros padrão
+#   percentual_bootstrap e crosstab_bootstrap -> o mesmo que percentual e crosstab_erros, com bootstrap
+def criar_api(visao, dimensoes, assinatura, ondas, onda_padrao, percentual, crosstab, crosstab_erros,
+              percentual_bootstrap=None, crosstab_bootstrap=None):
+    api = flask.Blueprint('api', __name__, url_prefix='/api')
+    dimensoes = set(dimensoes)
+
+    @api.errorhandler(ErroApi)
+    def erro_api(erro):
+        return flask.jsonify({'erro': str(erro)}), erro.status
+
+    def ler_filtros(texto):
+        if not texto:
+            return {}
+        try:
+            filtros = json.loads(texto)
+        except ValueError:
+            raise ErroApi('filters deve ser um objeto JSON')
+        if not isinstance(filtros, dict):
+            raise ErroApi('filters deve ser um objeto JSON')
+        desconhecidos = [filtro for filtro in filtros if filtro not in dimensoes]
+        if desconhecidos:
+            raise ErroApi(f'Filtros desconhecidos: {", ".join(desconhecidos)}')
+        if not all(_lista_de_textos(valores) for valores in filtros.values()):
+            raise ErroApi('filters deve mapear cada filtro para uma lista de textos')
+        return filtros
+
+    def ler_onda(onda):
+        onda = onda or onda_padrao
+        if onda not in ondas():
+            raise ErroApi(f'Onda desconhecida: {onda}', 404)
+        return onda
+
+    # Funções de percentual e de erros do crosstab para o tipo de variância pedido
+    def ler_variancia(variancia):
+        variancia = variancia or 'analitica'
+        if variancia == 'analitica':
+            return percentual, crosstab_erros
+        if variancia == 'bootstrap' and percentual_bootstrap is not None:
+            return percentual_bootstrap, crosstab_bootstrap
+        raise ErroApi('variancia deve ser analitica ou bootstrap')
+
+    def verificar_colunas(df, colunas):
+        faltando = [c for c in colunas if c not in df.columns]
+        if faltando:
+            raise ErroApi(f'Colunas não encontradas: {", ".join(faltando)}', 404)
+
+    # ETag: versão dos dados da onda + consulta canônica (sem depender da ordem dos parâmetros)
+    def calcular_etag(onda, consulta):
+        texto = json.dumps([assinatura(onda), consulta], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha1(texto.encode('utf-8')).hexdigest()
+
+    # Resposta em partes com ETag; 304 quando o cliente já tem a mesma versão
+    def responder(onda, consulta, formato, gerar_json, gerar_csv):
+        if formato not in ('json', 'csv'):
+            raise ErroApi('format deve ser json ou csv')
+        etag = calcular_etag(onda, dict(consulta, formato=formato))
+        if flask.request.if_none_match.contains(etag):
+            resposta = flask.Response(status=304)
+        elif formato == 'csv':
+            resposta = flask.Response(flask.stream_with_context(gerar_csv()), mimetype='text/csv')
+        else:
+            resposta = flask.Response(flask.stream_with_context(gerar_json()), mimetype='application/json')
+        resposta.set_etag(etag)
+        resposta.headers['Cache-Control'] = 'no-cache'
+        return resposta
+
+    # Linhas CSV de uma sequência de listas, em blocos
+    def linhas_csv(cabecalho, linhas, tamanho_bloco=500):
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer, delimiter=';')
+        escritor.writerow(cabecalho)
+        for i, linha in enumerate(linhas, 1):
+            escritor.writerow(linha)
+            if i % tamanho_bloco == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    def numero(valor):
+        return None if valor != valor else float(valor)
+
+    def frequencia_json(tabela):
+        return [{'valor': valor, **{campo: numero(linha[campo]) for campo in CAMPOS_FREQUENCIA}}
+                for valor, linha in tabela.iterrows()]
+
+    def linhas_frequencia(coluna, tabela):
+        return ([coluna, valor] + [linha[campo] for campo in CAMPOS_FREQUENCIA] for valor, linha in tabela.iterrows())
+
+    def crosstab_json(tabela, erros):
+        return {
+            'linhas': tabela.index.tolist(),
+            'colunas': tabela.columns.tolist(),
+            'percentuais': [[numero(p) for p in linha] for linha in tabela.to_numpy()],
+            'erros_padrao': [[numero(e) for e in linha] for linha in erros.to_numpy()],
+        }
+
+    def cabecalho_json(onda, filtros, df):
+        return json.dumps({'onda': onda, 'filtros': filtros, 'n': len(df)}, ensure_ascii=False)[:-1]
+
+    @api.route('/colunas')
+    def colunas():
+        onda = ler_onda(flask.request.args.get('onda'))
+        return flask.jsonify({'onda': onda, 'colunas': visao({}, onda).columns})
+
+    @api.route('/freq')
+    def freq():
+        args = flask.request.args
+        colunas_pedidas = args.getlist('col')
+        if not colunas_pedidas:
+            raise ErroApi('Informe ao menos uma coluna em col')
+        filtros = ler_filtros(args.get('filters'))
+        onda = ler_onda(args.get('onda'))
+        percentual_erros, _ = ler_variancia(args.get('variancia'))
+        consulta = {'rota': 'freq', 'col': colunas_pedidas, 'filtros': chave_filtros(filtros),
+                    'variancia': args.get('variancia', 'analitica')}
+
+        df = visao(filtros, onda)
+        verificar_colunas(df, colunas_pedidas)
+
+        def gerar_json():
+            yield cabecalho_json(onda, filtros, df) + ', "resultados": {'
+            for i, coluna in enumerate(colunas_pedidas):
+                yield (', ' if i else '') + f'{json.dumps(coluna, ensure_ascii=False)}: ' + \
+                    json.dumps(frequencia_json(percentual_erros(df, coluna)), ensure_ascii=False)
+            yield '}}'
+
+        def gerar_csv():
+            linhas = (linha for coluna in colunas_pedidas
+                      for linha in linhas_frequencia(coluna, percentual_erros(df, coluna)))
+            return linhas_csv(['coluna', 'valor'] + CAMPOS_FREQUENCIA, linhas)
+
+        return responder(onda, consulta, args.get('format', 'json'), gerar_json, gerar_csv)
+
+    @api.route('/crosstab')
+    def crosstab_rota():
+        args = flask.request.args
+        index, columns = args.get('index'), args.get('columns')
+        if not index or not columns:
+            raise ErroApi('Informe index e columns')
+        filtros = ler_filtros(args.get('filters'))
+        onda = ler_onda(args.get('onda'))
+        _, erros_crosstab = ler_variancia(args.get('variancia'))
+        consulta = {'rota': 'crosstab', 'index': index, 'columns': columns, 'filtros': chave_filtros(filtros),
+                    'variancia': args.get('variancia', 'analitica')}
+
+        df = visao(filtros, onda)
+        verificar_colunas(df, [index, columns])
+
+        def gerar_json():
+            yield cabecalho_json(onda, filtros, df) + ', "crosstab": '
+            yield json.dumps(crosstab_json(crosstab(df, index, columns), erros_crosstab(df, index, columns)),
+                             ensure_ascii=False)
+            yield '}'
+
+        def gerar_csv():
+            tabela = crosstab(df, index, columns)
+            erros = erros_crosstab(df, index, columns)
+            linhas = ([linha, coluna, tabela.at[linha, coluna], erros.at[linha, coluna]]
+                      for linha in tabela.index for coluna in tabela.columns)
+            return linhas_csv([index, columns, 'percentual', 'erro_padrao'], linhas)
+
+        return responder(onda, consulta, args.get('format', 'json'), gerar_json, gerar_csv)
+
+    # Vários cálculos sobre o mesmo estado de filtros em uma única requisição
+    @api.route('/batch', methods=['POST'])
+    def batch():
+        pedido = flask.request.get_json(silent=True)
+        if not isinstance(pedido, dict):
+            raise ErroApi('O corpo deve ser um objeto JSON')
+        filtros = ler_filtros(json.dumps(pedido.get('filters') or {}))
+        onda = ler_onda(pedido.get('onda'))
+        percentual_erros, erros_crosstab = ler_variancia(pedido.get('variancia'))
+        colunas_freq = pedido.get('freq') or []
+        if not _lista_de_textos(colunas_freq):
+            raise ErroApi('freq deve ser uma lista de colunas')
+        pares = pedido.get('crosstab') or []
+        if not isinstance(pares, list) or not all(_lista_de_textos(par) and len(par) == 2 for par in pares):
+            raise ErroApi('crosstab deve ser uma lista de pares [index, columns]')
+        pares = [tuple(par) for par in pares]
+
+        df = visao(filtros, onda)
+        verificar_colunas(df, colunas_freq + [c for par in pares for c in par])
+
+        def gerar_json():
+            yield cabecalho_json(onda, filtros, df) + ', "freq": {'
+            for i, coluna in enumerate(colunas_freq):
+                yield (', ' if i else '') + f'{json.dumps(coluna, ensure_ascii=False)}: ' + \
+                    json.dumps(frequencia_json(percentual_erros(df, coluna)), ensure_ascii=False)
+            yield '}, "crosstab": ['
+            for i, (index, columns) in enumerate(pares):
+                resultado = dict({'index': index, 'columns': columns},
+                                 **crosstab_json(crosstab(df, index, columns), erros_crosstab(df, index, columns)))
+                yield (', ' if i else '') + json.dumps(resultado, ensure_ascii=False)
+            yield ']}'
+
+        return flask.Response(flask.stream_with_context(gerar_json()), mimetype='application/json')
+
+    return api
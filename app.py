@@ -1,28 +1,91 @@
+# Perfil da inicialização (ver startup.py e DASHBOARD_PERFIL_INICIO)
+from startup import StartupProfile, caminho_artefato_layout, ler_artefato_layout, gravar_artefato_layout
+perfil_inicio = StartupProfile.from_env()
+
 import dash
-from dash import dcc, html, Input, Output, callback, State, ALL
+from dash import dcc, html, Input, Output, callback, State, ALL, MATCH, Patch
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objs as go
 import json
 import os
+import flask
+import threading
 import numpy as np
+from plotly.utils import PlotlyJSONEncoder
+from survey_store import SurveyStore, NAO_SE_APLICA, ler_csv
+from snapshot import carregar_dados
+from csv_ingest import colunas_dos_grupos
+from waves import WaveRegistry
+from result_cache import chave_filtros
+from filter_index import FilterIndex
+from result_cache import ResultCache
+from figure_executor import FigureExecutor
+from metrics import Metrics
+from background_jobs import BackgroundJobs
+from api import criar_api
+from geometry import MunicipalityGeometry, nivel_da_escala, ESCALAS_NIVEIS
+from cooccurrence import coocorrencias
+import figure_factory as ff
+from chart_registry import Grafico, ChartPlanner, desenho_barras, desenho_pizza, maiores
+import frequencies
+from replicate_weights import pesos_replicados, resumo_replicas
+from frequencies import (somar_colunas, weighted_shares, weighted_shares_erros, totais_de_peso,
+                         erro_padrao_percentual, intervalo_confianca, n_efetivo)
+
+perfil_inicio.marcar('importacoes')
 
 # Carregar os grupos de colunas do arquivo JSON
 with open('grupos_colunas.json', 'r', encoding='utf-8') as f:
     grupos_colunas = json.load(f)
 
-# Carregar os dados do CSV
-try:
-    df = pd.read_csv('dados_sergipe.csv', delimiter=';', encoding='utf-8')
-except Exception as e:
-    print(f"Erro ao carregar o CSV: {e}")
-    # Se falhar, tente outra codificação
-    df = pd.read_csv('dados_sergipe.csv', delimiter=';', encoding='latin1')
+# Colunas lidas do CSV para o snapshot (as dos grupos; o peso entra sempre)
+colunas_leitura = colunas_dos_grupos()
+
+# CSV dos dados principais (caminho absoluto: a carga pode ser tardia)
+CAMINHO_DADOS = os.path.abspath('dados_sergipe.csv')
+
+# Diretório dos snapshots, onde também ficam os artefatos derivados dos dados
+# (cubo de marginais, geometrias, artefato do layout), reaproveitados nas
+# próximas inicializações; DASHBOARD_SNAPSHOT=0 lê sempre o CSV inteiro
+diretorio_snapshot = (None if os.environ.get('DASHBOARD_SNAPSHOT', '1') == '0'
+                      else os.environ.get('DASHBOARD_SNAPSHOT_DIR')
+                      or os.path.join(os.path.dirname(CAMINHO_DADOS), '.snapshot'))
 
 # Inicializar o aplicativo Dash
 app = dash.Dash(__name__, suppress_callback_exceptions=True)
 server = app.server
 
+# Cache de agregações e figuras por estado de filtros (ver DASHBOARD_CACHE_* no ambiente)
+cache_resultados = ResultCache.from_env()
+
+# Endpoint com os contadores do cache, para dimensioná-lo
+@server.route('/cache-stats')
+# (sem carregar os dados: o que ainda não foi carregado fica de fora)
+def cache_stats():
+    stats = cache_resultados.stats()
+    stats['ondas'] = registro_ondas.stats()
+    carregada = registro_ondas.carregada(ONDA_PRINCIPAL)
+    if carregada is not None:
+        store_principal, indice_filtros = carregada
+        if indice_filtros.cubo is not None:
+            stats['cubo'] = indice_filtros.cubo.stats()
+        stats['coocorrencias'] = coocorrencias(store_principal).stats()
+    if _geometrias:
+        stats['geometrias'] = _geometrias[0].stats()
+    stats['inicio'] = perfil_inicio.stats()
+    stats['graficos'] = planejador_graficos.stats()
+    if tarefas_segundo_plano is not None:
+        stats['segundo_plano'] = tarefas_segundo_plano.stats()
+    return flask.jsonify(stats)
+
+# Executor opcional para construir as figuras de uma aba em paralelo
+# (ver DASHBOARD_EXECUTOR e DASHBOARD_EXECUTOR_WORKERS no ambiente)
+executor_figuras = FigureExecutor.from_env()
+
+# Instrumentação dos callbacks (DASHBOARD_METRICAS=1): tempo das etapas de
+# filtro, agregação, figura e serialização, com log estruturado e /metrics
+metricas = Metrics.from_env()
+metricas.registrar(server)
+
 # Estilo do aplicativo
 colors = {
     'background': '#F0F0F0',
@@ -53,45 +116,133 @@ tab_selected_style = {
     'boxShadow': '0px 2px 5px rgba(0, 0, 0, 0.1)'
 }
 
+# Filtros demográficos: dimensão -> rótulo
+rotulos_filtros = {
+    'cidade': 'Cidade',
+    'região': 'Região',
+    'faixa de idade': 'Faixa de Idade',
+    'religião': 'Religião',
+    'grau de Instrução': 'Grau de Instrução',
+    'renda familiar': 'Renda Familiar',
+    'sexo': 'Sexo',
+}
+
+# Índice de bitsets por valor de cada filtro, construído uma única vez, com o
+# cubo de marginais de todas as perguntas de grupos_colunas.json para os estados
+# sem filtro ou com uma única dimensão filtrada (DASHBOARD_CUBO=0 desativa).
+# O cubo é gravado junto do snapshot e só é recalculado quando os dados mudam.
+colunas_cubo = None
+if os.environ.get('DASHBOARD_CUBO', '1') != '0':
+    colunas_cubo = [coluna for colunas in grupos_colunas.values() for coluna in colunas]
+
+# Pesos replicados (bootstrap) para a variância das aprovações da aba de governo
+# e do crosstab: DASHBOARD_REPLICAS réplicas (padrão 1000; 0 usa só os erros
+# analíticos), multiplicadas em DASHBOARD_REPLICAS_WORKERS threads
+REPLICAS = int(os.environ.get('DASHBOARD_REPLICAS', 1000))
+REPLICAS_WORKERS = int(os.environ.get('DASHBOARD_REPLICAS_WORKERS', 1))
+
+# Ondas da pesquisa: os CSVs do diretório ondas/ (DASHBOARD_ONDAS_DIR), carregados
+# no primeiro uso dentro de um orçamento de memória (DASHBOARD_ONDAS_MB), mais os
+# dados principais como onda mais recente
+ONDA_PRINCIPAL = 'atual'
+registro_ondas = WaveRegistry.from_diretorio(
+    os.environ.get('DASHBOARD_ONDAS_DIR', 'ondas'),
+    orcamento_bytes=int(float(os.environ.get('DASHBOARD_ONDAS_MB', 256)) * 1024 * 1024),
+    dimensoes=list(rotulos_filtros),
+    mmap=os.environ.get('DASHBOARD_MMAP') == '1',
+    colunas_cubo=colunas_cubo,
+    colunas=colunas_leitura
+)
+
+# Função para carregar os dados principais e o seu índice de filtros.
+# Os dados ficam em um armazenamento colunar compacto (códigos inteiros +
+# pesos): por padrão o snapshot binário em .snapshot/, refeito automaticamente
+# quando o CSV muda, lendo o CSV em blocos e só as colunas de
+# grupos_colunas.json (mais o peso). Com DASHBOARD_MMAP=1 os arrays do
+# snapshot são mapeados em memória somente leitura, e todos os workers do
+# gunicorn compartilham as mesmas páginas.
+# `marcar(nome)` fecha cada etapa no perfil da inicialização.
+def carregar_dados_principais(marcar):
+    if diretorio_snapshot is None:
+        store = SurveyStore.from_dataframe(ler_csv(CAMINHO_DADOS))
+    else:
+        store = carregar_dados(CAMINHO_DADOS, raiz=os.environ.get('DASHBOARD_SNAPSHOT_DIR'),
+                               mmap=os.environ.get('DASHBOARD_MMAP') == '1', colunas=colunas_leitura)
+    marcar('dados')
+    indice = FilterIndex(store, list(rotulos_filtros), colunas_cubo, diretorio_cubo=diretorio_snapshot,
+                         mmap=os.environ.get('DASHBOARD_MMAP') == '1')
+    marcar('indice_filtros')
+    return store, indice
+
+# Tarefas em segundo plano (ver background_jobs.py): as abas listadas em
+# DASHBOARD_ABAS_SEGUNDO_PLANO são calculadas em processos filhos, com
+# progresso e cancelamento, sem prender o worker; a versão das ondas entra na
+# chave dos resultados guardados
+tarefas_segundo_plano = BackgroundJobs.from_env(cache_by=[lambda: registro_ondas.versao])
+ABAS_SEGUNDO_PLANO = (set(os.environ.get('DASHBOARD_ABAS_SEGUNDO_PLANO', 'tab-governo,tab-figuras').split(','))
+                      if tarefas_segundo_plano is not None else set())
+
+# Início rápido (padrão; DASHBOARD_INICIO_RAPIDO=0 desativa): o layout e a
+# estrutura de cada aba saem do artefato gravado junto dos snapshots, e os
+# dados principais, o índice, o cubo e as geometrias só são carregados no
+# primeiro uso. Sem o artefato válido (primeira inicialização, CSV, código
+# do layout ou abas em segundo plano alterados), ou fora desse modo, os
+# dados são carregados aqui e o artefato é regravado no fim da
+# inicialização, com as abas já montadas.
+perfil_inicio.marcar('configuracao')
+caminho_layout = caminho_artefato_layout(diretorio_snapshot, CAMINHO_DADOS, colunas_leitura, rotulos_filtros,
+                                         arquivos=[__file__, ff.__file__, 'grupos_colunas.json'],
+                                         configuracao=sorted(ABAS_SEGUNDO_PLANO))
+artefato_layout = (ler_artefato_layout(caminho_layout)
+                   if os.environ.get('DASHBOARD_INICIO_RAPIDO', '1') != '0' else None)
+gravar_layout = artefato_layout is None and caminho_layout is not None
+if artefato_layout is not None:
+    registro_ondas.fixar_tardia(ONDA_PRINCIPAL, artefato_layout['versao'],
+                                lambda: carregar_dados_principais(perfil_inicio.cronometro('tardio:')))
+else:
+    store_principal, indice_principal = carregar_dados_principais(perfil_inicio.marcar)
+    registro_ondas.fixar(ONDA_PRINCIPAL, store_principal, indice_principal)
+    artefato_layout = {
+        'versao': store_principal.versao,
+        'colunas': store_principal.columns,
+        'opcoes_filtros': {filtro: sorted(store_principal.categorias_de(filtro)) for filtro in rotulos_filtros},
+    }
+perfil_inicio.marcar('artefato_layout')
+
+# Estrutura de cada aba já serializada, vinda do artefato do layout
+cascas_abas = artefato_layout.get('cascas', {})
+
+# Colunas presentes nos dados principais
+colunas_dados = set(artefato_layout['colunas'])
+
 # Preparar os valores para os filtros
 filtros_config = {
-    'cidade': {
-        'label': 'Cidade',
-        'options': sorted([{'label': city, 'value': city} for city in df['cidade'].unique()], key=lambda x: x['label']),
-        'value': []
-    },
-    'região': {
-        'label': 'Região',
-        'options': sorted([{'label': region, 'value': region} for region in df['região'].unique()], key=lambda x: x['label']),
-        'value': []
-    },
-    'faixa de idade': {
-        'label': 'Faixa de Idade',
-        'options': sorted([{'label': age, 'value': age} for age in df['faixa de idade'].unique()], key=lambda x: x['label']),
-        'value': []
-    },
-    'religião': {
-        'label': 'Religião',
-        'options': sorted([{'label': religion, 'value': religion} for religion in df['religião'].unique()], key=lambda x: x['label']),
-        'value': []
-    },
-    'grau de Instrução': {
-        'label': 'Grau de Instrução',
-        'options': sorted([{'label': edu, 'value': edu} for edu in df['grau de Instrução'].unique()], key=lambda x: x['label']),
-        'value': []
-    },
-    'renda familiar': {
-        'label': 'Renda Familiar',
-        'options': sorted([{'label': income, 'value': income} for income in df['renda familiar'].unique()], key=lambda x: x['label']),
-        'value': []
-    },
-    'sexo': {
-        'label': 'Sexo',
-        'options': sorted([{'label': gender, 'value': gender} for gender in df['sexo'].unique()], key=lambda x: x['label']),
+    filtro: {
+        'label': rotulo,
+        'options': [{'label': valor, 'value': valor} for valor in artefato_layout['opcoes_filtros'][filtro]],
         'value': []
     }
+    for filtro, rotulo in rotulos_filtros.items()
 }
 
+# Função para obter os dados principais (carregados no primeiro uso no início rápido)
+def dados_principais():
+    return registro_ondas.obter(ONDA_PRINCIPAL)
+
+# Geometrias dos municípios para o mapa: um polígono por cidade (não por linha),
+# simplificado uma única vez por nível de zoom e guardado junto dos snapshots;
+# montadas no primeiro uso
+_geometrias = []
+_trava_geometrias = threading.Lock()
+
+def geometrias_mapa():
+    with _trava_geometrias:
+        if not _geometrias:
+            marcar = perfil_inicio.cronometro('tardio:')
+            _geometrias.append(MunicipalityGeometry.from_store(dados_principais(), diretorio=diretorio_snapshot))
+            marcar('geometrias')
+        return _geometrias[0]
+
 # Layout do aplicativo com filtros
 app.layout = html.Div([
     html.H1('Dashboard de Pesquisa de Opinião - Sergipe', 
@@ -117,6 +268,18 @@ app.layout = html.Div([
             for filtro in filtros_config
         ], style={'display': 'flex', 'justifyContent': 'space-between'}),
         
+        # Seletor da onda da pesquisa
+        html.Div([
+            html.Label('Onda da Pesquisa', style={'fontWeight': 'bold', 'marginBottom': '5px'}),
+            dcc.Dropdown(
+                id='onda-dropdown',
+                options=[{'label': onda, 'value': onda} for onda in registro_ondas.nomes()],
+                value=ONDA_PRINCIPAL,
+                clearable=False,
+                style={'width': '100%'}
+            )
+        ], style={'width': '27%', 'marginTop': '10px'}),
+        
         # Botões para aplicar ou limpar filtros
         html.Div([
             html.Button('Aplicar Filtros', id='aplicar-filtros', n_clicks=0, 
@@ -158,127 +321,290 @@ app.layout = html.Div([
                 style=tab_style, selected_style=tab_selected_style),
         dcc.Tab(label='Figuras Públicas', value='tab-figuras',
                 style=tab_style, selected_style=tab_selected_style),
+        dcc.Tab(label='Mapa', value='tab-mapa',
+                style=tab_style, selected_style=tab_selected_style),
+        dcc.Tab(label='Explorar', value='tab-explorar',
+                style=tab_style, selected_style=tab_selected_style),
     ]),
     
+    html.Div(id='tab-aviso'),
     html.Div(id='tab-content', style={'padding': '20px'})
 ], style={'backgroundColor': colors['background'], 'minHeight': '100vh', 'padding': '20px'})
+perfil_inicio.marcar('layout')
 
-# Função para filtrar o dataframe com base nos filtros aplicados
+# Função para obter os dados da onda selecionada (carregados sob demanda)
+def dados_da_onda(onda):
+    return registro_ondas.obter(onda if onda in registro_ondas.nomes() else ONDA_PRINCIPAL)
+
+# Função para filtrar os dados com base nos filtros aplicados.
+# Retorna uma visão das linhas selecionadas, sem copiar os dados.
 def filter_dataframe(df, filtros):
-    filtered_df = df.copy()
-    
-    for filtro, valores in filtros.items():
-        if valores and len(valores) > 0:
-            filtered_df = filtered_df[filtered_df[filtro].isin(valores)]
-    
-    return filtered_df
+    with metricas.etapa('filtro'):
+        indice = registro_ondas.indice_de(df) or FilterIndex(df, [])
+        view = indice.filtrar(filtros)
+    metricas.registrar_linhas(len(view))
+    return view
+
+# Função para somar os pesos por categoria de uma coluna codificada
+def _somar_pesos(df, column, weight_col='peso'):
+    # Cubo de marginais ou atualização a partir de uma visão anterior (ver somar_colunas)
+    _, _, somas, contagens, _ = somar_colunas(df, [column], weight_col)
+    return somas, contagens
+
+# Função para somar os pesos das linhas selecionadas
+def _peso_total(df, weight_col='peso'):
+    if df.marginais is not None and df.marginais.tem_pesos(weight_col):
+        return df.marginais.peso_total()
+    return df.pesos(weight_col).sum()
+
+# Função para montar uma série indexada pelas categorias presentes
+def _serie_categorias(df, column, valores, presentes, name):
+    categorias = df.categorias_de(column)
+    index = pd.Index([categorias[i] for i in np.flatnonzero(presentes)], name=column)
+    return pd.Series(valores[presentes], index=index, name=name)
 
 # Função para calcular contagens ponderadas
+@cache_resultados.memoize('weighted_count')
 def weighted_count(df, column, weight_col='peso'):
-    # Verificar se a coluna existe no DataFrame
-    if column not in df.columns:
+    # Verificar se a coluna existe nos dados
+    if column not in df.store.posicao:
         return pd.Series(dtype=float)  # Retornar uma série vazia
     
-    # Verificar se a coluna de peso existe
-    if weight_col not in df.columns:
-        return df[column].value_counts()
-    
-    # Filtrar valores nulos ou vazios
-    valid_df = df[df[column].notna() & (df[column] != '.')]
-    if len(valid_df) == 0:
+    somas, contagens = _somar_pesos(df, column, weight_col)
+    presentes = contagens > 0
+    if not presentes.any():
         return pd.Series(dtype=float)
     
+    # Verificar se a coluna de peso existe
+    if df.store.pesos(weight_col) is None:
+        return _serie_categorias(df, column, contagens, presentes, 'count').sort_values(ascending=False)
+    
     # Calcular proporções
-    total_peso = df[weight_col].sum()
+    total_peso = _peso_total(df, weight_col)
     if total_peso == 0:
         return pd.Series(dtype=float)
-        
-    # Agrupar e somar os pesos
-    weighted_counts = valid_df.groupby(column)[weight_col].sum()
+    
     # Calcular percentuais
-    weighted_percent = (weighted_counts / total_peso) * 100
+    weighted_percent = (_serie_categorias(df, column, somas, presentes, weight_col) / total_peso) * 100
     return weighted_percent.round(2).sort_values(ascending=False)
 
 # Função para calcular percentuais ponderados
+@cache_resultados.memoize('weighted_percentage')
 def weighted_percentage(df, column, weight_col='peso'):
-    # Verificar se a coluna existe no DataFrame
-    if column not in df.columns:
+    # Verificar se a coluna existe nos dados
+    if column not in df.store.posicao:
         return pd.Series(dtype=float)  # Retornar uma série vazia
     
-    # Verificar se a coluna de peso existe
-    if weight_col not in df.columns:
-        counts = df[column].value_counts(normalize=True) * 100
-        return counts.round(2)  # Arredondar para 2 casas decimais
-    
-    # Filtrar valores nulos ou vazios
-    valid_df = df[df[column].notna() & (df[column] != '.')]
-    if len(valid_df) == 0:
+    somas, contagens = _somar_pesos(df, column, weight_col)
+    presentes = contagens > 0
+    if not presentes.any():
         return pd.Series(dtype=float)  # Retornar uma série vazia se não houver dados válidos
     
+    # Sem coluna de peso, usar a frequência simples das respostas válidas (sem o '.', como no ramo ponderado)
+    if df.store.pesos(weight_col) is None:
+        counts = _serie_categorias(df, column, contagens, presentes, 'proportion') / contagens.sum() * 100
+        return counts.round(2).sort_values(ascending=False)
+    
     # Calcular proporções
-    total_peso = df[weight_col].sum()
+    total_peso = _peso_total(df, weight_col)
     if total_peso == 0:
         return pd.Series(dtype=float)
-        
-    # Agrupar e somar os pesos
-    weighted_counts = valid_df.groupby(column)[weight_col].sum()
+    
     # Calcular percentuais
-    weighted_percent = (weighted_counts / total_peso) * 100
+    weighted_percent = (_serie_categorias(df, column, somas, presentes, weight_col) / total_peso) * 100
     return weighted_percent.round(2).sort_values(ascending=False)  # Arredondar para 2 casas decimais
 
+# Função para calcular os percentuais de weighted_percentage (na mesma ordem)
+# com o erro padrão, o intervalo de confiança de 95% e o tamanho efetivo de
+# amostra (Kish), a partir das mesmas somas de w e w² por categoria
+@cache_resultados.memoize('weighted_percentage_erros')
+def weighted_percentage_erros(df, column, weight_col='peso'):
+    percentual = weighted_percentage(df, column, weight_col)
+    if percentual.empty:
+        return pd.DataFrame(columns=['percentual', 'erro_padrao', 'ic_inferior', 'ic_superior', 'n_efetivo'])
+    
+    _, _, somas, contagens, quadrados = somar_colunas(df, [column], weight_col)
+    if df.store.pesos(weight_col) is None:
+        # Sem peso, a base são as respostas válidas (como em weighted_percentage)
+        peso_base = quadrado_base = float(contagens.sum())
+    else:
+        peso_base, quadrado_base = totais_de_peso(df, weight_col)
+    erros = erro_padrao_percentual(somas, quadrados, peso_base, quadrado_base)
+    erros = _serie_categorias(df, column, erros, contagens > 0, 'erro_padrao').reindex(percentual.index)
+    inferior, superior = intervalo_confianca(percentual, erros)
+    return pd.DataFrame({
+        'percentual': percentual,
+        'erro_padrao': erros.round(2),
+        'ic_inferior': np.round(inferior, 2),
+        'ic_superior': np.round(superior, 2),
+        'n_efetivo': round(float(n_efetivo(peso_base, quadrado_base)), 1),
+    }, index=percentual.index)
+
+# Função para calcular os percentuais de weighted_percentage com erro padrão
+# e intervalo percentil de 95% dos pesos replicados (bootstrap), na mesma
+# tabela de weighted_percentage_erros. Sem réplicas, usa os erros analíticos.
+@cache_resultados.memoize('weighted_percentage_bootstrap')
+def weighted_percentage_bootstrap(df, column, weight_col='peso'):
+    percentual = weighted_percentage(df, column, weight_col)
+    if percentual.empty or REPLICAS < 2:
+        return weighted_percentage_erros(df, column, weight_col)
+    
+    replicas = pesos_replicados(df.store, REPLICAS, REPLICAS_WORKERS, weight_col)
+    somas, totais = replicas.somas(df, column)
+    if df.store.pesos(weight_col) is None:
+        totais = somas.sum(axis=1)  # Sem peso, a base são as respostas válidas
+    with np.errstate(divide='ignore', invalid='ignore'):
+        estimativas = somas / totais[:, None] * 100
+    erro_padrao, inferior, superior = resumo_replicas(estimativas)
+    
+    categorias = df.categorias_de(column)
+    posicoes = [categorias.index(valor) for valor in percentual.index]
+    return pd.DataFrame({
+        'percentual': percentual,
+        'erro_padrao': np.round(erro_padrao[posicoes], 2),
+        'ic_inferior': np.round(inferior[posicoes], 2),
+        'ic_superior': np.round(superior[posicoes], 2),
+        'n_efetivo': weighted_percentage_erros(df, column, weight_col)['n_efetivo'],
+    }, index=percentual.index)
+
+# Frequências ponderadas de várias colunas em uma única passada (tabela longa)
+weighted_frequencies = cache_resultados.memoize('weighted_frequencies')(frequencies.weighted_frequencies)
+
+# Função para calcular a distribuição ponderada de uma coluna em cada onda.
+# Cada onda é calculada uma vez por estado de filtros e guardada no cache,
+# sem juntar as ondas; uma onda nova só acrescenta o seu próprio cálculo.
+def weighted_trend(column, filtros, weight_col='peso'):
+    linhas = []
+    for onda in registro_ondas.nomes():
+        chave = cache_resultados.chave('weighted_trend', registro_ondas.assinatura(onda),
+                                       chave_filtros(filtros), column, weight_col)
+        serie = cache_resultados.get_or_compute(
+            chave, lambda: weighted_percentage(filter_dataframe(registro_ondas.obter(onda), filtros), column, weight_col))
+        for valor, percentual in serie.items():
+            linhas.append({'Onda': onda, 'Resposta': valor, 'Percentual': percentual})
+    return pd.DataFrame(linhas, columns=['Onda', 'Resposta', 'Percentual'])
+
 # Função para criar tabulação cruzada ponderada
+@cache_resultados.memoize('weighted_crosstab')
 def weighted_crosstab(df, index, columns, weight_col='peso'):
-    # Verificar se as colunas existem no DataFrame
-    if index not in df.columns or columns not in df.columns:
+    # Verificar se as colunas existem nos dados
+    if index not in df.store.posicao or columns not in df.store.posicao:
         return pd.DataFrame()  # Retornar um DataFrame vazio
     
     # Filtrar valores nulos ou vazios
-    valid_df = df[(df[index].notna() & (df[index] != '.')) & 
-                  (df[columns].notna() & (df[columns] != '.'))]
+    codigos_index = df.codigos(index)
+    codigos_columns = df.codigos(columns)
+    validos = (codigos_index >= 0) & (codigos_columns >= 0)
     
-    if len(valid_df) == 0:
+    if not validos.any():
         return pd.DataFrame()
     
+    codigos_index = codigos_index[validos]
+    codigos_columns = codigos_columns[validos]
+    categorias_index = df.categorias_de(index)
+    categorias_columns = df.categorias_de(columns)
+    
     # Se não houver coluna de peso, use o crosstab padrão
-    if weight_col not in df.columns:
-        return pd.crosstab(valid_df[index], valid_df[columns], normalize='index') * 100
+    pesos = df.pesos(weight_col)
+    if pesos is None:
+        return pd.crosstab(pd.Series([categorias_index[c] for c in codigos_index], name=index),
+                           pd.Series([categorias_columns[c] for c in codigos_columns], name=columns),
+                           normalize='index') * 100
+    pesos = pesos[validos]
     
-    # Crosstab ponderado
-    cross_data = []
-    for idx_val in valid_df[index].unique():
-        for col_val in valid_df[columns].unique():
-            mask = (valid_df[index] == idx_val) & (valid_df[columns] == col_val)
-            weight_sum = valid_df.loc[mask, weight_col].sum()
-            cross_data.append({
-                'index': idx_val,
-                'column': col_val,
-                'weight': weight_sum
-            })
+    # Crosstab ponderado em uma única passada: código combinado (linha, coluna) + bincount
+    n_index = len(categorias_index)
+    n_columns = len(categorias_columns)
+    combinado = codigos_index.astype(np.int64) * n_columns + codigos_columns
+    somas = np.bincount(combinado, weights=pesos, minlength=n_index * n_columns).reshape(n_index, n_columns)
+    
+    # Manter apenas as categorias presentes nas linhas válidas
+    index_presentes = np.flatnonzero(np.bincount(codigos_index, minlength=n_index))
+    columns_presentes = np.flatnonzero(np.bincount(codigos_columns, minlength=n_columns))
+    somas = somas[np.ix_(index_presentes, columns_presentes)]
+    
+    # Normalizar por linha (percentual por categoria do índice); linhas de soma zero viram NaN
+    row_sums = somas.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        percentuais = (somas / row_sums[:, None]) * 100
+    percentuais[row_sums == 0, :] = np.nan
     
-    if not cross_data:
+    pivot_df = pd.DataFrame(
+        percentuais,
+        index=pd.Index([categorias_index[i] for i in index_presentes], name='index'),
+        columns=pd.Index([categorias_columns[j] for j in columns_presentes], name='column')
+    )
+    
+    return pivot_df.round(2)  # Arredondar para 2 casas decimais
+
+# Função para calcular o erro padrão (pontos percentuais) de cada célula do
+# weighted_crosstab (percentual dentro da linha), com as somas de w e w² por célula
+@cache_resultados.memoize('weighted_crosstab_erros')
+def weighted_crosstab_erros(df, index, columns, weight_col='peso'):
+    tabela = weighted_crosstab(df, index, columns, weight_col)
+    if tabela.empty:
         return pd.DataFrame()
     
-    cross_df = pd.DataFrame(cross_data)
-    pivot_df = cross_df.pivot(index='index', columns='column', values='weight')
+    codigos_index = df.codigos(index)
+    codigos_columns = df.codigos(columns)
+    validos = (codigos_index >= 0) & (codigos_columns >= 0)
+    pesos = df.pesos(weight_col)
+    pesos = np.ones(int(validos.sum())) if pesos is None else pesos[validos]
     
-    # Normalizar por linha (percentual por categoria do índice)
-    row_sums = pivot_df.sum(axis=1)
-    if (row_sums == 0).any():
-        # Evitar divisão por zero
-        for idx in pivot_df.index[row_sums == 0]:
-            pivot_df.loc[idx, :] = np.nan
-        row_sums = row_sums[row_sums > 0]
+    n_columns = len(df.categorias_de(columns))
+    tamanho = len(df.categorias_de(index)) * n_columns
+    combinado = codigos_index[validos].astype(np.int64) * n_columns + codigos_columns[validos]
+    somas = np.bincount(combinado, weights=pesos, minlength=tamanho).reshape(-1, n_columns)
+    quadrados = np.bincount(combinado, weights=pesos * pesos, minlength=tamanho).reshape(-1, n_columns)
     
-    for col in pivot_df.columns:
-        pivot_df[col] = (pivot_df[col] / row_sums) * 100
+    # Mesmas linhas e colunas do crosstab
+    celulas = np.ix_(df.store.codificar(index, tabela.index), df.store.codificar(columns, tabela.columns))
+    somas, quadrados = somas[celulas], quadrados[celulas]
+    erros = erro_padrao_percentual(somas, quadrados, somas.sum(axis=1)[:, None], quadrados.sum(axis=1)[:, None])
+    return pd.DataFrame(erros, index=tabela.index, columns=tabela.columns).round(2)
+
+# Função para calcular o erro padrão bootstrap (pesos replicados) de cada
+# célula do weighted_crosstab. Sem réplicas, usa os erros analíticos.
+@cache_resultados.memoize('weighted_crosstab_bootstrap')
+def weighted_crosstab_bootstrap(df, index, columns, weight_col='peso'):
+    tabela = weighted_crosstab(df, index, columns, weight_col)
+    if tabela.empty or REPLICAS < 2:
+        return weighted_crosstab_erros(df, index, columns, weight_col)
     
-    return pivot_df.round(2)  # Arredondar para 2 casas decimais
+    replicas = pesos_replicados(df.store, REPLICAS, REPLICAS_WORKERS, weight_col)
+    somas = replicas.somas_crosstab(df, index, columns)
+    celulas = np.ix_(np.arange(replicas.replicas), df.store.codificar(index, tabela.index),
+                     df.store.codificar(columns, tabela.columns))
+    somas = somas[celulas]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        estimativas = somas / somas.sum(axis=2, keepdims=True) * 100
+    erro_padrao, _, _ = resumo_replicas(estimativas)
+    return pd.DataFrame(erro_padrao, index=tabela.index, columns=tabela.columns).round(2)
+
+# API JSON/CSV com os mesmos cálculos ponderados dos gráficos (ver api.py),
+# para relatórios automáticos sem passar pelos callbacks do Dash
+server.register_blueprint(criar_api(
+    visao=lambda filtros, onda: filter_dataframe(registro_ondas.obter(onda), filtros),
+    dimensoes=filtros_config,
+    assinatura=registro_ondas.assinatura,
+    ondas=registro_ondas.nomes,
+    onda_padrao=ONDA_PRINCIPAL,
+    percentual=weighted_percentage_erros,
+    crosstab=weighted_crosstab,
+    crosstab_erros=weighted_crosstab_erros,
+    percentual_bootstrap=weighted_percentage_bootstrap,
+    crosstab_bootstrap=weighted_crosstab_bootstrap,
+))
 
 # Função para criar um card de gráfico
 def create_graph_card(graph, title):
+    return create_card(title, dcc.Graph(figure=graph))
+
+# Função para criar um card com título e um conteúdo qualquer
+def create_card(title, content):
     return html.Div([
         html.H3(title, style={'textAlign': 'center', 'color': colors['text']}),
-        dcc.Graph(figure=graph)
+        content
     ], style={
         'backgroundColor': colors['panel'],
         'padding': '15px',
@@ -325,6 +651,7 @@ def format_filtros_text(filtros):
      State({'type': 'filtro-dropdown', 'index': ALL}, 'id'),
      State('filtros-aplicados', 'data')]
 )
+@metricas.instrumentar('gerenciar_filtros')
 def gerenciar_filtros(n_aplicar, n_limpar, valores_filtros, ids_filtros, filtros_atuais):
     ctx = dash.callback_context
     
@@ -347,723 +674,672 @@ def gerenciar_filtros(n_aplicar, n_limpar, valores_filtros, ids_filtros, filtros
     
     return filtros_atuais, format_filtros_text(filtros_atuais)
 
-# Callback para atualizar o conteúdo das abas
-@callback(
-    Output('tab-content', 'children'),
-    [Input('tabs', 'value'),
-     Input('filtros-aplicados', 'data')]
-)
-def render_content(tab, filtros_aplicados):
-    # Filtrar o dataframe com base nos filtros aplicados
-    filtered_df = filter_dataframe(df, filtros_aplicados)
+# Gráficos das abas: um registro declarativo (chart_registry) com, para cada
+# gráfico, as colunas que lê, a agregação de que depende, o recorte para o
+# gráfico e o desenho. O planejador executa os gráficos de cada aba como um
+# plano único (uma passada sobre as colunas da aba, agregações compartilhadas
+# calculadas uma vez), e cada card é calculado sob demanda no seu callback,
+# de modo que a aba aparece imediatamente e cada gráfico chega assim que fica pronto.
+
+# Colunas usadas em mais de um gráfico das abas
+redes = ['utiliza redes: whatsapp', 'utiliza redes: instagram', 
+        'utiliza redes: facebook', 'utiliza redes: youtube', 
+        'utiliza redes: tiktok', 'utiliza redes: x/ antigo twitter']
+redes_noticias = ['recebe notícia redes: whatsapp', 'recebe notícia redes: instagram', 
+                  'recebe notícia redes: facebook', 'recebe notícia redes: youtube', 
+                  'recebe notícia redes: tiktok', 'recebe notícia redes: x/ antigo twitter']
+politicas = [
+    'avaliação educação: ensino público e escolas estaduais',
+    'avaliação emprego: geração de empregos',
+    'avaliação saneamento: abastecimento de água',
+    'avaliação saúde: saúde pública no geral',
+    'avaliação segurança: segurança pública'
+]
+rumo_col = 'avaliação imagem: sergipe está caminhando no rumo certo ou errado?'
+gov_col = 'avaliação imagem: governador fábio mitidieri'
+apr_gov_col = 'aprovação imagem: governador fábio mitidieri'
+freq_noticias_col = 'com que frequência lê notícias da cidade/ região'
+site_col = 'site/ blog de notícias p5a'
+programa_destaque = 'evento: verão sergipe, arraiá do povo e vila do forró'
+
+# Pegar algumas figuras públicas populares para análise
+figuras_populares = [
+    'conhece figura: linda brasil',
+    'conhece figura: narcizo machado',
+    'conhece figura: adiberto de souza',
+    'conhece figura: luiz carlos focca',
+    'conhece figura: claudio nunes'
+]
+figura_destaque = 'linda brasil'
+
+# Função para calcular o percentual ponderado de uma coluna, ou None se a
+# coluna não existir nos dados; com erros='analiticos' ou erros='bootstrap',
+# a tabela com erro padrão e intervalo de confiança
+def percentual_da_coluna(filtered_df, column, erros=None):
+    if column not in filtered_df.columns:
+        return None
+    if erros == 'bootstrap':
+        return weighted_percentage_bootstrap(filtered_df, column)
+    if erros == 'analiticos':
+        return weighted_percentage_erros(filtered_df, column)
+    return weighted_percentage(filtered_df, column)
+
+# Tipos de agregação do registro: função(visão filtrada, filtros, *parâmetros)
+agregacoes_graficos = {
+    # Distribuição de uma coluna: (coluna, erros)
+    'distribuicao': lambda df, filtros, coluna, erros=None: percentual_da_coluna(df, coluna, erros),
+    # Tabela longa de frequências de várias colunas: (colunas, ordem_aparicao)
+    'frequencias': lambda df, filtros, colunas, ordem_aparicao=False: weighted_frequencies(
+        df, list(colunas), ordem_aparicao=ordem_aparicao),
+    # Distribuição de uma coluna em cada onda: (coluna,)
+    'tendencia': lambda df, filtros, coluna: weighted_trend(coluna, filtros),
+    # Agregação própria de um gráfico: (função(visão, filtros),)
+    'funcao': lambda df, filtros, funcao: funcao(df, filtros),
+}
+
+# Função para calcular o percentual de 'Sim' (sobre o total) de um conjunto de
+# redes, com erro padrão e intervalo de confiança, indexado pelo nome da rede.
+# As duas listas de redes vêm da mesma tabela de frequências.
+def parcela_sim_redes(colunas, prefixo):
+    def derivar(tabela, filtered_df):
+        percentual_sim = weighted_shares_erros(tabela, ['Sim'])
+        presentes = [rede for rede in colunas if rede in filtered_df.columns]
+        resultado = percentual_sim.reindex(presentes).fillna(0)
+        resultado.index = [rede.replace(prefixo, '') for rede in presentes]
+        return resultado
+    return derivar
+
+# Avaliação de Políticas Públicas - Ponderada: percentual de cada avaliação
+# entre as respostas válidas, a partir da tabela de todas as políticas
+def tabela_politicas(tabela, filtered_df):
+    tabela = tabela.dropna(subset=['percentual_validos'])  # Evitar divisão por zero
+    return pd.DataFrame({
+        'Área': [p.split(':')[0].replace('avaliação ', '') for p in tabela['coluna']],
+        'Avaliação': tabela['valor'].tolist(),
+        'Percentual': tabela['percentual_validos'].tolist()
+    })
+
+def grafico_politicas(df_politicas):
+    if df_politicas.empty:
+        return ff.figura_vazia('Dados insuficientes para avaliação de políticas públicas')
+    # Uma série por avaliação, na ordem em que as avaliações aparecem
+    series = [(avaliacao, grupo['Área'], grupo['Percentual'])
+              for avaliacao, grupo in df_politicas.groupby('Avaliação', sort=False)]
+    return ff.barras_agrupadas(series, 'Avaliação de Políticas Públicas (%)',
+                               'Área', 'Percentual', 'Avaliação', 'Plasma_r')
+
+# Evolução da aprovação do governador entre as ondas - Ponderada
+def grafico_tendencia(tendencia_apr_gov):
+    if tendencia_apr_gov.empty:
+        return ff.figura_vazia('Dados insuficientes para evolução da aprovação do governador')
+    series = [(resposta, grupo['Onda'], grupo['Percentual'])
+              for resposta, grupo in tendencia_apr_gov.groupby('Resposta', sort=False)]
+    return ff.linhas(series, 'Aprovação do Governador por Onda (%)',
+                     'Onda', 'Percentual', 'Resposta', 'Greens_r', eixo_x_categorico=True)
+
+# Função para abreviar o nome de um programa para os eixos dos gráficos
+def nome_programa(programa):
+    nome = programa.split(':')[1].strip() if ':' in programa else programa
+    return nome[:27] + '...' if len(nome) > 30 else nome
+
+# Conhecimento dos programas - Ponderado como percentual de 'Sim' e 'Não'
+# sobre o total (Sim + Não)
+def conhecimento_programas(tabela_programas, filtered_df):
+    programas = grupos_colunas['programas'][:10]  # Limitando a 10 programas para melhor visualização
+    conhece = weighted_shares(tabela_programas, ['Sim'], base=['Sim', 'Não']).dropna()
+    nao_conhece = weighted_shares(tabela_programas, ['Não'], base=['Sim', 'Não'])
     
-    # Se não houver dados após a filtragem, exiba uma mensagem
-    if len(filtered_df) == 0:
-        return html.Div([
-            html.H3("Nenhum dado encontrado com os filtros aplicados.", 
-                   style={'textAlign': 'center', 'color': 'red', 'margin': '50px'})
-        ])
+    # Preparar dados para o gráfico com ponderação
+    programas_data = []
+    for programa in programas:
+        if programa in filtered_df.columns and programa in conhece.index:  # Evitar divisão por zero
+            programas_data.append({
+                'Programa': nome_programa(programa),
+                'Conhece (%)': round(conhece[programa], 2),
+                'Não Conhece (%)': round(nao_conhece[programa], 2)
+            })
     
-    if tab == 'tab-demografico':
-        # Distribuição por cidade (top 10) - Ponderada
-        cidade_count = weighted_percentage(filtered_df, 'cidade').nlargest(10)
-        if not cidade_count.empty:
-            fig_cidade = px.bar(
-                x=cidade_count.index, 
-                y=cidade_count.values,
-                labels={'x': 'Cidade', 'y': 'Percentual (%)'},
-                title='Top 10 Cidades',
-                color=cidade_count.values,
-                color_continuous_scale='Blues'
-            )
-            fig_cidade.update_traces(texttemplate='%{y:.2f}%', textposition='outside')
-        else:
-            fig_cidade = go.Figure()
-            fig_cidade.update_layout(title='Dados insuficientes para distribuição por cidade')
+    return pd.DataFrame(programas_data)
+
+def grafico_programas(df_programas):
+    # Gráfico de barras empilhadas para conhecimento dos programas
+    if df_programas.empty:
+        return ff.figura_vazia('Dados insuficientes para análise de programas')
+    series = [(coluna, df_programas['Programa'], df_programas[coluna])
+              for coluna in ['Conhece (%)', 'Não Conhece (%)']]
+    return ff.barras_agrupadas(series, 'Conhecimento dos Programas do Governo (%)',
+                               'Programa', 'Percentual (%)', 'Resposta', ['#1E88E5', '#FFC107'],
+                               modo='stack', posicao_texto='inside', angulo_categorias=-45)
+
+# Top programas mais conhecidos - Ponderado como percentual de 'Sim' sobre (Sim + Não)
+def top_programas(tabela_programas, filtered_df):
+    conhece = weighted_shares_erros(tabela_programas, ['Sim'], base=['Sim', 'Não'])
+    conhece = conhece.dropna(subset=['percentual']).nlargest(5, 'percentual')
+    conhece.index = [nome_programa(programa) for programa in conhece.index]
+    return conhece
+
+# Conhecimento das figuras públicas - Ponderado como percentual de 'Sim' sobre (Sim + Não)
+def conhecimento_figuras(tabela_figuras, filtered_df):
+    conhece_figuras = weighted_shares_erros(tabela_figuras, ['Sim'], base=['Sim', 'Não']).dropna(subset=['percentual'])
+    conhece_figuras.index = [figura.replace('conhece figura: ', '') for figura in conhece_figuras.index]
+    return conhece_figuras
+
+# Frequência de acompanhamento - Ponderada, entre quem acompanha a figura
+def dados_freq_figura(filtered_df, filtros_aplicados):
+    freq_col = f'freq. Acompanhamento figura: {figura_destaque}'
+    if freq_col not in filtered_df.columns:
+        return None
+    freq_df = filtered_df.subconjunto(filtered_df.codigos(freq_col) != NAO_SE_APLICA)
+    return weighted_percentage(freq_df, freq_col) if len(freq_df) > 0 else pd.Series()
+
+# Análise de conhecimento por região - Ponderada.
+# Retorna o crosstab e os erros padrão bootstrap das células, None se a
+# coluna não existir ou o erro do cálculo.
+def dados_regiao_figura(filtered_df, filtros_aplicados):
+    conhece_col = f'conhece figura: {figura_destaque}'
+    if conhece_col not in filtered_df.columns:
+        return None
+    try:
+        return (weighted_crosstab(filtered_df, 'região', conhece_col),
+                weighted_crosstab_bootstrap(filtered_df, 'região', conhece_col))
+    except Exception as e:
+        return e
+
+def grafico_regiao_figura(conhecimento_por_regiao):
+    if conhecimento_por_regiao is None:
+        return ff.figura_vazia(f'Coluna de conhecimento para {figura_destaque} não encontrada')
+    if isinstance(conhecimento_por_regiao, Exception):
+        return ff.figura_vazia('Erro ao calcular conhecimento por região')
+    conhecimento_por_regiao, erros = conhecimento_por_regiao
+    if conhecimento_por_regiao.empty or 'Sim' not in conhecimento_por_regiao.columns:
+        return ff.figura_vazia('Dados insuficientes para análise por região')
+    return ff.barras(conhecimento_por_regiao.index, conhecimento_por_regiao['Sim'],
+                     f'Conhecimento de {figura_destaque.title()} por Região',
+                     'Região', 'Percentual que Conhece (%)', escala='Viridis',
+                     intervalo=intervalo_confianca(conhecimento_por_regiao['Sim'], erros['Sim']))
+
+# Agregações compartilhadas por mais de um gráfico
+frequencias_redes = ('frequencias', tuple(redes + redes_noticias))
+frequencias_programas = ('frequencias', tuple(grupos_colunas['programas']))
+frequencias_figuras = ('frequencias', tuple(figuras_populares))
+
+# Gráficos de cada aba, em linhas de cards. As colunas vêm do grupo de
+# grupos_colunas.json da aba; os gráficos sobre um subconjunto das linhas ou
+# um cruzamento de duas colunas não entram na passada única (colunas vazias).
+graficos_abas = {
+    'tab-demografico': [
+        [Grafico('cidade', 'Distribuição por Cidade', ['cidade'], ('distribuicao', 'cidade', 'analiticos'),
+                 desenho_barras('Top 10 Cidades', 'Cidade', 'Percentual (%)', 'Blues',
+                                'Dados insuficientes para distribuição por cidade'),
+                 derivar=maiores(10)),
+         Grafico('sexo', 'Distribuição por Sexo', ['sexo'], ('distribuicao', 'sexo'),
+                 desenho_pizza('Distribuição por Sexo (%)', 'Blues', 'Dados insuficientes para distribuição por sexo'))],
+        [Grafico('idade', 'Distribuição por Faixa Etária', ['faixa de idade'], ('distribuicao', 'faixa de idade'),
+                 desenho_pizza('Distribuição por Faixa Etária (%)', 'Plasma',
+                               'Dados insuficientes para distribuição por faixa etária')),
+         Grafico('religiao', 'Distribuição por Religião', ['religião'], ('distribuicao', 'religião'),
+                 desenho_pizza('Distribuição por Religião (%)', 'Viridis',
+                               'Dados insuficientes para distribuição por religião'))],
+        [Grafico('instrucao', 'Distribuição por Grau de Instrução', ['grau de Instrução'],
+                 ('distribuicao', 'grau de Instrução', 'analiticos'),
+                 desenho_barras('Distribuição por Grau de Instrução', 'Grau de Instrução', 'Percentual (%)', 'Blues',
+                                'Dados insuficientes para distribuição por grau de instrução')),
+         Grafico('renda', 'Distribuição por Renda Familiar', ['renda familiar'],
+                 ('distribuicao', 'renda familiar', 'analiticos'),
+                 desenho_barras('Distribuição por Renda Familiar', 'Renda Familiar', 'Percentual (%)', 'Greens',
+                                'Dados insuficientes para distribuição por renda familiar'))],
+    ],
+    'tab-midia': [
+        [Grafico('redes', 'Uso de Redes Sociais', redes, frequencias_redes,
+                 desenho_barras('Uso de Redes Sociais', 'Rede Social', 'Percentual de Uso (%)', 'Blues',
+                                'Dados insuficientes para uso de redes sociais'),
+                 derivar=parcela_sim_redes(redes, 'utiliza redes: ')),
+         Grafico('noticias', 'Recebimento de Notícias por Redes Sociais', redes_noticias, frequencias_redes,
+                 desenho_barras('Recebimento de Notícias por Redes Sociais', 'Rede Social',
+                                'Percentual de Recebimento (%)', 'Reds',
+                                'Dados insuficientes para recebimento de notícias'),
+                 derivar=parcela_sim_redes(redes_noticias, 'recebe notícia redes: '))],
+        [Grafico('freq-noticias', 'Frequência de Leitura de Notícias', [freq_noticias_col],
+                 ('distribuicao', freq_noticias_col),
+                 desenho_pizza('Frequência de Leitura de Notícias (%)', 'Blues',
+                               'Dados insuficientes para frequência de leitura',
+                               ausente='Coluna de frequência de leitura não encontrada')),
+         Grafico('sites', 'Sites/Blogs de Notícias', [site_col], ('distribuicao', site_col, 'analiticos'),
+                 desenho_barras('Top 10 Sites/Blogs de Notícias', 'Site/Blog', 'Percentual (%)', 'Blues',
+                                'Dados insuficientes para sites/blogs',
+                                ausente='Coluna de sites/blogs não encontrada'),
+                 derivar=maiores(10))],
+    ],
+    # Indicadores da aba de governo: percentuais com intervalo de confiança bootstrap
+    'tab-governo': [
+        [Grafico('rumo', 'Direção do Estado', [rumo_col], ('distribuicao', rumo_col, 'bootstrap'),
+                 desenho_pizza('Sergipe está caminhando no rumo certo ou errado? (%)', 'Blues',
+                               'Dados insuficientes para direção do estado',
+                               ausente='Coluna de direção do estado não encontrada')),
+         Grafico('gov', 'Avaliação do Governador', [gov_col], ('distribuicao', gov_col, 'bootstrap'),
+                 desenho_pizza('Avaliação do Governador (%)', 'Reds', 'Dados insuficientes para avaliação do governador',
+                               ausente='Coluna de avaliação do governador não encontrada'))],
+        [Grafico('apr-gov', 'Aprovação do Governador', [apr_gov_col], ('distribuicao', apr_gov_col, 'bootstrap'),
+                 desenho_pizza('Aprovação do Governador (%)', 'Greens', 'Dados insuficientes para aprovação do governador',
+                               ausente='Coluna de aprovação do governador não encontrada')),
+         Grafico('politicas', 'Avaliação de Políticas Públicas', politicas, ('frequencias', tuple(politicas), True),
+                 grafico_politicas, derivar=tabela_politicas)],
+        [Grafico('tendencia', 'Evolução da Aprovação do Governador', [apr_gov_col], ('tendencia', apr_gov_col),
+                 grafico_tendencia)],
+    ],
+    'tab-programas': [
+        [Grafico('programas', 'Conhecimento dos Programas', grupos_colunas['programas'], frequencias_programas,
+                 grafico_programas, derivar=conhecimento_programas)],
+        [Grafico('prog-destaque', 'Destaque: Eventos de Verão e Arraiá', [programa_destaque],
+                 ('distribuicao', programa_destaque),
+                 desenho_pizza(f'Conhecimento: {programa_destaque.split(":")[1].strip()} (%)', 'Blues',
+                               'Dados insuficientes para programa destaque',
+                               ausente='Programa destaque não encontrado nos dados')),
+         Grafico('top-prog', 'Top Programas Mais Conhecidos', grupos_colunas['programas'], frequencias_programas,
+                 desenho_barras('Top 5 Programas Mais Conhecidos', 'Programa', 'Conhecimento (%)', 'Blues',
+                                'Dados insuficientes para Top 5 Programas', angulo_categorias=-45),
+                 derivar=top_programas)],
+    ],
+    'tab-figuras': [
+        [Grafico('conhecimento-figuras', 'Conhecimento de Figuras Públicas', figuras_populares, frequencias_figuras,
+                 desenho_barras('Conhecimento de Figuras Públicas', 'Figura Pública', 'Percentual que Conhece (%)',
+                                'Blues', 'Dados insuficientes para conhecimento de figuras públicas'),
+                 derivar=conhecimento_figuras),
+         Grafico('imagem-figura', f'Imagem de {figura_destaque.title()}', [f'imagem figura: {figura_destaque}'],
+                 ('distribuicao', f'imagem figura: {figura_destaque}'),
+                 desenho_pizza(f'Imagem de {figura_destaque.title()} (%)', 'RdBu',
+                               f'Dados insuficientes para Imagem de {figura_destaque.title()}',
+                               ausente=f'Coluna de imagem para {figura_destaque} não encontrada'))],
+        [Grafico('freq-figura', f'Frequência de Acompanhamento: {figura_destaque.title()}', [],
+                 ('funcao', dados_freq_figura),
+                 desenho_pizza(f'Frequência de Acompanhamento: {figura_destaque.title()} (%)', 'Greens',
+                               'Dados insuficientes para Frequência de Acompanhamento',
+                               ausente=f'Coluna de frequência para {figura_destaque} não encontrada')),
+         Grafico('regiao-figura', f'Conhecimento por Região: {figura_destaque.title()}', [],
+                 ('funcao', dados_regiao_figura), grafico_regiao_figura)],
+    ],
+}
+
+# Planejador dos gráficos: plano de cada aba, gráficos por id e aba de cada gráfico
+planejador_graficos = ChartPlanner(graficos_abas, agregacoes_graficos, somar_colunas)
+aba_do_grafico = planejador_graficos.aba_do_grafico
+
+# Seções de análise detalhada exibidas abaixo dos gráficos de algumas abas
+def secao_figuras_politicas():
+    return html.Div([
+        html.H2('Avaliação de Figuras Políticas', 
+              style={'textAlign': 'center', 'color': colors['text'], 'marginTop': '30px'}),
         
-        # Distribuição por sexo - Ponderada
-        sexo_count = weighted_percentage(filtered_df, 'sexo')
-        if not sexo_count.empty:
-            fig_sexo = px.pie(
-                values=sexo_count.values, 
-                names=sexo_count.index,
-                title='Distribuição por Sexo (%)',
-                color_discrete_sequence=px.colors.sequential.Blues
+        html.Div([
+            dcc.Dropdown(
+                id='figura-dropdown',
+                options=[
+                    {'label': 'Ex-governador Belivaldo Chagas', 'value': 'avaliação imagem: ex-governador belivaldo chagas'},
+                    {'label': 'Edvaldo Nogueira (ex-prefeito de Aracaju)', 'value': 'avaliação imagem: edvaldo nogueira, ex-prefeito de aracaju'},
+                    {'label': 'Emília Corrêa (prefeita eleita de Aracaju)', 'value': 'avaliação imagem: emília corrêa, prefeita eleita de aracaju'},
+                    {'label': 'Presidente Lula', 'value': 'avaliação imagem: presidente lula'},
+                    {'label': 'Ex-presidente Jair Bolsonaro', 'value': 'avaliação imagem: ex-presidente jair bolsonaro'},
+                ],
+                value='avaliação imagem: ex-governador belivaldo chagas',
+                style={'width': '100%', 'marginBottom': '20px'}
             )
-            fig_sexo.update_traces(texttemplate='%{percent:.2%}', textposition='inside')
-        else:
-            fig_sexo = go.Figure()
-            fig_sexo.update_layout(title='Dados insuficientes para distribuição por sexo')
+        ]),
         
-        # Distribuição por faixa etária - Ponderada
-        idade_count = weighted_percentage(filtered_df, 'faixa de idade')
-        if not idade_count.empty:
-            fig_idade = px.pie(
-                values=idade_count.values, 
-                names=idade_count.index,
-                title='Distribuição por Faixa Etária (%)',
-                color_discrete_sequence=px.colors.sequential.Plasma
-            )
-            fig_idade.update_traces(texttemplate='%{percent:.2%}', textposition='inside')
-        else:
-            fig_idade = go.Figure()
-            fig_idade.update_layout(title='Dados insuficientes para distribuição por faixa etária')
+        html.Div(id='figura-graph')
+    ])
+
+def secao_programa_especifico():
+    return html.Div([
+        html.H2('Análise de Programa Específico', 
+               style={'textAlign': 'center', 'color': colors['text'], 'marginTop': '30px'}),
         
-        # Distribuição por grau de instrução - Ponderada
-        instrucao_count = weighted_percentage(filtered_df, 'grau de Instrução')
-        if not instrucao_count.empty:
-            fig_instrucao = px.bar(
-                x=instrucao_count.index, 
-                y=instrucao_count.values,
-                labels={'x': 'Grau de Instrução', 'y': 'Percentual (%)'},
-                title='Distribuição por Grau de Instrução',
-                color=instrucao_count.values,
-                color_continuous_scale='Blues'
+        html.Div([
+            dcc.Dropdown(
+                id='programa-dropdown',
+                options=[{'label': p.split(':')[1].strip() if ':' in p else p, 
+                         'value': p} for p in grupos_colunas['programas']],
+                value=grupos_colunas['programas'][0],
+                style={'width': '100%', 'marginBottom': '20px'}
             )
-            fig_instrucao.update_traces(texttemplate='%{y:.2f}%', textposition='outside')
-        else:
-            fig_instrucao = go.Figure()
-            fig_instrucao.update_layout(title='Dados insuficientes para distribuição por grau de instrução')
+        ]),
         
-        # Distribuição por renda familiar - Ponderada
-        renda_count = weighted_percentage(filtered_df, 'renda familiar')
-        if not renda_count.empty:
-            fig_renda = px.bar(
-                x=renda_count.index, 
-                y=renda_count.values,
-                labels={'x': 'Renda Familiar', 'y': 'Percentual (%)'},
-                title='Distribuição por Renda Familiar',
-                color=renda_count.values,
-                color_continuous_scale='Greens'
-            )
-            fig_renda.update_traces(texttemplate='%{y:.2f}%', textposition='outside')
-        else:
-            fig_renda = go.Figure()
-            fig_renda.update_layout(title='Dados insuficientes para distribuição por renda familiar')
+        html.Div(id='programa-graph')
+    ])
+
+def secao_figura_publica():
+    return html.Div([
+        html.H2('Análise de Figura Pública Específica', 
+              style={'textAlign': 'center', 'color': colors['text'], 'marginTop': '30px'}),
         
-        # Distribuição por religião - Ponderada
-        religiao_count = weighted_percentage(filtered_df, 'religião')
-        if not religiao_count.empty:
-            fig_religiao = px.pie(
-                values=religiao_count.values, 
-                names=religiao_count.index,
-                title='Distribuição por Religião (%)',
-                color_discrete_sequence=px.colors.sequential.Viridis
+        html.Div([
+            dcc.Dropdown(
+                id='figura-publica-dropdown',
+                options=[{'label': f.replace('conhece figura: ', ''), 
+                         'value': f} for f in figuras_populares],
+                value=figuras_populares[0],
+                style={'width': '100%', 'marginBottom': '20px'}
             )
-            fig_religiao.update_traces(texttemplate='%{percent:.2%}', textposition='inside')
-        else:
-            fig_religiao = go.Figure()
-            fig_religiao.update_layout(title='Dados insuficientes para distribuição por religião')
+        ]),
         
-        return html.Div([
+        html.Div(id='figura-publica-graph')
+    ])
+
+# Indicadores do mapa: as perguntas de grupos_colunas.json (menos as colunas geográficas)
+colunas_mapa = [coluna for grupo, colunas in grupos_colunas.items() if grupo != 'geoespacial'
+                for coluna in colunas if coluna in colunas_dados]
+NIVEL_MAPA_INICIAL = ESCALAS_NIVEIS[0][1]
+
+# Seção do mapa: a figura leva a geometria do nível inicial uma única vez; os
+# valores chegam depois pelo callback atualizar_mapa
+def secao_mapa():
+    geometrias = geometrias_mapa()
+    n = len(geometrias.municipios)
+    figura = ff.mapa_coropletico(geometrias.geojson[NIVEL_MAPA_INICIAL], geometrias.municipios,
+                                 [None] * n, [0] * n, '', 'Percentual (%)')
+    return html.Div([
+        html.Div([
             html.Div([
-                html.Div([
-                    create_graph_card(fig_cidade, 'Distribuição por Cidade'),
-                ], className='six columns'),
-                
-                html.Div([
-                    create_graph_card(fig_sexo, 'Distribuição por Sexo'),
-                ], className='six columns'),
-            ], className='row'),
-            
+                create_dropdown('mapa-coluna', [{'label': c, 'value': c} for c in colunas_mapa],
+                                apr_gov_col if apr_gov_col in colunas_mapa else colunas_mapa[0], 'Indicador'),
+            ], className='six columns'),
             html.Div([
-                html.Div([
-                    create_graph_card(fig_idade, 'Distribuição por Faixa Etária'),
-                ], className='six columns'),
-                
-                html.Div([
-                    create_graph_card(fig_religiao, 'Distribuição por Religião'),
-                ], className='six columns'),
-            ], className='row'),
-            
+                create_dropdown('mapa-categoria', [], None, 'Resposta'),
+            ], className='six columns'),
+        ], className='row'),
+        dcc.Store(id='mapa-nivel', data=NIVEL_MAPA_INICIAL),
+        html.Div([
+            dcc.Graph(id='mapa-grafico', figure=figura, style={'height': '700px'})
+        ], style={
+            'backgroundColor': colors['panel'],
+            'padding': '15px',
+            'borderRadius': '5px',
+            'boxShadow': '0px 2px 5px rgba(0, 0, 0, 0.1)',
+            'margin': '10px'
+        })
+    ])
+
+# Aba de exploração: qualquer variável demográfica cruzada com qualquer
+# pergunta dos outros grupos (menos os geográficos)
+demograficos_explorar = [coluna for coluna in grupos_colunas['demografico'] if coluna in colunas_dados]
+perguntas_explorar = [coluna for grupo, colunas in grupos_colunas.items()
+                      if grupo not in ('demografico', 'geoespacial')
+                      for coluna in colunas if coluna in colunas_dados]
+
+def secao_explorar():
+    return html.Div([
+        html.Div([
             html.Div([
-                html.Div([
-                    create_graph_card(fig_instrucao, 'Distribuição por Grau de Instrução'),
-                ], className='six columns'),
-                
-                html.Div([
-                    create_graph_card(fig_renda, 'Distribuição por Renda Familiar'),
-                ], className='six columns'),
-            ], className='row'),
-        ])
-    
-    elif tab == 'tab-midia':
-        # Gráficos para a aba de Mídia e Comunicação - Ponderados
-        
-        # Uso de redes sociais - Ponderado
-        redes = ['utiliza redes: whatsapp', 'utiliza redes: instagram', 
-                'utiliza redes: facebook', 'utiliza redes: youtube', 
-                'utiliza redes: tiktok', 'utiliza redes: x/ antigo twitter']
-        
-        uso_redes = {}
-        for rede in redes:
-            if rede in filtered_df.columns:
-                rede_nome = rede.replace('utiliza redes: ', '')
-                # Calcular como percentual do total
-                total_peso = filtered_df['peso'].sum()
-                rede_df = filtered_df[filtered_df[rede] == 'Sim']
-                if len(rede_df) > 0 and total_peso > 0:
-                    uso_redes[rede_nome] = (rede_df['peso'].sum() / total_peso) * 100
-                else:
-                    uso_redes[rede_nome] = 0
-        
-        if uso_redes:
-            fig_redes = px.bar(
-                x=list(uso_redes.keys()), 
-                y=list(uso_redes.values()),
-                labels={'x': 'Rede Social', 'y': 'Percentual de Uso (%)'},
-                title='Uso de Redes Sociais',
-                color=list(uso_redes.values()),
-                color_continuous_scale='Blues'
-            )
-            fig_redes.update_traces(texttemplate='%{y:.2f}%', textposition='outside')
-        else:
-            fig_redes = go.Figure()
-            fig_redes.update_layout(title='Dados insuficientes para uso de redes sociais')
-        
-        # Recebimento de notícias por redes sociais - Ponderado
-        redes_noticias = ['recebe notícia redes: whatsapp', 'recebe notícia redes: instagram', 
-                          'recebe notícia redes: facebook', 'recebe notícia redes: youtube', 
-                          'recebe notícia redes: tiktok', 'recebe notícia redes: x/ antigo twitter']
-        
-        noticias_redes = {}
-        for rede in redes_noticias:
-            if rede in filtered_df.columns:
-                rede_nome = rede.replace('recebe notícia redes: ', '')
-                # Calcular como percentual do total
-                total_peso = filtered_df['peso'].sum()
-                rede_df = filtered_df[filtered_df[rede] == 'Sim']
-                if len(rede_df) > 0 and total_peso > 0:
-                    noticias_redes[rede_nome] = (rede_df['peso'].sum() / total_peso) * 100
-                else:
-                    noticias_redes[rede_nome] = 0
-        
-        if noticias_redes:
-            fig_noticias = px.bar(
-                x=list(noticias_redes.keys()), 
-                y=list(noticias_redes.values()),
-                labels={'x': 'Rede Social', 'y': 'Percentual de Recebimento (%)'},
-                title='Recebimento de Notícias por Redes Sociais',
-                color=list(noticias_redes.values()),
-                color_continuous_scale='Reds'
-            )
-            fig_noticias.update_traces(texttemplate='%{y:.2f}%', textposition='outside')
-        else:
-            fig_noticias = go.Figure()
-            fig_noticias.update_layout(title='Dados insuficientes para recebimento de notícias')
-        
-        # Frequência de leitura de notícias - Ponderada
-        freq_col = 'com que frequência lê notícias da cidade/ região'
-        if freq_col in filtered_df.columns:
-            freq_noticias = weighted_percentage(filtered_df, freq_col)
-            if not freq_noticias.empty:
-                fig_freq = px.pie(
-                    values=freq_noticias.values, 
-                    names=freq_noticias.index,
-                    title='Frequência de Leitura de Notícias (%)',
-                    color_discrete_sequence=px.colors.sequential.Blues
-                )
-                fig_freq.update_traces(texttemplate='%{percent:.2%}', textposition='inside')
-            else:
-                fig_freq = go.Figure()
-                fig_freq.update_layout(title='Dados insuficientes para frequência de leitura')
-        else:
-            fig_freq = go.Figure()
-            fig_freq.update_layout(title='Coluna de frequência de leitura não encontrada')
-        
-        # Sites/blogs de notícias - Ponderados
-        site_col = 'site/ blog de notícias p5a'
-        if site_col in filtered_df.columns:
-            sites_noticias = weighted_percentage(filtered_df, site_col).nlargest(10)
-            if not sites_noticias.empty:
-                fig_sites = px.bar(
-                    x=sites_noticias.index, 
-                    y=sites_noticias.values,
-                    labels={'x': 'Site/Blog', 'y': 'Percentual (%)'},
-                    title='Top 10 Sites/Blogs de Notícias',
-                    color=sites_noticias.values,
-                    color_continuous_scale='Blues'
-                )
-                fig_sites.update_traces(texttemplate='%{y:.2f}%', textposition='outside')
-            else:
-                fig_sites = go.Figure()
-                fig_sites.update_layout(title='Dados insuficientes para sites/blogs')
-        else:
-            fig_sites = go.Figure()
-            fig_sites.update_layout(title='Coluna de sites/blogs não encontrada')
-        
-        return html.Div([
+                create_dropdown('explorar-demografico', [{'label': c.title(), 'value': c} for c in demograficos_explorar],
+                                'região' if 'região' in demograficos_explorar else demograficos_explorar[0],
+                                'Variável Demográfica'),
+            ], className='four columns'),
             html.Div([
-                html.Div([
-                    create_graph_card(fig_redes, 'Uso de Redes Sociais'),
-                ], className='six columns'),
-                
-                html.Div([
-                    create_graph_card(fig_noticias, 'Recebimento de Notícias por Redes Sociais'),
-                ], className='six columns'),
-            ], className='row'),
-            
+                create_dropdown('explorar-pergunta', [{'label': c, 'value': c} for c in perguntas_explorar],
+                                apr_gov_col if apr_gov_col in perguntas_explorar else perguntas_explorar[0],
+                                'Pergunta'),
+            ], className='eight columns'),
+        ], className='row'),
+        dcc.Loading(html.Div(id='explorar-grafico'))
+    ])
+
+secoes_abas = {
+    'tab-governo': secao_figuras_politicas,
+    'tab-programas': secao_programa_especifico,
+    'tab-figuras': secao_figura_publica,
+    'tab-mapa': secao_mapa,
+    'tab-explorar': secao_explorar,
+}
+
+# Função para criar um card cujo gráfico é calculado sob demanda pelo callback render_grafico
+def create_lazy_graph_card(grafico_id, title):
+    return create_card(title, dcc.Loading(html.Div(id={'type': 'grafico-card', 'index': grafico_id},
+                                                   style={'minHeight': '450px'})))
+
+# Função para dispor os cards dos gráficos de uma aba em linhas (dois por
+# linha), com `criar_card(grafico_id, titulo)` montando cada card
+def linhas_de_cards(tab, criar_card):
+    return [
+        html.Div([
             html.Div([
-                html.Div([
-                    create_graph_card(fig_freq, 'Frequência de Leitura de Notícias'),
-                ], className='six columns'),
-                
-                html.Div([
-                    create_graph_card(fig_sites, 'Sites/Blogs de Notícias'),
-                ], className='six columns'),
-            ], className='row'),
-        ])
-    
-    elif tab == 'tab-governo':
-        # Gráficos para a aba de Avaliação de Governo - Ponderados
-        
-        # Estado está no rumo certo ou errado - Ponderado
-        rumo_col = 'avaliação imagem: sergipe está caminhando no rumo certo ou errado?'
-        if rumo_col in filtered_df.columns:
-            rumo_count = weighted_percentage(filtered_df, rumo_col)
-            if not rumo_count.empty:
-                fig_rumo = px.pie(
-                    values=rumo_count.values,
-                    names=rumo_count.index,
-                    title='Sergipe está caminhando no rumo certo ou errado? (%)',
-                    color_discrete_sequence=px.colors.sequential.Blues
-                )
-                fig_rumo.update_traces(texttemplate='%{percent:.2%}', textposition='inside')
-            else:
-                fig_rumo = go.Figure()
-                fig_rumo.update_layout(title='Dados insuficientes para direção do estado')
-        else:
-            fig_rumo = go.Figure()
-            fig_rumo.update_layout(title='Coluna de direção do estado não encontrada')
-        
-        # Avaliação do Governador - Ponderada
-        gov_col = 'avaliação imagem: governador fábio mitidieri'
-        if gov_col in filtered_df.columns:
-            gov_count = weighted_percentage(filtered_df, gov_col)
-            if not gov_count.empty:
-                fig_gov = px.pie(
-                    values=gov_count.values, 
-                    names=gov_count.index,
-                    title='Avaliação do Governador (%)',
-                    color_discrete_sequence=px.colors.sequential.Reds
-                )
-                fig_gov.update_traces(texttemplate='%{percent:.2%}', textposition='inside')
-            else:
-                fig_gov = go.Figure()
-                fig_gov.update_layout(title='Dados insuficientes para avaliação do governador')
-        else:
-            fig_gov = go.Figure()
-            fig_gov.update_layout(title='Coluna de avaliação do governador não encontrada')
-        
-        # Aprovação do Governador - Ponderada
-        apr_gov_col = 'aprovação imagem: governador fábio mitidieri'
-        if apr_gov_col in filtered_df.columns:
-            apr_gov_count = weighted_percentage(filtered_df, apr_gov_col)
-            if not apr_gov_count.empty:
-                fig_apr_gov = px.pie(
-                    values=apr_gov_count.values, 
-                    names=apr_gov_count.index,
-                    title='Aprovação do Governador (%)',
-                    color_discrete_sequence=px.colors.sequential.Greens
-                )
-                fig_apr_gov.update_traces(texttemplate='%{percent:.2%}', textposition='inside')
-            else:
-                fig_apr_gov = go.Figure()
-                fig_apr_gov.update_layout(title='Dados insuficientes para aprovação do governador')
-        else:
-            fig_apr_gov = go.Figure()
-            fig_apr_gov.update_layout(title='Coluna de aprovação do governador não encontrada')
-        
-        # Avaliação de Políticas Públicas - Ponderada
-        politicas = [
-            'avaliação educação: ensino público e escolas estaduais',
-            'avaliação emprego: geração de empregos',
-            'avaliação saneamento: abastecimento de água',
-            'avaliação saúde: saúde pública no geral',
-            'avaliação segurança: segurança pública'
-        ]
-        
-        # Criando um dataframe para as avaliações ponderadas
-        politicas_data = []
-        for politica in politicas:
-            if politica in filtered_df.columns:
-                area = politica.split(':')[0].replace('avaliação ', '')
-                
-                # Calcular a contagem ponderada para cada avaliação
-                avaliacao_values = filtered_df[politica].dropna().unique()
-                avaliacao_values = [av for av in avaliacao_values if av != '.']
-                
-                for avaliacao in avaliacao_values:
-                    mask = filtered_df[politica] == avaliacao
-                    peso_total = filtered_df.loc[mask, 'peso'].sum()
-                    all_peso = filtered_df.loc[filtered_df[politica].isin(avaliacao_values), 'peso'].sum()
-                    
-                    if all_peso > 0:  # Evitar divisão por zero
-                        percentual = (peso_total / all_peso) * 100
-                        politicas_data.append({
-                            'Área': area,
-                            'Avaliação': avaliacao,
-                            'Percentual': percentual
-                        })
-        
-        if politicas_data:
-            df_politicas = pd.DataFrame(politicas_data)
-            
-            fig_politicas = px.bar(
-                df_politicas,
-                x='Área',
-                y='Percentual',
-                color='Avaliação',
-                barmode='group',
-                title='Avaliação de Políticas Públicas (%)',
-                color_discrete_sequence=px.colors.sequential.Plasma_r
-            )
-            fig_politicas.update_traces(texttemplate='%{y:.2f}%', textposition='outside')
-        else:
-            fig_politicas = go.Figure()
-            fig_politicas.update_layout(
-                title='Dados insuficientes para avaliação de políticas públicas',
-            )
-        
+                criar_card(grafico.id, grafico.titulo),
+            ], className='six columns' if len(linha) > 1 else 'twelve columns')
+            for grafico in linha
+        ], className='row')
+        for linha in graficos_abas.get(tab, [])
+    ]
+
+# Função para criar o conteúdo de uma aba calculada em segundo plano: a barra
+# de progresso e o espaço que recebe todos os cards quando a tarefa termina
+def create_background_tab(tab):
+    return html.Div([
+        dcc.Store(id='aba-segundo-plano-tab', data=tab),
+        html.Div([
+            html.Progress(id='aba-progresso', value='0', max='1', style={'width': '100%'}),
+            html.Div(id='aba-progresso-texto', style={'textAlign': 'center', 'color': colors['text']}),
+        ], id='aba-progresso-painel', style={'display': 'none', 'margin': '10px'}),
+        html.Div(id='aba-segundo-plano', style={'minHeight': '450px'}),
+    ])
+
+# Callback para atualizar o conteúdo das abas: só a estrutura, com um card
+# vazio por gráfico, sem calcular nenhuma agregação
+@callback(
+    Output('tab-content', 'children'),
+    Input('tabs', 'value')
+)
+@metricas.instrumentar('render_content')
+def render_content(tab):
+    if tab in cascas_abas:
+        return cascas_abas[tab]
+    return estrutura_aba(tab)
+
+# Função para montar a estrutura de uma aba (guardada pronta no artefato do layout)
+def estrutura_aba(tab):
+    if tab in ABAS_SEGUNDO_PLANO:
+        linhas = [create_background_tab(tab)]
+    else:
+        linhas = linhas_de_cards(tab, lambda grafico_id, titulo: create_lazy_graph_card(grafico_id, titulo))
+    if tab in secoes_abas:
+        linhas.append(secoes_abas[tab]())
+    return html.Div(linhas)
+
+# Callback para avisar quando os filtros não deixam nenhum dado
+@callback(
+    Output('tab-aviso', 'children'),
+    [Input('filtros-aplicados', 'data'),
+     Input('onda-dropdown', 'value')]
+)
+@metricas.instrumentar('atualizar_aviso')
+def atualizar_aviso(filtros_aplicados, onda):
+    if len(filter_dataframe(dados_da_onda(onda), filtros_aplicados)) == 0:
         return html.Div([
-            html.Div([
-                html.Div([
-                    create_graph_card(fig_rumo, 'Direção do Estado'),
-                ], className='six columns'),
-                
-                html.Div([
-                    create_graph_card(fig_gov, 'Avaliação do Governador'),
-                ], className='six columns'),
-            ], className='row'),
-            
-            html.Div([
-                html.Div([
-                    create_graph_card(fig_apr_gov, 'Aprovação do Governador'),
-                ], className='six columns'),
-                
-                html.Div([
-                    create_graph_card(fig_politicas, 'Avaliação de Políticas Públicas'),
-                ], className='six columns'),
-            ], className='row'),
-            
-            html.Div([
-                html.H2('Avaliação de Figuras Políticas', 
-                      style={'textAlign': 'center', 'color': colors['text'], 'marginTop': '30px'}),
-                
-                html.Div([
-                    dcc.Dropdown(
-                        id='figura-dropdown',
-                        options=[
-                            {'label': 'Ex-governador Belivaldo Chagas', 'value': 'avaliação imagem: ex-governador belivaldo chagas'},
-                            {'label': 'Edvaldo Nogueira (ex-prefeito de Aracaju)', 'value': 'avaliação imagem: edvaldo nogueira, ex-prefeito de aracaju'},
-                            {'label': 'Emília Corrêa (prefeita eleita de Aracaju)', 'value': 'avaliação imagem: emília corrêa, prefeita eleita de aracaju'},
-                            {'label': 'Presidente Lula', 'value': 'avaliação imagem: presidente lula'},
-                            {'label': 'Ex-presidente Jair Bolsonaro', 'value': 'avaliação imagem: ex-presidente jair bolsonaro'},
-                        ],
-                        value='avaliação imagem: ex-governador belivaldo chagas',
-                        style={'width': '100%', 'marginBottom': '20px'}
-                    )
-                ]),
-                
-                html.Div(id='figura-graph')
-            ]),
+            html.H3("Nenhum dado encontrado com os filtros aplicados.", 
+                   style={'textAlign': 'center', 'color': 'red', 'margin': '50px'})
         ])
+    return None
+
+# Função para desenhar a figura de um gráfico a partir do resultado da sua
+# agregação (etapa executada no pool: recebe e retorna objetos serializáveis)
+def desenhar_grafico(item):
+    grafico_id, agregado = item
+    return planejador_graficos.graficos[grafico_id].desenhar(agregado)
+
+# Função para construir todas as figuras de uma aba de uma vez (pré-cálculo
+# com o executor ativo): o plano da aba roda neste processo (uma passada sobre
+# as colunas da aba e cada agregação compartilhada uma vez, com cache) e as
+# figuras em paralelo no executor
+@cache_resultados.memoize(f'construir_aba:{registro_ondas.versao}')
+def construir_aba(tab, filtros_aplicados, onda):
+    filtered_df = filter_dataframe(dados_da_onda(onda), filtros_aplicados)
+    with metricas.etapa('agregacao'):
+        agregados = planejador_graficos.executar(tab, filtered_df, filtros_aplicados)
+    with metricas.etapa('figura'):
+        return dict(zip(agregados, executor_figuras.mapear(desenhar_grafico, agregados.items())))
+
+# Função para calcular o gráfico de um card (guardada no cache por gráfico,
+# estado de filtros e onda). Só a agregação e a figura do próprio gráfico: a
+# passada sobre as colunas da aba fica na visão e serve aos outros cards. Com
+# o executor ativo, o primeiro card constrói a aba inteira em paralelo e os
+# demais aproveitam o cache.
+@cache_resultados.memoize(f'construir_grafico:{registro_ondas.versao}')
+def construir_grafico(grafico_id, filtros_aplicados, onda):
+    filtered_df = filter_dataframe(dados_da_onda(onda), filtros_aplicados)
+    if len(filtered_df) == 0 or grafico_id not in aba_do_grafico:
+        return html.Div()
+    tab = aba_do_grafico[grafico_id]
+    if executor_figuras.ativo:
+        fig = construir_aba(tab, filtros_aplicados, onda)[grafico_id]
+    else:
+        with metricas.etapa('agregacao'):
+            agregado = planejador_graficos.executar(tab, filtered_df, filtros_aplicados, ids=[grafico_id])[grafico_id]
+        with metricas.etapa('figura'):
+            fig = desenhar_grafico((grafico_id, agregado))
+    return dcc.Graph(figure=fig)
+
+# Callback para calcular cada gráfico das abas no seu próprio card
+@callback(
+    Output({'type': 'grafico-card', 'index': MATCH}, 'children'),
+    [Input({'type': 'grafico-card', 'index': MATCH}, 'id'),
+     Input('filtros-aplicados', 'data'),
+     Input('onda-dropdown', 'value')]
+)
+@metricas.instrumentar('render_grafico')
+def render_grafico(card_id, filtros_aplicados, onda):
+    return construir_grafico(card_id['index'], filtros_aplicados, onda)
+
+# Callback das abas pesadas, executado como tarefa em segundo plano: calcula
+# os gráficos da aba um a um, informando o progresso, e devolve os cards
+# prontos. Uma nova chamada (filtros ou onda) cancela a tarefa anterior, e a
+# troca de aba cancela a tarefa em andamento.
+if tarefas_segundo_plano is not None:
+    @callback(
+        Output('aba-segundo-plano', 'children'),
+        [Input('aba-segundo-plano-tab', 'data'),
+         Input('filtros-aplicados', 'data'),
+         Input('onda-dropdown', 'value')],
+        background=True,
+        manager=tarefas_segundo_plano,
+        interval=500,
+        progress=[Output('aba-progresso', 'value'),
+                  Output('aba-progresso', 'max'),
+                  Output('aba-progresso-texto', 'children')],
+        running=[(Output('aba-progresso-painel', 'style'), {'display': 'block', 'margin': '10px'},
+                  {'display': 'none'}),
+                 (Output('aba-segundo-plano', 'style'), {'minHeight': '450px', 'opacity': 0.5},
+                  {'minHeight': '450px'})],
+        cancel=[Input('tabs', 'value')]
+    )
+    @metricas.instrumentar('render_aba_segundo_plano')
+    def render_aba_segundo_plano(set_progress, tab, filtros_aplicados, onda):
+        if tab not in graficos_abas:
+            raise dash.exceptions.PreventUpdate
+        if len(filter_dataframe(dados_da_onda(onda), filtros_aplicados)) == 0:
+            return None
+        ids = planejador_graficos.ids(tab)
+        graficos = {}
+        for i, grafico_id in enumerate(ids):
+            set_progress((str(i), str(len(ids)), f'Calculando gráfico {i + 1} de {len(ids)}...'))
+            graficos[grafico_id] = construir_grafico(grafico_id, filtros_aplicados, onda)
+        return html.Div(linhas_de_cards(tab, lambda grafico_id, titulo: create_card(titulo, graficos[grafico_id])))
+
+# Função para calcular os valores do mapa, na ordem das geometrias: o
+# percentual ponderado da resposta entre os respondentes válidos de cada
+# cidade (None sem dados) e o número de respondentes de cada cidade
+@cache_resultados.memoize('dados_mapa')
+def dados_mapa(df, coluna, categoria):
+    geometrias = geometrias_mapa()
+    if 'cidade' not in df.columns:
+        return [None] * len(geometrias.municipios), [0] * len(geometrias.municipios)
+    tabela = weighted_crosstab(df, 'cidade', coluna)
+    if tabela.empty or categoria not in tabela.columns:
+        valores = pd.Series(dtype=float)
+    else:
+        valores = tabela[categoria]
+    valores = valores.reindex(geometrias.municipios).round(2)
     
-    elif tab == 'tab-programas':
-        # Gráficos para a aba de Programas - Ponderados
-        
-        # Conhecimento dos programas - Ponderado como percentual
-        programas = grupos_colunas['programas'][:10]  # Limitando a 10 programas para melhor visualização
-        
-        # Preparar dados para o gráfico com ponderação
-        programas_data = []
-        for programa in programas:
-            if programa in filtered_df.columns:
-                nome_programa = programa.split(':')[1].strip() if ':' in programa else programa
-                if len(nome_programa) > 30:
-                    nome_programa = nome_programa[:27] + '...'
-                
-                # Total de pesos para este programa (Sim + Não)
-                programa_df = filtered_df[(filtered_df[programa] == 'Sim') | (filtered_df[programa] == 'Não')]
-                total_peso = programa_df['peso'].sum()
-                
-                # Calcular percentuais
-                sim_df = filtered_df[filtered_df[programa] == 'Sim']
-                sim_peso = sim_df['peso'].sum()
-                
-                nao_df = filtered_df[filtered_df[programa] == 'Não']
-                nao_peso = nao_df['peso'].sum()
-                
-                if total_peso > 0:  # Evitar divisão por zero
-                    sim_perc = (sim_peso / total_peso) * 100
-                    nao_perc = (nao_peso / total_peso) * 100
-                    
-                    programas_data.append({
-                        'Programa': nome_programa,
-                        'Conhece (%)': round(sim_perc, 2),
-                        'Não Conhece (%)': round(nao_perc, 2)
-                    })
-        
-        df_programas = pd.DataFrame(programas_data)
-        
-        # Gráfico de barras empilhadas para conhecimento dos programas
-        if not df_programas.empty:
-            fig_programas = px.bar(
-                df_programas,
-                x='Programa',
-                y=['Conhece (%)', 'Não Conhece (%)'],
-                title='Conhecimento dos Programas do Governo (%)',
-                barmode='stack',
-                labels={'value': 'Percentual (%)', 'variable': 'Resposta'},
-                color_discrete_sequence=['#1E88E5', '#FFC107']
-            )
-            fig_programas.update_traces(texttemplate='%{y:.2f}%', textposition='inside')
-            fig_programas.update_layout(xaxis_tickangle=-45)
-        else:
-            fig_programas = go.Figure()
-            fig_programas.update_layout(
-                title='Dados insuficientes para análise de programas',
-            )
-        
-        # Gráfico de pizza para comparar conhecimento de algum programa específico - Ponderado
-        programa_destaque = 'evento: verão sergipe, arraiá do povo e vila do forró'
-        if programa_destaque in filtered_df.columns:
-            prog_dest_count = weighted_percentage(filtered_df, programa_destaque)
-            if not prog_dest_count.empty:
-                fig_prog_destaque = px.pie(
-                    values=prog_dest_count.values, 
-                    names=prog_dest_count.index,
-                    title=f'Conhecimento: {programa_destaque.split(":")[1].strip()} (%)',
-                    color_discrete_sequence=px.colors.sequential.Blues
-                )
-                fig_prog_destaque.update_traces(texttemplate='%{percent:.2%}', textposition='inside')
-            else:
-                fig_prog_destaque = go.Figure()
-                fig_prog_destaque.update_layout(title='Dados insuficientes para programa destaque')
-        else:
-            fig_prog_destaque = go.Figure()
-            fig_prog_destaque.update_layout(title='Programa destaque não encontrado nos dados')
-        
-        # Top programas mais conhecidos - Ponderado como percentual
-        conhecimento_programas = {}
-        for programa in grupos_colunas['programas']:
-            if programa in filtered_df.columns:
-                # Total para este programa
-                programa_df = filtered_df[(filtered_df[programa] == 'Sim') | (filtered_df[programa] == 'Não')]
-                total_peso = programa_df['peso'].sum()
-                
-                # Contagem de 'Sim'
-                sim_df = filtered_df[filtered_df[programa] == 'Sim']
-                sim_peso = sim_df['peso'].sum()
-                
-                if total_peso > 0:  # Evitar divisão por zero
-                    conhecimento_programas[programa] = (sim_peso / total_peso) * 100
-        
-        top_programas = dict(sorted(conhecimento_programas.items(), key=lambda x: x[1], reverse=True)[:5])
-        top_programas_nomes = [p.split(':')[1].strip() if ':' in p else p for p in top_programas.keys()]
-        
-        if len(top_programas_nomes) > 0:
-            # Abreviar nomes muito longos
-            top_programas_nomes = [n[:27] + '...' if len(n) > 30 else n for n in top_programas_nomes]
-            
-            fig_top_prog = px.bar(
-                x=top_programas_nomes, 
-                y=list(top_programas.values()),
-                labels={'x': 'Programa', 'y': 'Conhecimento (%)'},
-                title='Top 5 Programas Mais Conhecidos',
-                color=list(top_programas.values()),
-                color_continuous_scale='Blues'
-            )
-            fig_top_prog.update_traces(texttemplate='%{y:.2f}%', textposition='outside')
-            fig_top_prog.update_layout(xaxis_tickangle=-45)
-        else:
-            fig_top_prog = go.Figure()
-            fig_top_prog.update_layout(
-                title='Dados insuficientes para Top 5 Programas',
-            )
-        
-        return html.Div([
-            html.Div([
-                html.Div([
-                    create_graph_card(fig_programas, 'Conhecimento dos Programas'),
-                ], className='twelve columns'),
-            ], className='row'),
-            
-            html.Div([
-                html.Div([
-                    create_graph_card(fig_prog_destaque, 'Destaque: Eventos de Verão e Arraiá'),
-                ], className='six columns'),
-                
-                html.Div([
-                    create_graph_card(fig_top_prog, 'Top Programas Mais Conhecidos'),
-                ], className='six columns'),
-            ], className='row'),
-            
-            html.Div([
-                html.H2('Análise de Programa Específico', 
-                       style={'textAlign': 'center', 'color': colors['text'], 'marginTop': '30px'}),
-                
-                html.Div([
-                    dcc.Dropdown(
-                        id='programa-dropdown',
-                        options=[{'label': p.split(':')[1].strip() if ':' in p else p, 
-                                 'value': p} for p in grupos_colunas['programas']],
-                        value=grupos_colunas['programas'][0],
-                        style={'width': '100%', 'marginBottom': '20px'}
-                    )
-                ]),
-                
-                html.Div(id='programa-graph')
-            ]),
-        ])
+    codigos = df.codigos('cidade')
+    contagens = np.bincount(codigos[codigos >= 0], minlength=len(df.categorias_de('cidade')))
+    respondentes = pd.Series(contagens, index=df.categorias_de('cidade')).reindex(geometrias.municipios, fill_value=0)
+    return [None if v != v else float(v) for v in valores], respondentes.astype(int).tolist()
+
+# Callback para as respostas possíveis do indicador escolhido no mapa, na onda selecionada
+@callback(
+    [Output('mapa-categoria', 'options'),
+     Output('mapa-categoria', 'value')],
+    [Input('mapa-coluna', 'value'),
+     Input('onda-dropdown', 'value')],
+    State('mapa-categoria', 'value')
+)
+@metricas.instrumentar('atualizar_categorias_mapa')
+def atualizar_categorias_mapa(coluna, onda, categoria):
+    dados = dados_da_onda(onda)
+    categorias = list(dados.categorias_de(coluna)) if coluna in dados.columns else []
+    opcoes = [{'label': c, 'value': c} for c in categorias]
+    if categoria not in categorias:
+        categoria = categorias[0] if categorias else None
+    return opcoes, categoria
+
+# Callback para atualizar o mapa com dash.Patch: mudanças de filtros, onda ou
+# indicador enviam só os valores (z) e os respondentes; o zoom troca a
+# geometria pelo nível de detalhe da nova escala, e só quando o nível muda
+@callback(
+    [Output('mapa-grafico', 'figure'),
+     Output('mapa-nivel', 'data')],
+    [Input('filtros-aplicados', 'data'),
+     Input('onda-dropdown', 'value'),
+     Input('mapa-coluna', 'value'),
+     Input('mapa-categoria', 'value'),
+     Input('mapa-grafico', 'relayoutData')],
+    State('mapa-nivel', 'data')
+)
+@metricas.instrumentar('atualizar_mapa')
+def atualizar_mapa(filtros_aplicados, onda, coluna, categoria, relayout, nivel_atual):
+    patch = Patch()
+    if dash.callback_context.triggered_id == 'mapa-grafico':
+        escala = (relayout or {}).get('geo.projection.scale')
+        nivel = nivel_da_escala(escala) if escala is not None else nivel_atual
+        geometrias = geometrias_mapa()
+        if nivel == nivel_atual or nivel not in geometrias.geojson:
+            raise dash.exceptions.PreventUpdate
+        patch['data'][0]['geojson'] = geometrias.geojson[nivel]
+        return patch, nivel
     
-    elif tab == 'tab-figuras':
-        # Gráficos para a aba de Figuras Públicas - Ponderados
-        
-        # Pegar algumas figuras públicas populares para análise
-        figuras_populares = [
-            'conhece figura: linda brasil',
-            'conhece figura: narcizo machado',
-            'conhece figura: adiberto de souza',
-            'conhece figura: luiz carlos focca',
-            'conhece figura: claudio nunes'
-        ]
-        
-        # Conhecimento das figuras públicas - Ponderado como percentual
-        conhecimento_figuras = {}
-        for figura in figuras_populares:
-            if figura in filtered_df.columns:
-                # Total para esta figura
-                figura_df = filtered_df[(filtered_df[figura] == 'Sim') | (filtered_df[figura] == 'Não')]
-                total_peso = figura_df['peso'].sum()
-                
-                # Contagem de 'Sim'
-                sim_df = filtered_df[filtered_df[figura] == 'Sim']
-                sim_peso = sim_df['peso'].sum()
-                
-                if total_peso > 0:  # Evitar divisão por zero
-                    conhecimento_figuras[figura.replace('conhece figura: ', '')] = (sim_peso / total_peso) * 100
-        
-        if conhecimento_figuras:
-            fig_conhecimento = px.bar(
-                x=list(conhecimento_figuras.keys()), 
-                y=list(conhecimento_figuras.values()),
-                labels={'x': 'Figura Pública', 'y': 'Percentual que Conhece (%)'},
-                title='Conhecimento de Figuras Públicas',
-                color=list(conhecimento_figuras.values()),
-                color_continuous_scale='Blues'
-            )
-            fig_conhecimento.update_traces(texttemplate='%{y:.2f}%', textposition='outside')
-        else:
-            fig_conhecimento = go.Figure()
-            fig_conhecimento.update_layout(title='Dados insuficientes para conhecimento de figuras públicas')
-        
-        # Imagem das figuras - Ponderada
-        figura_destaque = 'linda brasil'
-        imagem_col = f'imagem figura: {figura_destaque}'
-        if imagem_col in filtered_df.columns:
-            img_figura = weighted_percentage(filtered_df, imagem_col)
-            if not img_figura.empty:
-                fig_imagem = px.pie(
-                    values=img_figura.values, 
-                    names=img_figura.index,
-                    title=f'Imagem de {figura_destaque.title()} (%)',
-                    color_discrete_sequence=px.colors.sequential.RdBu
-                )
-                fig_imagem.update_traces(texttemplate='%{percent:.2%}', textposition='inside')
-            else:
-                fig_imagem = go.Figure()
-                fig_imagem.update_layout(title=f'Dados insuficientes para Imagem de {figura_destaque.title()}')
-        else:
-            fig_imagem = go.Figure()
-            fig_imagem.update_layout(title=f'Coluna de imagem para {figura_destaque} não encontrada')
-        
-        # Frequência de acompanhamento - Ponderada
-        freq_col = f'freq. Acompanhamento figura: {figura_destaque}'
-        if freq_col in filtered_df.columns:
-            freq_df = filtered_df[filtered_df[freq_col] != '.']
-            freq_acompanhamento = weighted_percentage(freq_df, freq_col) if not freq_df.empty else pd.Series()
-            
-            if not freq_acompanhamento.empty:
-                fig_freq = px.pie(
-                    values=freq_acompanhamento.values, 
-                    names=freq_acompanhamento.index,
-                    title=f'Frequência de Acompanhamento: {figura_destaque.title()} (%)',
-                    color_discrete_sequence=px.colors.sequential.Greens
-                )
-                fig_freq.update_traces(texttemplate='%{percent:.2%}', textposition='inside')
-            else:
-                fig_freq = go.Figure()
-                fig_freq.update_layout(title=f'Dados insuficientes para Frequência de Acompanhamento')
+    if coluna is None or categoria is None:
+        raise dash.exceptions.PreventUpdate
+    filtered_df = filter_dataframe(dados_da_onda(onda), filtros_aplicados)
+    with metricas.etapa('agregacao'):
+        valores, respondentes = dados_mapa(filtered_df, coluna, categoria)
+    patch['data'][0]['z'] = valores
+    patch['data'][0]['customdata'] = respondentes
+    patch['layout']['title']['text'] = f'{coluna}: {categoria} (%)'
+    return patch, dash.no_update
+
+# Callback para o mapa de calor da aba de exploração: percentual de cada
+# resposta da pergunta dentro de cada valor da variável demográfica
+@callback(
+    Output('explorar-grafico', 'children'),
+    [Input('explorar-demografico', 'value'),
+     Input('explorar-pergunta', 'value'),
+     Input('filtros-aplicados', 'data'),
+     Input('onda-dropdown', 'value')]
+)
+@metricas.instrumentar('atualizar_explorador')
+def atualizar_explorador(demografico, pergunta, filtros_aplicados, onda):
+    if not demografico or not pergunta:
+        raise dash.exceptions.PreventUpdate
+    df = dados_da_onda(onda)
+    filtered_df = filter_dataframe(df, filtros_aplicados)
+    
+    with metricas.etapa('agregacao'):
+        tabela = coocorrencias(df).crosstab(filtered_df, demografico, pergunta)
+    
+    with metricas.etapa('figura'):
+        if tabela.empty:
+            fig = ff.figura_vazia('Dados insuficientes para o cruzamento com os filtros aplicados')
         else:
-            fig_freq = go.Figure()
-            fig_freq.update_layout(title=f'Coluna de frequência para {figura_destaque} não encontrada')
-        
-        # Análise de conhecimento por região - Ponderada
-        conhece_col = f'conhece figura: {figura_destaque}'
-        
-        try:
-            if conhece_col in filtered_df.columns:
-                conhecimento_por_regiao = weighted_crosstab(filtered_df, 'região', conhece_col)
-                
-                if not conhecimento_por_regiao.empty and 'Sim' in conhecimento_por_regiao.columns:
-                    fig_regiao = px.bar(
-                        x=conhecimento_por_regiao.index,
-                        y=conhecimento_por_regiao['Sim'],
-                        labels={'x': 'Região', 'y': 'Percentual que Conhece (%)'},
-                        title=f'Conhecimento de {figura_destaque.title()} por Região',
-                        color=conhecimento_por_regiao['Sim'],
-                        color_continuous_scale='Viridis'
-                    )
-                    fig_regiao.update_traces(texttemplate='%{y:.2f}%', textposition='outside')
-                else:
-                    fig_regiao = go.Figure()
-                    fig_regiao.update_layout(title=f'Dados insuficientes para análise por região')
-            else:
-                fig_regiao = go.Figure()
-                fig_regiao.update_layout(title=f'Coluna de conhecimento para {figura_destaque} não encontrada')
-        except:
-            fig_regiao = go.Figure()
-            fig_regiao.update_layout(title=f'Erro ao calcular conhecimento por região')
-        
-        return html.Div([
-            html.Div([
-                html.Div([
-                    create_graph_card(fig_conhecimento, 'Conhecimento de Figuras Públicas'),
-                ], className='six columns'),
-                
-                html.Div([
-                    create_graph_card(fig_imagem, f'Imagem de {figura_destaque.title()}'),
-                ], className='six columns'),
-            ], className='row'),
-            
-            html.Div([
-                html.Div([
-                    create_graph_card(fig_freq, f'Frequência de Acompanhamento: {figura_destaque.title()}'),
-                ], className='six columns'),
-                
-                html.Div([
-                    create_graph_card(fig_regiao, f'Conhecimento por Região: {figura_destaque.title()}'),
-                ], className='six columns'),
-            ], className='row'),
-            
-            html.Div([
-                html.H2('Análise de Figura Pública Específica', 
-                      style={'textAlign': 'center', 'color': colors['text'], 'marginTop': '30px'}),
-                
-                html.Div([
-                    dcc.Dropdown(
-                        id='figura-publica-dropdown',
-                        options=[{'label': f.replace('conhece figura: ', ''), 
-                                 'value': f} for f in figuras_populares],
-                        value=figuras_populares[0],
-                        style={'width': '100%', 'marginBottom': '20px'}
-                    )
-                ]),
-                
-                html.Div(id='figura-publica-graph')
-            ]),
-        ])
+            fig = ff.mapa_calor(tabela.to_numpy(), tabela.columns, tabela.index,
+                                f'{pergunta} por {demografico} (%)', 'Resposta', demografico.title())
+            fig['layout']['height'] = max(450, 120 + 28 * len(tabela.index))
+    return create_graph_card(fig, 'Cruzamento Ponderado')
 
 # Callbacks para gráficos dinâmicos considerando filtros e ponderação
 
@@ -1073,6 +1349,7 @@ def render_content(tab, filtros_aplicados):
     Input('limpar-filtros', 'n_clicks'),
     prevent_initial_call=True
 )
+@metricas.instrumentar('limpar_todos_filtros')
 def limpar_todos_filtros(n_clicks):
     if n_clicks:
         return [[] for _ in filtros_config]
@@ -1082,11 +1359,14 @@ def limpar_todos_filtros(n_clicks):
 @callback(
     Output('figura-graph', 'children'),
     [Input('figura-dropdown', 'value'),
-     Input('filtros-aplicados', 'data')]
+     Input('filtros-aplicados', 'data'),
+     Input('onda-dropdown', 'value')]
 )
-def update_figura_graph(figura_col, filtros_aplicados):
-    # Filtrar o dataframe com base nos filtros aplicados
-    filtered_df = filter_dataframe(df, filtros_aplicados)
+@metricas.instrumentar('update_figura_graph')
+@cache_resultados.memoize(f'update_figura_graph:{registro_ondas.versao}')
+def update_figura_graph(figura_col, filtros_aplicados, onda):
+    # Filtrar os dados da onda selecionada com base nos filtros aplicados
+    filtered_df = filter_dataframe(dados_da_onda(onda), filtros_aplicados)
     
     if len(filtered_df) == 0:
         return html.Div([
@@ -1102,21 +1382,15 @@ def update_figura_graph(figura_col, filtros_aplicados):
         ])
     
     # Filtrar valores vazios e calcular contagem ponderada
-    figura_data = weighted_percentage(filtered_df, figura_col)
+    with metricas.etapa('agregacao'):
+        figura_data = weighted_percentage(filtered_df, figura_col)
     
-    if figura_data.empty:
-        fig = go.Figure()
-        fig.update_layout(
-            title=f'Dados insuficientes para {figura_col.split(":")[1].strip() if ":" in figura_col else figura_col}',
-        )
-    else:
-        fig = px.pie(
-            values=figura_data.values, 
-            names=figura_data.index,
-            title=f'Avaliação: {figura_col.split(":")[1].strip() if ":" in figura_col else figura_col} (%)',
-            color_discrete_sequence=px.colors.sequential.RdBu
-        )
-        fig.update_traces(texttemplate='%{percent:.2%}', textposition='inside')
+    with metricas.etapa('figura'):
+        if figura_data.empty:
+            fig = ff.figura_vazia(f'Dados insuficientes para {figura_col.split(":")[1].strip() if ":" in figura_col else figura_col}')
+        else:
+            fig = ff.pizza(figura_data.values, figura_data.index,
+                           f'Avaliação: {figura_col.split(":")[1].strip() if ":" in figura_col else figura_col} (%)', 'RdBu')
     
     return create_graph_card(fig, 'Detalhes da Avaliação')
 
@@ -1124,11 +1398,14 @@ def update_figura_graph(figura_col, filtros_aplicados):
 @callback(
     Output('programa-graph', 'children'),
     [Input('programa-dropdown', 'value'),
-     Input('filtros-aplicados', 'data')]
+     Input('filtros-aplicados', 'data'),
+     Input('onda-dropdown', 'value')]
 )
-def update_programa_graph(programa_col, filtros_aplicados):
-    # Filtrar o dataframe com base nos filtros aplicados
-    filtered_df = filter_dataframe(df, filtros_aplicados)
+@metricas.instrumentar('update_programa_graph')
+@cache_resultados.memoize(f'update_programa_graph:{registro_ondas.versao}')
+def update_programa_graph(programa_col, filtros_aplicados, onda):
+    # Filtrar os dados da onda selecionada com base nos filtros aplicados
+    filtered_df = filter_dataframe(dados_da_onda(onda), filtros_aplicados)
     
     if len(filtered_df) == 0:
         return html.Div([
@@ -1144,47 +1421,31 @@ def update_programa_graph(programa_col, filtros_aplicados):
         ])
     
     # Filtrar valores vazios e calcular percentual ponderado
-    programa_data = weighted_percentage(filtered_df, programa_col)
+    with metricas.etapa('agregacao'):
+        programa_data = weighted_percentage(filtered_df, programa_col)
     
     # Gráfico de pizza para o programa
-    if programa_data.empty:
-        fig = go.Figure()
-        fig.update_layout(
-            title=f'Dados insuficientes para {programa_col.split(":")[1].strip() if ":" in programa_col else programa_col}',
-        )
-    else:
-        fig = px.pie(
-            values=programa_data.values, 
-            names=programa_data.index,
-            title=f'Conhecimento: {programa_col.split(":")[1].strip() if ":" in programa_col else programa_col} (%)',
-            color_discrete_sequence=px.colors.sequential.Blues
-        )
-        fig.update_traces(texttemplate='%{percent:.2%}', textposition='inside')
+    with metricas.etapa('figura'):
+        if programa_data.empty:
+            fig = ff.figura_vazia(f'Dados insuficientes para {programa_col.split(":")[1].strip() if ":" in programa_col else programa_col}')
+        else:
+            fig = ff.pizza(programa_data.values, programa_data.index,
+                           f'Conhecimento: {programa_col.split(":")[1].strip() if ":" in programa_col else programa_col} (%)', 'Blues')
     
     # Análise por região - Ponderada
     try:
-        conhecimento_por_regiao = weighted_crosstab(filtered_df, 'região', programa_col)
+        with metricas.etapa('agregacao'):
+            conhecimento_por_regiao = weighted_crosstab(filtered_df, 'região', programa_col)
         
-        if not conhecimento_por_regiao.empty and 'Sim' in conhecimento_por_regiao.columns:
-            fig_regiao = px.bar(
-                x=conhecimento_por_regiao.index,
-                y=conhecimento_por_regiao['Sim'],
-                labels={'x': 'Região', 'y': 'Percentual que Conhece (%)'},
-                title=f'Conhecimento por Região',
-                color=conhecimento_por_regiao['Sim'],
-                color_continuous_scale='Viridis'
-            )
-            fig_regiao.update_traces(texttemplate='%{y:.2f}%', textposition='outside')
-        else:
-            fig_regiao = go.Figure()
-            fig_regiao.update_layout(
-                title=f'Dados insuficientes para análise por região',
-            )
+        with metricas.etapa('figura'):
+            if not conhecimento_por_regiao.empty and 'Sim' in conhecimento_por_regiao.columns:
+                fig_regiao = ff.barras(conhecimento_por_regiao.index, conhecimento_por_regiao['Sim'],
+                                       'Conhecimento por Região', 'Região', 'Percentual que Conhece (%)',
+                                       escala='Viridis')
+            else:
+                fig_regiao = ff.figura_vazia('Dados insuficientes para análise por região')
     except:
-        fig_regiao = go.Figure()
-        fig_regiao.update_layout(
-            title=f'Erro ao calcular conhecimento por região',
-        )
+        fig_regiao = ff.figura_vazia('Erro ao calcular conhecimento por região')
     
     return html.Div([
         html.Div([
@@ -1200,11 +1461,14 @@ def update_programa_graph(programa_col, filtros_aplicados):
 @callback(
     Output('figura-publica-graph', 'children'),
     [Input('figura-publica-dropdown', 'value'),
-     Input('filtros-aplicados', 'data')]
+     Input('filtros-aplicados', 'data'),
+     Input('onda-dropdown', 'value')]
 )
-def update_figura_publica_graph(figura_col, filtros_aplicados):
-    # Filtrar o dataframe com base nos filtros aplicados
-    filtered_df = filter_dataframe(df, filtros_aplicados)
+@metricas.instrumentar('update_figura_publica_graph')
+@cache_resultados.memoize(f'update_figura_publica_graph:{registro_ondas.versao}')
+def update_figura_publica_graph(figura_col, filtros_aplicados, onda):
+    # Filtrar os dados da onda selecionada com base nos filtros aplicados
+    filtered_df = filter_dataframe(dados_da_onda(onda), filtros_aplicados)
     
     if len(filtered_df) == 0:
         return html.Div([
@@ -1222,47 +1486,31 @@ def update_figura_publica_graph(figura_col, filtros_aplicados):
     figura_nome = figura_col.replace('conhece figura: ', '')
     
     # Conhecimento da figura - Ponderado
-    conhecimento_data = weighted_percentage(filtered_df, figura_col)
+    with metricas.etapa('agregacao'):
+        conhecimento_data = weighted_percentage(filtered_df, figura_col)
     
-    if conhecimento_data.empty:
-        fig_conhecimento = go.Figure()
-        fig_conhecimento.update_layout(
-            title=f'Dados insuficientes para Conhecimento de {figura_nome}',
-        )
-    else:
-        fig_conhecimento = px.pie(
-            values=conhecimento_data.values, 
-            names=conhecimento_data.index,
-            title=f'Conhecimento: {figura_nome} (%)',
-            color_discrete_sequence=px.colors.sequential.Blues
-        )
-        fig_conhecimento.update_traces(texttemplate='%{percent:.2%}', textposition='inside')
+    with metricas.etapa('figura'):
+        if conhecimento_data.empty:
+            fig_conhecimento = ff.figura_vazia(f'Dados insuficientes para Conhecimento de {figura_nome}')
+        else:
+            fig_conhecimento = ff.pizza(conhecimento_data.values, conhecimento_data.index,
+                                        f'Conhecimento: {figura_nome} (%)', 'Blues')
     
     # Imagem da figura - Ponderada
     imagem_col = f'imagem figura: {figura_nome}'
     if imagem_col in filtered_df.columns:
         # Filtrar valores vazios
-        imagem_df = filtered_df[filtered_df[imagem_col] != '.']
-        imagem_data = weighted_percentage(imagem_df, imagem_col)
+        with metricas.etapa('agregacao'):
+            imagem_df = filtered_df.subconjunto(filtered_df.codigos(imagem_col) != NAO_SE_APLICA)
+            imagem_data = weighted_percentage(imagem_df, imagem_col)
         
-        if imagem_data.empty:
-            fig_imagem = go.Figure()
-            fig_imagem.update_layout(
-                title=f'Dados insuficientes para Imagem de {figura_nome}',
-            )
-        else:
-            fig_imagem = px.pie(
-                values=imagem_data.values, 
-                names=imagem_data.index,
-                title=f'Imagem: {figura_nome} (%)',
-                color_discrete_sequence=px.colors.sequential.RdBu
-            )
-            fig_imagem.update_traces(texttemplate='%{percent:.2%}', textposition='inside')
+        with metricas.etapa('figura'):
+            if imagem_data.empty:
+                fig_imagem = ff.figura_vazia(f'Dados insuficientes para Imagem de {figura_nome}')
+            else:
+                fig_imagem = ff.pizza(imagem_data.values, imagem_data.index, f'Imagem: {figura_nome} (%)', 'RdBu')
     else:
-        fig_imagem = go.Figure()
-        fig_imagem.update_layout(
-            title=f'Dados de Imagem não disponíveis para {figura_nome}',
-        )
+        fig_imagem = ff.figura_vazia(f'Dados de Imagem não disponíveis para {figura_nome}')
     
     return html.Div([
         html.Div([
@@ -1274,6 +1522,17 @@ def update_figura_publica_graph(figura_col, filtros_aplicados):
         ], className='six columns'),
     ], className='row')
 
+perfil_inicio.marcar('callbacks')
+
+# Artefato do layout regravado depois de uma carga completa, com a estrutura
+# de cada aba serializada como o Dash a envia
+if gravar_layout:
+    cascas_abas.update({tab: json.loads(json.dumps(estrutura_aba(tab), cls=PlotlyJSONEncoder))
+                        for tab in list(graficos_abas) + list(secoes_abas)})
+    gravar_artefato_layout(caminho_layout, dict(artefato_layout, cascas=cascas_abas))
+    perfil_inicio.marcar('cascas_abas')
+perfil_inicio.concluir()
+
 # Executar o aplicativo
 if __name__ == '__main__':
     app.run_server(debug=False, host='0.0.0.0')
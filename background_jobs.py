@@ -0,0 +1,121 @@
+# Fila local de tarefas para os callbacks pesados do Dash (background
+# callbacks), sem broker externo: cada tarefa roda em um processo filho do
+# worker do gunicorn e o resultado e o progresso passam por um cache em disco
+# (diskcache), compartilhado entre os workers. Assim o worker que atendeu a
+# requisição fica livre para as interações baratas enquanto a aba é calculada,
+# e o navegador consulta o andamento periodicamente.
+#
+# Sobre o DiskcacheManager do Dash:
+#   - tarefas idênticas em andamento (mesma chave: código do callback +
+#     argumentos + versão dos dados) são compartilhadas: a segunda requisição
+#     recebe o processo da primeira em vez de abrir outro, e o processo só é
+#     encerrado quando todos os clientes que esperam por ele desistem;
+#   - resultados ficam no disco por `expira` segundos desde o último acesso,
+#     então voltar a um estado já calculado não abre processo nenhum (a
+#     tarefa recebe o id SEM_PROCESSO, que não é um pid, e a primeira
+#     consulta já traz o resultado).
+#
+# Ativada por padrão quando diskcache, multiprocess e psutil estão instalados
+# (sem algum deles, from_env devolve None);
+# DASHBOARD_SEGUNDO_PLANO=0 desativa (os callbacks voltam a rodar na
+# requisição). O diretório do cache vem de DASHBOARD_SEGUNDO_PLANO_DIR e a
+# validade dos resultados de DASHBOARD_SEGUNDO_PLANO_EXPIRA (segundos).
+import os
+import tempfile
+
+try:
+    import diskcache
+    import multiprocess  # noqa: F401 (processos das tarefas, aberto pelo DiskcacheManager)
+    import psutil
+    from dash import DiskcacheManager
+except ImportError:
+    diskcache = None
+    DiskcacheManager = object
+
+EXPIRA_PADRAO = 600
+# Id da tarefa cujo resultado já estava no disco: nenhum processo foi aberto
+SEM_PROCESSO = 'sem-processo'
+
+
+class BackgroundJobs(DiskcacheManager):
+    def __init__(self, diretorio, cache_by=None, expira=EXPIRA_PADRAO):
+        self.diretorio = diretorio
+        self.iniciadas = 0
+        self.compartilhadas = 0
+        self.reaproveitadas = 0
+        super().__init__(diskcache.Cache(diretorio), cache_by=cache_by, expire=expira)
+
+    # Gerenciador configurado pelo ambiente, ou None (callbacks síncronos)
+    # quando desativado ou sem as dependências
+    @classmethod
+    def from_env(cls, cache_by=None):
+        if diskcache is None or os.environ.get('DASHBOARD_SEGUNDO_PLANO', '1') == '0':
+            return None
+        diretorio = os.environ.get('DASHBOARD_SEGUNDO_PLANO_DIR') or os.path.join(
+            tempfile.gettempdir(), 'dashboard-segundo-plano')
+        expira = int(os.environ.get('DASHBOARD_SEGUNDO_PLANO_EXPIRA', EXPIRA_PADRAO))
+        return cls(diretorio, cache_by=cache_by, expira=expira)
+
+    # Inicia a tarefa da chave, ou devolve o processo de uma tarefa idêntica
+    # ainda em andamento (iniciada por qualquer worker)
+    def call_job_fn(self, key, job_fn, args, context):
+        if self.handle.get(key) is not None:
+            self.reaproveitadas += 1
+            return SEM_PROCESSO
+        with diskcache.Lock(self.handle, f'{key}-lock', expire=60):
+            job = self.handle.get(f'{key}-job')
+            if job is not None and _processo_ativo(job):
+                self.handle.incr(f'{key}-clientes')
+                self.compartilhadas += 1
+                return job
+            job = super().call_job_fn(key, job_fn, args, context)
+            self.handle.set(f'{key}-job', job, expire=self.expire)
+            self.handle.set(f'{key}-clientes', 1, expire=self.expire)
+            self.handle.set(f'job-{job}', key, expire=self.expire)
+            self.iniciadas += 1
+            return job
+
+    # Cancelamento (troca de aba ou de filtros) ou fim da consulta de um
+    # cliente: o processo só é encerrado quando não resta ninguém esperando
+    def terminate_job(self, job):
+        if job is None or job == SEM_PROCESSO:
+            return
+        job = int(job)
+        key = self.handle.get(f'job-{job}')
+        if key is not None:
+            with diskcache.Lock(self.handle, f'{key}-lock', expire=60):
+                restantes = self.handle.decr(f'{key}-clientes', default=1)
+                if restantes > 0:
+                    return
+                self.handle.delete(f'{key}-clientes')
+                self.handle.delete(f'job-{job}')
+                if self.handle.get(f'{key}-job') == job:
+                    self.handle.delete(f'{key}-job')
+        super().terminate_job(job)
+
+    def job_running(self, job):
+        if job is None or job == SEM_PROCESSO:
+            return False
+        return super().job_running(job)
+
+    def terminate_unhealthy_job(self, job):
+        if job is None or job == SEM_PROCESSO:
+            return False
+        return super().terminate_unhealthy_job(job)
+
+    def stats(self):
+        return {
+            'diretorio': self.diretorio,
+            'iniciadas': self.iniciadas,
+            'compartilhadas': self.compartilhadas,
+            'reaproveitadas': self.reaproveitadas,
+            'bytes': self.handle.volume(),
+        }
+
+
+# Função para saber se o processo de uma tarefa ainda está rodando
+def _processo_ativo(job):
+    try:
+        return psutil.Process(int(job)).status() != psutil.STATUS_ZOMBIE
+    except (psutil.NoSuchProcess, ValueError):
+        return False
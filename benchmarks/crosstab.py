@@ -0,0 +1,93 @@
+# Micro-benchmark do weighted_crosstab vetorizado contra o laço por par de valores.
+# Uso: python -m benchmarks.crosstab [--fatores 1 100] [--repeticoes 20]
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from app import dados_principais, weighted_crosstab
+from benchmarks.synthetic import upscale
+
+PARES = [
+    ('região', 'conhece figura: linda brasil'),
+    ('região', 'programa: programa "gol da gente"'),
+    ('cidade', 'avaliação imagem: governador fábio mitidieri'),
+]
+
+
+# Implementação anterior (um laço por par de valores), mantida como referência
+def crosstab_laco(df, index, columns, weight_col='peso'):
+    codigos_index = df.codigos(index)
+    codigos_columns = df.codigos(columns)
+    validos = (codigos_index >= 0) & (codigos_columns >= 0)
+    codigos_index = codigos_index[validos]
+    codigos_columns = codigos_columns[validos]
+    pesos = df.pesos(weight_col)[validos]
+    categorias_index = df.categorias_de(index)
+    categorias_columns = df.categorias_de(columns)
+
+    cross_data = []
+    for idx_val in np.unique(codigos_index):
+        for col_val in np.unique(codigos_columns):
+            mask = (codigos_index == idx_val) & (codigos_columns == col_val)
+            cross_data.append({
+                'index': categorias_index[idx_val],
+                'column': categorias_columns[col_val],
+                'weight': pesos[mask].sum()
+            })
+
+    pivot_df = pd.DataFrame(cross_data).pivot(index='index', columns='column', values='weight')
+    row_sums = pivot_df.sum(axis=1)
+    if (row_sums == 0).any():
+        for idx in pivot_df.index[row_sums == 0]:
+            pivot_df.loc[idx, :] = np.nan
+        row_sums = row_sums[row_sums > 0]
+    for col in pivot_df.columns:
+        pivot_df[col] = (pivot_df[col] / row_sums) * 100
+    return pivot_df.round(2)
+
+
+# Função para medir a mediana de tempo (ms) de uma chamada
+def medir(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return float(np.median(tempos))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--fatores', type=int, nargs='+', default=[1, 100])
+    parser.add_argument('--repeticoes', type=int, default=20)
+    args = parser.parse_args()
+
+    # Ignorar o cache de resultados para medir o cálculo em si
+    vetorizado = weighted_crosstab.__wrapped__
+
+    resultados = []
+    for fator in args.fatores:
+        view = upscale(dados_principais(), fator).view()
+        for index, columns in PARES:
+            pd.testing.assert_frame_equal(vetorizado(view, index, columns), crosstab_laco(view, index, columns))
+            laco_ms = medir(lambda: crosstab_laco(view, index, columns), args.repeticoes)
+            vetorizado_ms = medir(lambda: vetorizado(view, index, columns), args.repeticoes)
+            resultados.append({
+                'linhas': len(view),
+                'index': index,
+                'columns': columns,
+                'laco_ms': round(laco_ms, 3),
+                'vetorizado_ms': round(vetorizado_ms, 3),
+                'speedup': round(laco_ms / vetorizado_ms, 1),
+            })
+            print(f"{len(view):>8} linhas | {index} x {columns[:40]:<40} | "
+                  f"laço {laco_ms:8.2f} ms | vetorizado {vetorizado_ms:6.2f} ms | {laco_ms / vetorizado_ms:5.1f}x")
+
+    print(json.dumps(resultados, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
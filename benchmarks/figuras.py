@@ -0,0 +1,74 @@
+# Tamanho do payload e tempo de construção das figuras de cada aba com o
+# figure_factory, comparados com a mesma figura levando o template padrão
+# completo do plotly (o que o Plotly Express embute em cada figura) e com o
+# tempo do px.bar/px.pie para os mesmos dados.
+# Uso: python -m benchmarks.figuras [--repeticoes 50]
+import argparse
+import json
+
+import plotly.express as px
+import plotly.graph_objs as go
+import plotly.io as pio
+
+import figure_factory as ff
+from app import ONDA_PRINCIPAL, dados_da_onda, filter_dataframe, filtros_config, graficos_abas, planejador_graficos
+from benchmarks.crosstab import medir
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeticoes', type=int, default=50)
+    args = parser.parse_args()
+
+    filtros = {filtro: [] for filtro in filtros_config}
+    filtered_df = filter_dataframe(dados_da_onda(ONDA_PRINCIPAL), filtros)
+    template_padrao = pio.templates['plotly']
+
+    resultados = []
+    for tab, linhas in graficos_abas.items():
+        agregados = planejador_graficos.executar(tab, filtered_df, filtros)
+        for linha in linhas:
+            for grafico in linha:
+                grafico_id, desenhar, agregado = grafico.id, grafico.desenhar, agregados[grafico.id]
+                figura = desenhar(agregado)
+                completa = go.Figure(figura)
+                completa.update_layout(template=template_padrao)
+                resultados.append({
+                    'aba': tab,
+                    'grafico': grafico_id,
+                    'bytes': ff.tamanho_payload(figura),
+                    'bytes_template_padrao': ff.tamanho_payload(completa),
+                    'construcao_ms': round(medir(lambda: desenhar(agregado), args.repeticoes), 3),
+                })
+
+    for r in resultados:
+        print(f"{r['aba']:<16} {r['grafico']:<22} {r['bytes']:>7} B (template padrão {r['bytes_template_padrao']:>7} B) "
+              f"| {r['construcao_ms']:6.3f} ms")
+    for tab in graficos_abas:
+        da_aba = [r for r in resultados if r['aba'] == tab]
+        print(f"{tab:<16} total {sum(r['bytes'] for r in da_aba):>8} B "
+              f"(template padrão {sum(r['bytes_template_padrao'] for r in da_aba):>8} B)")
+
+    # Referência: Plotly Express para os mesmos dados (barra colorida e pizza)
+    cidades = filtered_df.categorias_de('cidade')[:10]
+    valores = list(range(len(cidades)))
+    referencia = {
+        'barras_ff_ms': medir(lambda: ff.barras(cidades, valores, 'T', 'Cidade', 'Percentual (%)', escala='Blues'),
+                              args.repeticoes),
+        'barras_px_ms': medir(lambda: px.bar(x=cidades, y=valores, color=valores, color_continuous_scale='Blues',
+                                             labels={'x': 'Cidade', 'y': 'Percentual (%)'}, title='T')
+                              .update_traces(texttemplate='%{y:.2f}%', textposition='outside'), args.repeticoes),
+        'pizza_ff_ms': medir(lambda: ff.pizza(valores, cidades, 'T', 'Blues'), args.repeticoes),
+        'pizza_px_ms': medir(lambda: px.pie(values=valores, names=cidades, title='T',
+                                            color_discrete_sequence=px.colors.sequential.Blues)
+                             .update_traces(texttemplate='%{percent:.2%}', textposition='inside'), args.repeticoes),
+    }
+    referencia = {chave: round(valor, 3) for chave, valor in referencia.items()}
+    print(f"px.bar {referencia['barras_px_ms']:.2f} ms vs ff.barras {referencia['barras_ff_ms']:.3f} ms | "
+          f"px.pie {referencia['pizza_px_ms']:.2f} ms vs ff.pizza {referencia['pizza_ff_ms']:.3f} ms")
+
+    print(json.dumps({'figuras': resultados, 'referencia_px': referencia}, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,254 @@
+# Suíte de benchmarks dos caminhos de agregação e dos callbacks do app.py, para
+# comparar o desempenho entre commits.
+#
+# Conjuntos de dados: a pesquisa real (fator 1) e versões ampliadas por
+# reamostragem das linhas reais (benchmarks.synthetic.upscale), com o mesmo
+# esquema de colunas e categorias do snapshot (as colunas de grupos_colunas.json).
+# Cada conjunto é registrado como uma onda, com o seu índice de filtros e cubo
+# de marginais, então os callbacks rodam pelo mesmo caminho do dashboard.
+#
+# Cenários, para cada conjunto e estado de filtros:
+#   filter_dataframe, weighted_count, weighted_percentage, weighted_crosstab
+#   render_content:<aba>  estrutura da aba + todos os gráficos dos seus cards
+#   update_figura_graph, update_programa_graph, update_figura_publica_graph
+#
+# Antes das repetições, uma chamada de aquecimento gera o que é construído uma
+# única vez por armazenamento (pesos replicados do bootstrap). Depois, por padrão
+# cada repetição é medida a frio: o cache de resultados, o das coocorrências e
+# as visões guardadas no índice de filtros (com as suas somas) são limpos, então
+# a medida é o cálculo em si (o cubo de marginais, construído na carga, continua
+# valendo). Dentro de uma repetição, os cards de uma aba compartilham a passada
+# única, como no dashboard. --com-cache mede com os caches ativos, como em
+# navegação repetida.
+#
+# Para cada cenário: percentis de latência (ms) e, em uma execução extra sob
+# tracemalloc, o pico de memória alocada durante a chamada
+# (pico_memoria_kb) e a memória que continuou alocada depois dela, em KB e
+# em blocos (memoria_retida_kb, memoria_retida_blocos: saldo de blocos vivos
+# entre antes e depois da chamada). Não é o número de alocações: o
+# tracemalloc só acompanha os blocos vivos, e o que foi alocado e liberado
+# durante a chamada aparece apenas no pico. O NumPy informa os seus buffers
+# ao tracemalloc.
+#
+# Uso: python -m benchmarks.suite [--fatores 1 10 100 1000] [--repeticoes 10]
+#                                 [--saida resultado.json] [--comparar anterior.json]
+import argparse
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+import app
+from benchmarks.synthetic import upscale
+from filter_index import FilterIndex
+
+ABAS = ['tab-demografico', 'tab-midia', 'tab-governo', 'tab-programas', 'tab-figuras', 'tab-mapa', 'tab-explorar']
+COLUNA_CONTAGEM = 'religião'
+PAR_CROSSTAB = ('região', app.apr_gov_col)
+
+
+# Estados de filtros medidos, a partir das categorias da pesquisa real
+def estados_filtros(store):
+    cidades = list(app.weighted_count.__wrapped__(store.view(), 'cidade').index[:5])
+    return {
+        'sem_filtro': {},
+        'uma_dimensao': {'região': [store.categorias_de('região')[0]]},
+        'duas_dimensoes': {'região': [store.categorias_de('região')[0]], 'sexo': [store.categorias_de('sexo')[0]]},
+        'varios_valores': {'cidade': cidades, 'faixa de idade': list(store.categorias_de('faixa de idade')[:2])},
+    }
+
+
+# Função para identificar o commit medido (None fora de um repositório git)
+def commit_atual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Suite:
+    def __init__(self, repeticoes, com_cache):
+        self.repeticoes = repeticoes
+        self.com_cache = com_cache
+        self.resultados = []
+        self.caches = [app.cache_resultados]
+
+    def _limpar(self):
+        if not self.com_cache:
+            for cache in self.caches:
+                cache.clear()
+
+    # Mede `funcao(argumento)`, com `preparar()` -> argumento fora da medida
+    def medir(self, cenario, fator, linhas, filtros, funcao, preparar=lambda: None):
+        # Aquecimento: estruturas geradas uma vez por armazenamento (pesos replicados etc.)
+        self._limpar()
+        funcao(preparar())
+
+        tempos = []
+        for _ in range(self.repeticoes):
+            self._limpar()
+            argumento = preparar()
+            inicio = time.perf_counter()
+            funcao(argumento)
+            tempos.append((time.perf_counter() - inicio) * 1000)
+
+        # Execução extra para a memória (o tracemalloc deixa as chamadas mais lentas)
+        self._limpar()
+        argumento = preparar()
+        tracemalloc.start()
+        antes = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        funcao(argumento)
+        atual, pico = tracemalloc.get_traced_memory()
+        depois = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        sem_tracemalloc = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        blocos = sum(estatistica.count_diff for estatistica in
+                     depois.filter_traces(sem_tracemalloc).compare_to(antes.filter_traces(sem_tracemalloc), 'filename'))
+
+        tempos = np.array(tempos)
+        resultado = {
+            'cenario': cenario,
+            'fator': fator,
+            'linhas': linhas,
+            'filtros': filtros,
+            'repeticoes': self.repeticoes,
+            'p50_ms': round(float(np.percentile(tempos, 50)), 3),
+            'p90_ms': round(float(np.percentile(tempos, 90)), 3),
+            'p99_ms': round(float(np.percentile(tempos, 99)), 3),
+            'min_ms': round(float(tempos.min()), 3),
+            'max_ms': round(float(tempos.max()), 3),
+            'media_ms': round(float(tempos.mean()), 3),
+            'pico_memoria_kb': round((pico - base) / 1024, 1),
+            'memoria_retida_kb': round((atual - base) / 1024, 1),
+            'memoria_retida_blocos': blocos,
+        }
+        self.resultados.append(resultado)
+        print(f"{fator:>5}x {linhas:>9} linhas | {cenario:<30} {filtros:<15} | p50 {resultado['p50_ms']:9.3f} ms "
+              f"| p90 {resultado['p90_ms']:9.3f} ms | pico {resultado['pico_memoria_kb']:10.1f} KB "
+              f"| retida {resultado['memoria_retida_kb']:10.1f} KB", flush=True)
+        return resultado
+
+
+# Função para registrar um conjunto de dados como onda e medir todos os cenários nele
+def medir_conjunto(suite, fator, store, estados):
+    onda = app.ONDA_PRINCIPAL if fator == 1 else f'sintetica-{fator}x'
+    inicio = time.perf_counter()
+    indice = FilterIndex(store, app.filtros_config, app.colunas_cubo)
+    construcao_ms = (time.perf_counter() - inicio) * 1000
+    app.registro_ondas.fixar(onda, store, indice)
+    suite.caches = [app.cache_resultados, app.coocorrencias(store), indice]
+    linhas = store.n_linhas
+
+    for nome, filtros in estados.items():
+        filtrar = lambda _=None, filtros=filtros: app.filter_dataframe(app.dados_da_onda(onda), filtros)
+        suite.medir('filter_dataframe', fator, linhas, nome, filtrar)
+        suite.medir('weighted_count', fator, linhas, nome,
+                    lambda df: app.weighted_count(df, COLUNA_CONTAGEM), filtrar)
+        suite.medir('weighted_percentage', fator, linhas, nome,
+                    lambda df: app.weighted_percentage(df, app.apr_gov_col), filtrar)
+        suite.medir('weighted_crosstab', fator, linhas, nome,
+                    lambda df: app.weighted_crosstab(df, *PAR_CROSSTAB), filtrar)
+
+    # Abas e callbacks de detalhe: sem filtro e com duas dimensões filtradas
+    for nome in ['sem_filtro', 'duas_dimensoes']:
+        filtros = dict({filtro: [] for filtro in app.filtros_config}, **estados[nome])
+        for aba in ABAS:
+            suite.medir(f'render_content:{aba}', fator, linhas, nome,
+                        lambda _, aba=aba, filtros=filtros: renderizar_aba(aba, filtros, onda))
+        suite.medir('update_figura_graph', fator, linhas, nome,
+                    lambda _, filtros=filtros: app.update_figura_graph.__wrapped__(
+                        'avaliação imagem: ex-governador belivaldo chagas', filtros, onda))
+        suite.medir('update_programa_graph', fator, linhas, nome,
+                    lambda _, filtros=filtros: app.update_programa_graph.__wrapped__(
+                        app.grupos_colunas['programas'][0], filtros, onda))
+        suite.medir('update_figura_publica_graph', fator, linhas, nome,
+                    lambda _, filtros=filtros: app.update_figura_publica_graph.__wrapped__(
+                        app.figuras_populares[0], filtros, onda))
+
+    return {'fator': fator, 'onda': onda, 'linhas': linhas, 'bytes_matriz': int(store.matriz.nbytes),
+            'indice_construcao_ms': round(construcao_ms, 2)}
+
+
+# Função para montar uma aba como o navegador a veria: a estrutura do
+# render_content e o gráfico de cada card (render_grafico)
+def renderizar_aba(aba, filtros, onda):
+    app.render_content(aba)
+    for grafico_id in app.planejador_graficos.ids(aba):
+        app.construir_grafico.__wrapped__(grafico_id, filtros, onda)
+    if aba == 'tab-mapa':
+        df = app.filter_dataframe(app.dados_da_onda(onda), filtros)
+        app.dados_mapa(df, app.apr_gov_col, 'Aprova')
+    if aba == 'tab-explorar':
+        app.atualizar_explorador('região', app.apr_gov_col, filtros, onda)
+
+
+# Função para comparar o p50 de cada cenário com um resultado anterior
+def comparar(resultados, caminho):
+    with open(caminho, 'r', encoding='utf-8') as f:
+        anterior = json.load(f)
+    chave = lambda r: (r['cenario'], r['fator'], r['filtros'])
+    anteriores = {chave(r): r for r in anterior['cenarios']}
+    print(f"\nComparação com {caminho} (commit {anterior['meta'].get('commit')}):")
+    for r in resultados:
+        a = anteriores.get(chave(r))
+        if a is None or not a['p50_ms']:
+            continue
+        razao = r['p50_ms'] / a['p50_ms']
+        marca = ' <- mais lento' if razao > 1.2 else ''
+        print(f"{r['fator']:>5}x | {r['cenario']:<30} {r['filtros']:<15} | "
+              f"{a['p50_ms']:9.3f} -> {r['p50_ms']:9.3f} ms ({razao:5.2f}x){marca}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--fatores', type=int, nargs='+', default=[1, 10, 100, 1000])
+    parser.add_argument('--repeticoes', type=int, default=10)
+    parser.add_argument('--com-cache', action='store_true')
+    parser.add_argument('--saida')
+    parser.add_argument('--comparar')
+    args = parser.parse_args()
+
+    suite = Suite(args.repeticoes, args.com_cache)
+    estados = estados_filtros(app.dados_principais())
+    conjuntos = []
+    for fator in args.fatores:
+        inicio = time.perf_counter()
+        store = upscale(app.dados_principais(), fator)
+        print(f"{fator}x: {store.n_linhas:,} linhas geradas em {time.perf_counter() - inicio:.1f} s", flush=True)
+        conjuntos.append(medir_conjunto(suite, fator, store, estados))
+
+    relatorio = {
+        'meta': {
+            'commit': commit_atual(),
+            'data': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'repeticoes': args.repeticoes,
+            'com_cache': args.com_cache,
+            'estados_filtros': estados,
+        },
+        'conjuntos': conjuntos,
+        'cenarios': suite.resultados,
+    }
+    if args.comparar:
+        comparar(suite.resultados, args.comparar)
+    texto = json.dumps(relatorio, ensure_ascii=False, indent=2)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            f.write(texto)
+        print(f"Resultados gravados em {args.saida}")
+    else:
+        print(texto)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,14 @@
+import numpy as np
+
+from survey_store import SurveyStore
+
+
+# Função para ampliar a pesquisa por reamostragem das linhas reais,
+# mantendo o mesmo esquema de colunas e categorias
+def upscale(store, fator, seed=0):
+    if fator == 1:
+        return store
+    rng = np.random.default_rng(seed)
+    linhas = rng.integers(0, store.n_linhas, store.n_linhas * fator)
+    numericas = {coluna: valores[linhas] for coluna, valores in store.numericas.items()}
+    return SurveyStore(store.colunas, store.categorias, store.matriz[:, linhas], numericas)
@@ -0,0 +1,110 @@
+# Registro declarativo dos gráficos das abas e planejador da execução.
+#
+# Cada gráfico (Grafico) declara as colunas que lê (em geral um grupo de
+# grupos_colunas.json ou uma coluna dele), a agregação de que depende, como
+# uma tupla (tipo, parâmetros...), o passo opcional que recorta o resultado
+# para o gráfico (top N, rótulos) e o desenho (tipo de gráfico e textos).
+# Os desenhos comuns, barras e pizza de percentuais, saem de desenho_barras e
+# desenho_pizza; gráficos particulares passam a sua própria função.
+#
+# O planejador (ChartPlanner) executa os gráficos de uma aba como um plano:
+#   1. uma única passada sobre os dados soma pesos, contagens e pesos ao
+#      quadrado de todas as colunas da aba (frequencies.somar_colunas), e as
+#      agregações seguintes da mesma visão recortam as suas colunas dessa soma;
+#   2. agregações iguais declaradas por gráficos diferentes (por exemplo, a
+#      tabela de frequências dos programas) são calculadas uma única vez.
+# Um gráfico novo sobre colunas já somadas não acrescenta nenhuma passada.
+import figure_factory as ff
+
+
+class Grafico:
+    def __init__(self, id, titulo, colunas, agregacao, desenhar, derivar=None):
+        self.id = id
+        self.titulo = titulo            # título do card
+        self.colunas = list(colunas)    # colunas lidas, somadas na passada única da aba
+        self.agregacao = agregacao      # (tipo, parâmetros...), chave da agregação compartilhada
+        self.derivar = derivar          # (resultado da agregação, visão) -> dados do gráfico
+        self.desenhar = desenhar        # dados do gráfico -> figura
+
+
+# Função para obter os limites do intervalo de confiança de uma tabela com erros
+def intervalo_da_tabela(tabela):
+    return tabela['ic_inferior'], tabela['ic_superior']
+
+
+# Passo de derivação das N maiores categorias de uma tabela de percentuais
+def maiores(n, coluna='percentual'):
+    def derivar(tabela, df):
+        return tabela.nlargest(n, coluna) if tabela is not None else None
+    return derivar
+
+
+# Desenho de barras para uma tabela de percentuais com erros (colunas
+# 'percentual', 'ic_inferior' e 'ic_superior', indexada pelas categorias).
+# `ausente` é a mensagem quando a coluna não existe (dados None); sem ela, a de `vazio`.
+def desenho_barras(titulo, rotulo_categoria, rotulo_valor, escala, vazio, ausente=None, angulo_categorias=None):
+    def desenhar(tabela):
+        if tabela is None:
+            return ff.figura_vazia(ausente or vazio)
+        if tabela.empty:
+            return ff.figura_vazia(vazio)
+        return ff.barras(tabela.index, tabela['percentual'], titulo, rotulo_categoria, rotulo_valor, escala=escala,
+                         angulo_categorias=angulo_categorias, intervalo=intervalo_da_tabela(tabela))
+    return desenhar
+
+
+# Desenho de pizza para uma série de percentuais ou, com erros, uma tabela
+# de percentuais (o intervalo de confiança aparece ao passar o mouse)
+def desenho_pizza(titulo, paleta, vazio, ausente=None):
+    def desenhar(dados):
+        if dados is None:
+            return ff.figura_vazia(ausente or vazio)
+        if dados.empty:
+            return ff.figura_vazia(vazio)
+        if hasattr(dados, 'columns'):
+            return ff.pizza(dados['percentual'], dados.index, titulo, paleta, intervalo=intervalo_da_tabela(dados))
+        return ff.pizza(dados.values, dados.index, titulo, paleta)
+    return desenhar
+
+
+class ChartPlanner:
+    # `abas`: aba -> linhas de cards (listas de Grafico); `agregacoes`: tipo ->
+    # função(visão, filtros, *parâmetros); `somar(visão, colunas)`: a passada única
+    def __init__(self, abas, agregacoes, somar):
+        self.abas = abas
+        self.agregacoes = agregacoes
+        self.somar = somar
+        self.graficos = {grafico.id: grafico for linhas in abas.values() for linha in linhas for grafico in linha}
+        self.aba_do_grafico = {grafico.id: tab for tab, linhas in abas.items()
+                               for linha in linhas for grafico in linha}
+        self.colunas = {tab: list(dict.fromkeys(coluna for linha in linhas for grafico in linha
+                                                for coluna in grafico.colunas))
+                        for tab, linhas in abas.items()}
+
+    def ids(self, tab):
+        return [grafico.id for linha in self.abas.get(tab, []) for grafico in linha]
+
+    # Dados de cada gráfico de uma aba (ou só dos `ids` pedidos), por id. A soma
+    # das colunas da aba inteira fica guardada na visão, então os cards da
+    # mesma aba calculados em chamadas separadas também fazem uma só passada.
+    def executar(self, tab, df, filtros, ids=None):
+        colunas = [coluna for coluna in self.colunas.get(tab, []) if coluna in df.columns]
+        if colunas:
+            self.somar(df, colunas)
+        resultados = {}
+        dados = {}
+        for grafico_id in ids if ids is not None else self.ids(tab):
+            grafico = self.graficos[grafico_id]
+            if grafico.agregacao not in resultados:
+                tipo, parametros = grafico.agregacao[0], grafico.agregacao[1:]
+                resultados[grafico.agregacao] = self.agregacoes[tipo](df, filtros, *parametros)
+            resultado = resultados[grafico.agregacao]
+            dados[grafico_id] = grafico.derivar(resultado, df) if grafico.derivar is not None else resultado
+        return dados
+
+    # Gráficos, agregações distintas e colunas da passada única de cada aba
+    def stats(self):
+        return {tab: {'graficos': len(self.ids(tab)),
+                      'agregacoes': len({self.graficos[i].agregacao for i in self.ids(tab)}),
+                      'colunas': len(self.colunas[tab])}
+                for tab in self.abas}
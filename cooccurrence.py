@@ -0,0 +1,146 @@
+# Coocorrências ponderadas (demográfico x pergunta) para a aba de exploração,
+# onde qualquer variável demográfica é cruzada com qualquer pergunta.
+#
+# A matriz de coocorrência de um par (somas de peso e contagens de cada valor
+# demográfico x categoria da pergunta) sai de um único bincount sobre os
+# códigos do par nas linhas filtradas, e fica em um cache LRU por (estado de
+# filtros, demográfico, pergunta): voltar a um par já visto é só a
+# normalização da matriz guardada. Sem filtros, as linhas do cubo de
+# marginais para cada valor do demográfico já trazem as somas de todas as
+# perguntas, então nenhum par é calculado sobre os dados.
+#
+# Calcular todas as perguntas de um demográfico em uma passada também foi
+# medido: com 100x linhas a passada leva 100-600 ms, contra ~1 ms por par, e
+# cada troca de filtro pagaria a passada inteira.
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+class CoOccurrence:
+    def __init__(self, store, weight_col='peso', max_itens=2048):
+        self.store = store
+        self.weight_col = weight_col
+        self.max_itens = max_itens
+        self._itens = OrderedDict()   # (chave dos filtros, demográfico, pergunta) -> (somas, contagens)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.do_cubo = 0
+        self.tempo_calculo = 0.0
+
+    # Matrizes (valores do demográfico x categorias da pergunta) de somas de
+    # peso e contagens das linhas da visão
+    def matrizes(self, view, demografico, pergunta):
+        chave = (view.chave, demografico, pergunta) if view.chave is not None else None
+        if chave is not None:
+            with self._lock:
+                if chave in self._itens:
+                    self._itens.move_to_end(chave)
+                    self.hits += 1
+                    return self._itens[chave]
+        resultado = self._do_cubo(view, demografico, pergunta)
+        if resultado is None:
+            resultado = self._calcular(view, demografico, pergunta)
+        if chave is not None:
+            with self._lock:
+                self.misses += 1
+                self._itens[chave] = resultado
+                while len(self._itens) > self.max_itens:
+                    self._itens.popitem(last=False)
+        return resultado
+
+    # População inteira: linhas do cubo de marginais (mesmo peso, pergunta no cubo)
+    def _do_cubo(self, view, demografico, pergunta):
+        marginais = view.marginais
+        if marginais is None or marginais.linhas != [0] or not marginais.tem(pergunta, self.weight_col):
+            return None
+        cubo = marginais.cubo
+        estados = [cubo.estados.get((demografico, valor)) for valor in self.store.categorias_de(demografico)]
+        if any(estado is None for estado in estados):
+            return None
+        self.do_cubo += 1
+        inicio = cubo.deslocamento[pergunta]
+        fim = inicio + len(self.store.categorias_de(pergunta))
+        return cubo.somas[estados, inicio:fim], cubo.contagens[estados, inicio:fim]
+
+    # Um bincount sobre o código combinado (valor do demográfico, categoria da pergunta)
+    def _calcular(self, view, demografico, pergunta):
+        inicio = time.perf_counter()
+        n_valores = len(self.store.categorias_de(demografico))
+        n_categorias = len(self.store.categorias_de(pergunta))
+        codigos_demografico = view.codigos(demografico)
+        codigos_pergunta = view.codigos(pergunta)
+        validos = (codigos_demografico >= 0) & (codigos_pergunta >= 0)
+        combinado = codigos_demografico[validos].astype(np.int64) * n_categorias + codigos_pergunta[validos]
+        pesos = view.pesos(self.weight_col)
+        pesos = None if pesos is None else pesos[validos]
+        tamanho = n_valores * n_categorias
+        somas = np.bincount(combinado, weights=pesos, minlength=tamanho).reshape(n_valores, n_categorias)
+        contagens = np.bincount(combinado, minlength=tamanho).reshape(n_valores, n_categorias)
+        self.tempo_calculo += time.perf_counter() - inicio
+        return somas.astype(np.float64), contagens
+
+    # Crosstab ponderado (percentual por linha), no formato do weighted_crosstab do app
+    def crosstab(self, view, demografico, pergunta):
+        if demografico not in self.store.posicao or pergunta not in self.store.posicao:
+            return pd.DataFrame()
+        somas, contagens = self.matrizes(view, demografico, pergunta)
+
+        # Manter apenas as categorias presentes nas linhas válidas
+        index_presentes = np.flatnonzero(contagens.sum(axis=1))
+        columns_presentes = np.flatnonzero(contagens.sum(axis=0))
+        if len(index_presentes) == 0:
+            return pd.DataFrame()
+        somas = somas[np.ix_(index_presentes, columns_presentes)]
+
+        row_sums = somas.sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            percentuais = (somas / row_sums[:, None]) * 100
+        percentuais[row_sums == 0, :] = np.nan
+
+        categorias_index = self.store.categorias_de(demografico)
+        categorias_columns = self.store.categorias_de(pergunta)
+        return pd.DataFrame(
+            percentuais,
+            index=pd.Index([categorias_index[i] for i in index_presentes], name='index'),
+            columns=pd.Index([categorias_columns[j] for j in columns_presentes], name='column')
+        ).round(2)
+
+    def clear(self):
+        with self._lock:
+            self._itens.clear()
+
+    def nbytes(self):
+        with self._lock:
+            return sum(somas.nbytes + contagens.nbytes for somas, contagens in self._itens.values())
+
+    def stats(self):
+        consultas = self.hits + self.misses
+        return {
+            'itens': len(self._itens),
+            'max_itens': self.max_itens,
+            'bytes': self.nbytes(),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / consultas, 4) if consultas else 0.0,
+            'do_cubo': self.do_cubo,
+            'calculo_ms': round(self.tempo_calculo * 1000, 2),
+        }
+
+
+_coocorrencias = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+# Função para obter as coocorrências de um armazenamento (criadas no primeiro uso)
+def coocorrencias(store, weight_col='peso'):
+    with _lock:
+        por_store = _coocorrencias.setdefault(store, {})
+        if weight_col not in por_store:
+            por_store[weight_col] = CoOccurrence(store, weight_col=weight_col)
+        return por_store[weight_col]
@@ -0,0 +1,207 @@
+# Leitura do CSV da pesquisa em blocos, para exportações com milhões de
+# respondentes que não cabem na memória de um worker como um DataFrame único.
+#
+# Cada bloco é lido pelo pandas já como colunas categóricas (só as colunas
+# pedidas), e os códigos de cada coluna são gravados em um arquivo temporário
+# com um dicionário de categorias que cresce a cada bloco. No fim, as
+# categorias são ordenadas como no SurveyStore.from_dataframe e os códigos são
+# regravados, bloco a bloco, direto no matriz.npy do snapshot. O pico de
+# memória depende do tamanho do bloco, não do tamanho do arquivo.
+import codecs
+import json
+import os
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+from survey_store import COLUNAS_PESO, NAO_SE_APLICA, SEM_RESPOSTA, tipo_codigo
+
+INTEIRO = re.compile(r'\s*[+-]?\d+\s*')
+
+
+# Função para listar as colunas usadas pelo dashboard (as de grupos_colunas.json)
+def colunas_dos_grupos(caminho='grupos_colunas.json'):
+    with open(caminho, 'r', encoding='utf-8') as f:
+        grupos = json.load(f)
+    return list(dict.fromkeys(coluna for colunas in grupos.values() for coluna in colunas))
+
+
+# Função para detectar a codificação pelo início do arquivo (utf-8, ou latin1
+# se a amostra não for utf-8 válido)
+def detectar_codificacao(caminho, tamanho_amostra=1024 * 1024):
+    with open(caminho, 'rb') as f:
+        amostra = f.read(tamanho_amostra)
+    try:
+        # final=False: um caractere cortado no fim da amostra não é erro
+        codecs.getincrementaldecoder('utf-8')().decode(amostra, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'latin1'
+
+
+# Categorias de uma coluna acumuladas bloco a bloco. Os códigos provisórios
+# seguem a ordem de aparição; `finalizar` decide o tipo dos valores como o
+# pandas faria com a coluna inteira (números se todos os valores forem
+# numéricos, inteiros se além disso não houver células vazias) e os ordena.
+class CodificadorColuna:
+    def __init__(self, nome):
+        self.nome = nome
+        self.provisorios = {}       # texto -> código provisório
+        self.tem_ponto = False
+        self.tem_branco = False     # só espaços (texto, não NaN, para o pandas)
+        self.tem_na = False
+        self.so_na = True
+
+    # Códigos provisórios (int32) de uma série categórica do bloco
+    def codificar(self, serie):
+        categorias = serie.cat.categories
+        tabela = np.empty(len(categorias) + 1, dtype=np.int32)
+        tabela[-1] = SEM_RESPOSTA   # código -1 do pandas (NaN) cai na última posição
+        for i, valor in enumerate(categorias):
+            valor = str(valor)
+            texto = valor.strip()
+            if texto == '.':
+                tabela[i] = NAO_SE_APLICA
+                self.tem_ponto = True
+            elif texto == '':
+                tabela[i] = SEM_RESPOSTA
+                self.tem_branco = True
+            else:
+                tabela[i] = self.provisorios.setdefault(valor, len(self.provisorios))
+        codigos = serie.cat.codes.to_numpy()
+        if len(categorias):
+            self.so_na = False
+        if (codigos < 0).any():
+            self.tem_na = True
+        return tabela[codigos]
+
+    # Categorias finais e tabela de conversão (código provisório + 2 -> código final)
+    def finalizar(self):
+        textos = list(self.provisorios)
+        valores = textos
+        if textos and not (self.tem_ponto or self.tem_branco):
+            numeros = pd.to_numeric(pd.Series(textos, dtype=object), errors='coerce')
+            if numeros.notna().all():
+                if not self.tem_na and all(INTEIRO.fullmatch(t) for t in textos):
+                    valores = [int(n) for n in numeros]
+                else:
+                    valores = [float(n) for n in numeros]
+        categorias = sorted(set(valores))
+        indice = {valor: codigo for codigo, valor in enumerate(categorias)}
+        tabela = np.empty(len(textos) + 2, dtype=np.int64)
+        tabela[0], tabela[1] = NAO_SE_APLICA, SEM_RESPOSTA
+        tabela[2:] = [indice[valor] for valor in valores]
+        return categorias, tabela
+
+
+# Função para gravar os arrays do snapshot (matriz.npy e numerica_<i>.npy) a
+# partir do CSV, em blocos de `linhas_por_bloco` linhas. Com `colunas`, lê só
+# essas colunas (e as de peso). Retorna as informações do meta.json.
+def gravar_csv_em_blocos(caminho, diretorio, colunas=None, colunas_peso=COLUNAS_PESO,
+                         linhas_por_bloco=100_000, log=print):
+    codificacao = detectar_codificacao(caminho)
+    try:
+        return _gravar(caminho, diretorio, codificacao, colunas, colunas_peso, linhas_por_bloco, log)
+    except UnicodeDecodeError as e:
+        if codificacao == 'latin1':
+            raise
+        # Bytes inválidos depois da amostra: recomeçar com a outra codificação
+        log(f"Erro ao ler o CSV como utf-8 ({e}); lendo como latin1")
+        return _gravar(caminho, diretorio, 'latin1', colunas, colunas_peso, linhas_por_bloco, log)
+
+
+def _gravar(caminho, diretorio, codificacao, colunas, colunas_peso, linhas_por_bloco, log):
+    cabecalho = pd.read_csv(caminho, delimiter=';', encoding=codificacao, nrows=0).columns
+    pedidas = None if colunas is None else set(colunas) | set(colunas_peso)
+    usadas = [c for c in cabecalho if pedidas is None or c in pedidas]
+    categoricas = [c for c in usadas if c not in colunas_peso]
+    numericas = sorted(c for c in usadas if c in colunas_peso)
+    if colunas is not None:
+        faltando = [c for c in colunas if c not in cabecalho]
+        if faltando:
+            log(f"{os.path.basename(caminho)}: {len(faltando)} colunas pedidas não estão no CSV")
+
+    codificadores = [CodificadorColuna(c) for c in categoricas]
+    temporario_codigos = os.path.join(diretorio, 'codigos.tmp')
+    temporarios_numericas = [os.path.join(diretorio, f'numerica_{i}.tmp') for i in range(len(numericas))]
+    tamanhos_blocos = []
+    inicio = ultimo_log = time.perf_counter()
+    leitor = pd.read_csv(caminho, delimiter=';', encoding=codificacao, usecols=usadas,
+                         dtype={c: 'category' for c in categoricas}, chunksize=linhas_por_bloco)
+    arquivos_numericas = [open(t, 'wb') for t in temporarios_numericas]
+    try:
+        with open(temporario_codigos, 'wb') as arquivo_codigos:
+            for bloco in leitor:
+                # Códigos provisórios coluna a coluna (um bloco por coluna no arquivo)
+                for codificador in codificadores:
+                    arquivo_codigos.write(codificador.codificar(bloco[codificador.nome]).tobytes())
+                for coluna, arquivo in zip(numericas, arquivos_numericas):
+                    valores = pd.to_numeric(bloco[coluna], errors='coerce').fillna(0)
+                    arquivo.write(valores.to_numpy(dtype=np.float64).tobytes())
+                tamanhos_blocos.append(len(bloco))
+
+                agora = time.perf_counter()
+                if agora - ultimo_log >= 5:
+                    lidas = sum(tamanhos_blocos)
+                    log(f"{os.path.basename(caminho)}: {lidas:,} linhas lidas ({lidas / (agora - inicio):,.0f} linhas/s)")
+                    ultimo_log = agora
+    finally:
+        for arquivo in arquivos_numericas:
+            arquivo.close()
+
+    n_linhas = sum(tamanhos_blocos)
+    resultado = _consolidar(diretorio, codificadores, tamanhos_blocos, n_linhas, temporario_codigos,
+                            numericas, temporarios_numericas, descartar_vazias=colunas is None)
+    duracao = time.perf_counter() - inicio
+    log(f"{os.path.basename(caminho)}: {n_linhas:,} linhas, {len(resultado['colunas'])} colunas "
+        f"({codificacao}) em {duracao:.1f} s ({n_linhas / max(duracao, 1e-9):,.0f} linhas/s)")
+    resultado['codificacao'] = codificacao
+    return resultado
+
+
+# Função para converter os códigos provisórios nos finais e gravar os .npy
+def _consolidar(diretorio, codificadores, tamanhos_blocos, n_linhas, temporario_codigos,
+                numericas, temporarios_numericas, descartar_vazias):
+    finais = [codificador.finalizar() for codificador in codificadores]
+    # Colunas vazias geradas por ';' sobrando no fim das linhas (como em from_dataframe)
+    manter = [i for i, codificador in enumerate(codificadores)
+              if not (descartar_vazias and codificador.nome.startswith('Unnamed:') and codificador.so_na)]
+    destino = {i: posicao for posicao, i in enumerate(manter)}
+    categorias = [finais[i][0] for i in manter]
+
+    tipo = tipo_codigo(max([len(cats) for cats in categorias], default=0))
+    matriz = np.lib.format.open_memmap(os.path.join(diretorio, 'matriz.npy'), mode='w+',
+                                       dtype=tipo, shape=(len(manter), n_linhas))
+    # O arquivo temporário tem, para cada bloco, os códigos de cada coluna em sequência
+    provisorios = np.memmap(temporario_codigos, dtype=np.int32, mode='r') if n_linhas else None
+    deslocamento = 0
+    primeira_linha = 0
+    for tamanho in tamanhos_blocos:
+        for i, (_, tabela) in enumerate(finais):
+            if i in destino:
+                codigos = provisorios[deslocamento:deslocamento + tamanho]
+                matriz[destino[i], primeira_linha:primeira_linha + tamanho] = tabela[codigos + 2]
+            deslocamento += tamanho
+        primeira_linha += tamanho
+    matriz.flush()
+    del matriz, provisorios
+    os.remove(temporario_codigos)
+
+    for i, temporario in enumerate(temporarios_numericas):
+        valores = np.lib.format.open_memmap(os.path.join(diretorio, f'numerica_{i}.npy'), mode='w+',
+                                            dtype=np.float64, shape=(n_linhas,))
+        origem = np.memmap(temporario, dtype=np.float64, mode='r', shape=(n_linhas,)) if n_linhas else valores
+        for inicio in range(0, n_linhas, 1_000_000):
+            valores[inicio:inicio + 1_000_000] = origem[inicio:inicio + 1_000_000]
+        valores.flush()
+        del valores, origem
+        os.remove(temporario)
+
+    return {
+        'colunas': [codificadores[i].nome for i in manter],
+        'categorias': categorias,
+        'numericas': numericas,
+        'n_linhas': n_linhas,
+    }
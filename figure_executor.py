@@ -0,0 +1,90 @@
+# Execução em paralelo da construção das figuras de uma aba.
+# Modos (DASHBOARD_EXECUTOR): 'serial' (padrão, sem pool), 'thread' ou
+# 'process'. A construção das figuras é código Python e fica presa no GIL,
+# então o modo 'process' é o que escala com os núcleos; 'thread' serve quando
+# o fork não está disponível. O número de
+# workers vem de DASHBOARD_EXECUTOR_WORKERS (padrão: núcleos disponíveis).
+import logging
+import multiprocessing
+import os
+import pickle
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+MODOS = ('serial', 'thread', 'process')
+
+logger = logging.getLogger(__name__)
+
+
+class FigureExecutor:
+    def __init__(self, modo='serial', workers=None):
+        if modo not in MODOS:
+            raise ValueError(f'Modo de execução desconhecido: {modo} (use {", ".join(MODOS)})')
+        if modo == 'process' and 'fork' not in multiprocessing.get_all_start_methods():
+            # Sem fork os processos teriam que recarregar o app inteiro
+            modo = 'thread'
+        self.modo = modo
+        self.workers = workers or os.cpu_count() or 1
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        workers = os.environ.get('DASHBOARD_EXECUTOR_WORKERS')
+        return cls(os.environ.get('DASHBOARD_EXECUTOR', 'serial'), int(workers) if workers else None)
+
+    @property
+    def ativo(self):
+        return self.modo != 'serial' and self.workers > 1
+
+    # O pool é criado no primeiro uso dentro de cada processo, para que cada
+    # worker do gunicorn tenha o seu (pools não sobrevivem ao fork)
+    def _obter_pool(self):
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                if self.modo == 'process':
+                    # fork: os processos filhos herdam o módulo do app já carregado
+                    contexto = multiprocessing.get_context('fork')
+                    self._pool = ProcessPoolExecutor(self.workers, mp_context=contexto)
+                else:
+                    self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix='figuras')
+                self._pid = os.getpid()
+            return self._pool
+
+    # No modo 'process', `funcao` e os itens vão para os processos por pickle:
+    # verifica antes, para não confundir um objeto não serializável com um erro
+    # da própria `funcao` (os dois chegariam como TypeError ou AttributeError)
+    def _serializavel(self, funcao, itens):
+        if self.modo != 'process':
+            return True
+        try:
+            pickle.dumps((funcao, itens), protocol=pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError) as e:
+            logger.warning('Lote de figuras não serializável, construído em modo serial: %s', e)
+            return False
+        return True
+
+    # Aplica `funcao` a cada item, em paralelo quando ativo, preservando a ordem.
+    # Um lote que não pode ser enviado aos processos é construído em série; se
+    # o pool falhar (processo morto, resultado que não pode ser serializado),
+    # volta ao modo serial para este e os próximos lotes. Erros da própria
+    # `funcao` são propagados.
+    def mapear(self, funcao, itens):
+        itens = list(itens)
+        if not self.ativo or len(itens) < 2 or not self._serializavel(funcao, itens):
+            return [funcao(item) for item in itens]
+        try:
+            return list(self._obter_pool().map(funcao, itens))
+        except (BrokenProcessPool, pickle.PicklingError) as e:
+            logger.warning('Erro no pool de figuras (%s), usando modo serial: %s', self.modo, e)
+            self.encerrar()
+            self.modo = 'serial'
+            return [funcao(item) for item in itens]
+
+    def encerrar(self):
+        with self._lock:
+            if self._pool is not None and self._pid == os.getpid():
+                self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,214 @@
+# Construção das figuras do dashboard como dicionários mínimos do Plotly
+# (data + layout), sem passar pelo Plotly Express nem pela validação do
+# go.Figure. Todas as figuras compartilham um template compacto, montado uma
+# única vez, com a aparência do template padrão do plotly, em vez de levar o
+# template completo (vários KB) dentro de cada figura.
+import json
+from functools import lru_cache
+
+from plotly import colors as plotly_colors
+from plotly.utils import PlotlyJSONEncoder
+
+TEMPLATE = {
+    'layout': {
+        'colorway': ['#636efa', '#EF553B', '#00cc96', '#ab63fa', '#FFA15A',
+                     '#19d3f3', '#FF6692', '#B6E880', '#FF97FF', '#FECB52'],
+        'font': {'color': '#2a3f5f'},
+        'hovermode': 'closest',
+        'paper_bgcolor': 'white',
+        'plot_bgcolor': '#E5ECF6',
+        'title': {'x': 0.05},
+        'xaxis': {'gridcolor': 'white', 'linecolor': 'white', 'zerolinecolor': 'white',
+                  'zerolinewidth': 2, 'automargin': True, 'title': {'standoff': 15}},
+        'yaxis': {'gridcolor': 'white', 'linecolor': 'white', 'zerolinecolor': 'white',
+                  'zerolinewidth': 2, 'automargin': True, 'title': {'standoff': 15}},
+    }
+}
+
+
+# Função para converter arrays, séries e índices em listas simples
+def _lista(valores):
+    return valores.tolist() if hasattr(valores, 'tolist') else list(valores)
+
+
+# Função para obter uma paleta: nome de uma paleta sequencial do plotly
+# (por exemplo 'Blues') ou lista de cores
+def _cores(paleta):
+    if isinstance(paleta, str):
+        return list(getattr(plotly_colors.sequential, paleta))
+    return list(paleta)
+
+
+# Função para montar a escala contínua de uma paleta sequencial (calculada uma vez por nome)
+@lru_cache(maxsize=None)
+def _escala(nome):
+    cores = _cores(nome)
+    passo = 1 / (len(cores) - 1)
+    return [[round(i * passo, 6), cor] for i, cor in enumerate(cores)]
+
+
+def _layout(titulo, **extra):
+    layout = {'template': TEMPLATE, 'title': {'text': titulo}}
+    layout.update(extra)
+    return layout
+
+
+def _eixo(titulo):
+    return {'title': {'text': titulo}}
+
+
+# Figura sem dados, só com o título (mensagens de dados insuficientes)
+def figura_vazia(titulo):
+    return {'data': [], 'layout': _layout(titulo)}
+
+
+# Barras simples; com `escala`, as barras são coloridas pelo valor (como o
+# color=valores do px.bar). orientacao='h' gera barras horizontais.
+# `intervalo` = (limites inferiores, limites superiores) desenha barras de erro.
+def barras(categorias, valores, titulo, rotulo_categoria, rotulo_valor, escala=None,
+           texto='%{y:.2f}%', posicao_texto='outside', orientacao='v', angulo_categorias=None,
+           intervalo=None):
+    categorias, valores = _lista(categorias), _lista(valores)
+    horizontal = orientacao == 'h'
+    eixo_categoria, eixo_valor = ('y', 'x') if horizontal else ('x', 'y')
+    trace = {
+        'type': 'bar',
+        'orientation': orientacao,
+        eixo_categoria: categorias,
+        eixo_valor: valores,
+        'hovertemplate': f'{rotulo_categoria}=%{{{eixo_categoria}}}<br>{rotulo_valor}=%{{{eixo_valor}}}<extra></extra>',
+        'texttemplate': texto.replace('%{y', '%{x') if horizontal else texto,
+        'textposition': posicao_texto,
+        'showlegend': False,
+    }
+    layout = _layout(titulo, **{f'{eixo_categoria}axis': _eixo(rotulo_categoria),
+                                f'{eixo_valor}axis': _eixo(rotulo_valor)})
+    if escala:
+        trace['marker'] = {'color': valores, 'coloraxis': 'coloraxis'}
+        layout['coloraxis'] = {'colorscale': _escala(escala), 'colorbar': {'title': {'text': rotulo_valor}}}
+    if intervalo is not None:
+        inferiores, superiores = _lista(intervalo[0]), _lista(intervalo[1])
+        trace[f'error_{eixo_valor}'] = {
+            'type': 'data',
+            'symmetric': False,
+            'array': [round(s - v, 4) for v, s in zip(valores, superiores)],
+            'arrayminus': [round(v - i, 4) for v, i in zip(valores, inferiores)],
+            'color': '#2a3f5f',
+            'thickness': 1,
+            'width': 3,
+        }
+        trace['customdata'] = [[i, s] for i, s in zip(inferiores, superiores)]
+        trace['hovertemplate'] = trace['hovertemplate'].replace(
+            '<extra>', '<br>IC 95%: %{customdata[0]:.1f}–%{customdata[1]:.1f}<extra>')
+    if angulo_categorias is not None:
+        layout[f'{eixo_categoria}axis']['tickangle'] = angulo_categorias
+    return {'data': [trace], 'layout': layout}
+
+
+# Pizza com as fatias coloridas na ordem da paleta; `intervalo` =
+# (limites inferiores, limites superiores) aparece no texto ao passar o mouse
+def pizza(valores, nomes, titulo, paleta, texto='%{percent:.2%}', posicao_texto='inside', intervalo=None):
+    trace = {
+        'type': 'pie',
+        'values': _lista(valores),
+        'labels': _lista(nomes),
+        'hovertemplate': 'label=%{label}<br>value=%{value}<extra></extra>',
+        'texttemplate': texto,
+        'textposition': posicao_texto,
+    }
+    if intervalo is not None:
+        trace['customdata'] = [[i, s] for i, s in zip(_lista(intervalo[0]), _lista(intervalo[1]))]
+        trace['hovertemplate'] = ('label=%{label}<br>value=%{value}'
+                                  '<br>IC 95%: %{customdata[0][0]:.1f}–%{customdata[0][1]:.1f}<extra></extra>')
+    return {'data': [trace], 'layout': _layout(titulo, piecolorway=_cores(paleta))}
+
+
+# Barras agrupadas (modo='group') ou empilhadas (modo='stack'), uma série por
+# grupo: `series` é uma lista de (nome, categorias, valores)
+def barras_agrupadas(series, titulo, rotulo_categoria, rotulo_valor, rotulo_serie, paleta,
+                     modo='group', texto='%{y:.2f}%', posicao_texto='outside', angulo_categorias=None):
+    cores = _cores(paleta)
+    data = []
+    for i, (nome, categorias, valores) in enumerate(series):
+        data.append({
+            'type': 'bar',
+            'name': nome,
+            'x': _lista(categorias),
+            'y': _lista(valores),
+            'marker': {'color': cores[i % len(cores)]},
+            'hovertemplate': f'{rotulo_serie}={nome}<br>{rotulo_categoria}=%{{x}}<br>{rotulo_valor}=%{{y}}<extra></extra>',
+            'texttemplate': texto,
+            'textposition': posicao_texto,
+        })
+    xaxis = _eixo(rotulo_categoria)
+    if angulo_categorias is not None:
+        xaxis['tickangle'] = angulo_categorias
+    return {'data': data, 'layout': _layout(titulo, barmode=modo, xaxis=xaxis, yaxis=_eixo(rotulo_valor),
+                                            legend={'title': {'text': rotulo_serie}})}
+
+
+# Linhas com marcadores, uma série por grupo: `series` é uma lista de (nome, x, y)
+def linhas(series, titulo, rotulo_x, rotulo_y, rotulo_serie, paleta, eixo_x_categorico=False):
+    cores = _cores(paleta)
+    data = []
+    for i, (nome, x, y) in enumerate(series):
+        data.append({
+            'type': 'scatter',
+            'mode': 'lines+markers',
+            'name': nome,
+            'x': _lista(x),
+            'y': _lista(y),
+            'line': {'color': cores[i % len(cores)]},
+            'hovertemplate': f'{rotulo_serie}={nome}<br>{rotulo_x}=%{{x}}<br>{rotulo_y}=%{{y}}<extra></extra>',
+        })
+    xaxis = _eixo(rotulo_x)
+    if eixo_x_categorico:
+        xaxis['type'] = 'category'
+    return {'data': data, 'layout': _layout(titulo, xaxis=xaxis, yaxis=_eixo(rotulo_y),
+                                            legend={'title': {'text': rotulo_serie}})}
+
+
+# Mapa de calor de uma matriz (linhas = y, colunas = x), com o valor em cada célula
+def mapa_calor(z, x, y, titulo, rotulo_x, rotulo_y, escala='Blues', texto='%{z:.1f}%'):
+    trace = {
+        'type': 'heatmap',
+        'z': _lista(z),
+        'x': _lista(x),
+        'y': _lista(y),
+        'coloraxis': 'coloraxis',
+        'texttemplate': texto,
+        'hovertemplate': f'{rotulo_x}=%{{x}}<br>{rotulo_y}=%{{y}}<br>%{{z}}<extra></extra>',
+    }
+    return {'data': [trace], 'layout': _layout(titulo, xaxis=_eixo(rotulo_x),
+                                               yaxis={'title': {'text': rotulo_y}, 'autorange': 'reversed'},
+                                               coloraxis={'colorscale': _escala(escala)})}
+
+
+# Mapa coroplético: `geojson` é uma FeatureCollection com o id de cada feature
+# em `locais`; `valores` (um por local, None sem dados) colore os polígonos e
+# `respondentes` aparece ao passar o mouse. Na atualização por filtros, só
+# data[0].z e data[0].customdata mudam (ver dash.Patch), e a geometria não é reenviada.
+def mapa_coropletico(geojson, locais, valores, respondentes, titulo, rotulo_valor, escala='Blues'):
+    trace = {
+        'type': 'choropleth',
+        'geojson': geojson,
+        'featureidkey': 'id',
+        'locations': _lista(locais),
+        'z': _lista(valores),
+        'customdata': _lista(respondentes),
+        'coloraxis': 'coloraxis',
+        'marker': {'line': {'color': 'white', 'width': 0.5}},
+        'hovertemplate': f'%{{location}}<br>{rotulo_valor}=%{{z:.1f}}%<br>Respondentes: %{{customdata}}<extra></extra>',
+    }
+    # uirevision fixo: o zoom do usuário se mantém entre as atualizações
+    layout = _layout(titulo, geo={'fitbounds': 'locations', 'visible': False}, uirevision='mapa',
+                     coloraxis={'colorscale': _escala(escala), 'colorbar': {'title': {'text': rotulo_valor}}},
+                     margin={'l': 0, 'r': 0, 'b': 0, 't': 50})
+    return {'data': [trace], 'layout': layout}
+
+
+# Tamanho em bytes do JSON enviado ao navegador para uma figura
+def tamanho_payload(figura):
+    if hasattr(figura, 'to_plotly_json'):
+        figura = figura.to_plotly_json()
+    return len(json.dumps(figura, cls=PlotlyJSONEncoder, separators=(',', ':')).encode('utf-8'))
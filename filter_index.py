@@ -0,0 +1,154 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from marginal_cube import MarginalCube, MarginalState
+from result_cache import chave_filtros
+
+# Número de bits 1 em cada byte (para contar linhas em bitsets compactados)
+BITS_POR_BYTE = np.array([bin(i).count('1') for i in range(256)], dtype=np.int64)
+
+
+# Diferença de linhas entre uma visão e uma visão anterior (a base), com as
+# somas já calculadas sobre a base e, se a base está no cubo, as marginais
+# dela (as somas de qualquer coluna do cubo, sem percorrer linhas)
+class RowDelta:
+    def __init__(self, somas_base, removidas, adicionadas, marginais_base=None):
+        self.somas_base = somas_base
+        self.removidas = removidas
+        self.adicionadas = adicionadas
+        self.marginais_base = marginais_base
+
+
+# Índice invertido dos filtros demográficos: para cada dimensão, um bitset
+# compactado (np.packbits) por valor de opção, construído uma única vez.
+# Uma seleção vira máscara de linhas com OR dentro da dimensão e AND entre
+# dimensões, sem copiar os dados.
+# Com `colunas_cubo`, também pré-calcula o cubo de marginais dessas colunas
+# para os estados de filtros com no máximo uma dimensão ativa (gravado em
+# `diretorio_cubo`, quando dado, e lido de lá nas inicializações seguintes).
+#
+# A visão sem filtro fica guardada, com as somas já calculadas sobre ela
+# (os cards de uma aba sem filtro aproveitam a passada única da aba), e os
+# últimos estados filtrados também (bitset + visão). Um estado novo cujas
+# linhas diferem pouco de um deles ou do estado sem filtro (por exemplo,
+# mais uma cidade ou mais uma dimensão) recebe uma visão ligada à anterior,
+# e as somas ponderadas são atualizadas só com as linhas que entraram ou
+# saíram. Com o cubo, os estados nele (sem filtro ou uma dimensão ativa)
+# também servem de base, pelas suas marginais.
+class FilterIndex:
+    def __init__(self, store, dimensoes, colunas_cubo=None, recentes=16, diretorio_cubo=None, mmap=False):
+        self.store = store
+        self.recentes = recentes
+        self._recentes = OrderedDict()   # chave dos filtros -> (bitset, visão)
+        self._sem_filtro = None          # (chave, visão) do estado sem filtro
+        self._lock = threading.Lock()
+        self.deltas = 0
+        self.n_linhas = store.n_linhas
+        self.bitsets = {}
+        for dimensao in dimensoes:
+            codigos = store.codigos(dimensao)
+            self.bitsets[dimensao] = {
+                valor: np.packbits(codigos == codigo)
+                for codigo, valor in enumerate(store.categorias_de(dimensao))
+            }
+        self.cubo = (MarginalCube.carregar_ou_construir(store, colunas_cubo, dimensoes, diretorio=diretorio_cubo, mmap=mmap)
+                     if colunas_cubo else None)
+        # Estado sem filtro como base dos deltas: todas as linhas, com as
+        # marginais do cubo e as somas já calculadas na visão sem filtro
+        self._bits_todas = np.packbits(np.ones(self.n_linhas, dtype=bool))
+        self._marginais_todas = MarginalState(self.cubo, [0]) if self.cubo is not None else None
+
+    # Bitset das linhas que têm algum dos valores selecionados na dimensão
+    def _bitset_dimensao(self, dimensao, valores):
+        if dimensao not in self.bitsets:
+            # Dimensão fora do índice: calcular a partir dos códigos
+            codigos = self.store.codigos(dimensao)
+            return np.packbits(np.isin(codigos, self.store.codificar(dimensao, valores)))
+
+        uniao = np.zeros((self.n_linhas + 7) // 8, dtype=np.uint8)
+        for valor in valores:
+            bits = self.bitsets[dimensao].get(valor)
+            if bits is not None:
+                uniao |= bits
+        return uniao
+
+    # Bitset compactado da seleção, ou None quando nenhum filtro está ativo
+    def bitset(self, filtros):
+        resultado = None
+        for dimensao, valores in filtros.items():
+            if valores and len(valores) > 0:
+                bits = self._bitset_dimensao(dimensao, valores)
+                resultado = bits if resultado is None else resultado & bits
+        return resultado
+
+    # Máscara booleana de linhas, ou None quando nenhum filtro está ativo
+    def mascara(self, filtros):
+        bits = self.bitset(filtros)
+        if bits is None:
+            return None
+        return np.unpackbits(bits, count=self.n_linhas).astype(bool)
+
+    # Visão dos dados filtrados (sem cópia; todas as linhas se não houver filtro)
+    def filtrar(self, filtros):
+        chave = f'{self.store.versao}:{chave_filtros(filtros)}'
+        marginais = self.cubo.estado(filtros) if self.cubo is not None else None
+        bits = self.bitset(filtros)
+        if bits is None:
+            with self._lock:
+                if self._sem_filtro is None or self._sem_filtro[0] != chave:
+                    self._sem_filtro = (chave, self.store.view(chave=chave, marginais=marginais))
+                return self._sem_filtro[1]
+
+        with self._lock:
+            if chave in self._recentes:
+                self._recentes.move_to_end(chave)
+                return self._recentes[chave][1]
+
+        linhas = np.flatnonzero(np.unpackbits(bits, count=self.n_linhas))
+        # Estados no cubo já têm as somas prontas; os demais podem partir de um anterior
+        delta = self._delta(bits, len(linhas)) if marginais is None else None
+        view = self.store.view(linhas, chave=chave, marginais=marginais, delta=delta)
+        with self._lock:
+            self._recentes[chave] = (bits, view)
+            while len(self._recentes) > self.recentes:
+                self._recentes.popitem(last=False)
+        return view
+
+    # Diferença para o estado base com menos linhas diferentes, se atualizar
+    # as somas custar menos que somá-las de novo: a atualização percorre as
+    # linhas que saíram e as que entraram; a soma nova, as linhas da seleção.
+    # Só servem de base estados com somas: já calculadas ou no cubo.
+    def _delta(self, bits, n_linhas):
+        with self._lock:
+            bases = [(bits_anterior, view.somas_calculadas, view.marginais)
+                     for bits_anterior, view in self._recentes.values()
+                     if view.somas_calculadas or view.marginais is not None]
+            somas_todas = self._sem_filtro[1].somas_calculadas if self._sem_filtro is not None else None
+        if somas_todas or self._marginais_todas is not None:
+            bases.append((self._bits_todas, somas_todas or {}, self._marginais_todas))
+        melhor = None
+        for base in bases:
+            diferentes = int(BITS_POR_BYTE[bits ^ base[0]].sum())
+            if melhor is None or diferentes < melhor[0]:
+                melhor = (diferentes, base)
+        if melhor is None or melhor[0] >= n_linhas:
+            return None
+
+        _, (bits_anterior, somas_base, marginais_base) = melhor
+        removidas = np.flatnonzero(np.unpackbits(bits_anterior & ~bits, count=self.n_linhas))
+        adicionadas = np.flatnonzero(np.unpackbits(bits & ~bits_anterior, count=self.n_linhas))
+        self.deltas += 1
+        return RowDelta(somas_base, removidas, adicionadas, marginais_base)
+
+    # Esquece as visões guardadas (e as somas calculadas sobre elas)
+    def clear(self):
+        with self._lock:
+            self._recentes.clear()
+            self._sem_filtro = None
+
+    # Memória ocupada pelos bitsets (e pelo cubo de marginais)
+    def nbytes(self):
+        total = sum(bits.nbytes for valores in self.bitsets.values() for bits in valores.values())
+        return total + (self.cubo.nbytes() if self.cubo is not None else 0)
@@ -0,0 +1,251 @@
+import numpy as np
+import pandas as pd
+
+COLUNAS_TABELA = ['coluna', 'valor', 'peso', 'contagem', 'peso_total', 'percentual', 'percentual_validos',
+                  'peso_quadrado', 'peso_quadrado_total', 'n_efetivo', 'erro_padrao', 'erro_padrao_validos']
+
+# Valor crítico da normal para intervalos de 95%
+Z_95 = 1.959964
+
+
+# Função para calcular o tamanho efetivo de amostra de Kish: (soma w)² / soma w²
+def n_efetivo(peso, peso_quadrado):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(peso_quadrado > 0, np.square(peso) / peso_quadrado, 0.0)
+
+
+# Função para calcular o erro padrão, em pontos percentuais, do percentual
+# ponderado p = peso / peso_base, por linearização (Taylor) da razão:
+# Var(p) = [soma w² das linhas da categoria x (1 - p)² + soma w² das demais
+# linhas da base x p²] / peso_base². Só depende das somas de w e de w² por
+# célula; sem pesos (w = 1) se reduz a p(1 - p) / n.
+def erro_padrao_percentual(peso, peso_quadrado, peso_base, peso_quadrado_base):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p = np.asarray(peso, dtype=float) / peso_base
+        # Linhas da base fora da categoria; o resíduo de arredondamento quando
+        # a categoria é a base inteira (p = 1) vira zero
+        resto = np.asarray(peso_quadrado_base - peso_quadrado, dtype=float)
+        resto = np.where(resto > 1e-9 * np.abs(peso_quadrado_base), resto, 0.0)
+        variancia = (peso_quadrado * np.square(1 - p) + resto * np.square(p)) / np.square(peso_base)
+        return np.sqrt(np.clip(variancia, 0, None)) * 100
+
+
+# Função para calcular o intervalo de confiança (limitado a 0-100%) de percentuais
+def intervalo_confianca(percentual, erro_padrao, z=Z_95):
+    percentual = np.asarray(percentual, dtype=float)
+    margem = z * np.asarray(erro_padrao, dtype=float)
+    return np.clip(percentual - margem, 0, 100), np.clip(percentual + margem, 0, 100)
+
+
+# Função para obter o peso total e a soma dos pesos ao quadrado das linhas selecionadas
+def totais_de_peso(df, weight_col='peso'):
+    if df.marginais is not None and df.marginais.tem_pesos(weight_col):
+        return df.marginais.peso_total(), df.marginais.peso_quadrado_total()
+    pesos = df.pesos(weight_col)
+    if pesos is None:
+        return float(len(df)), float(len(df))
+    return float(pesos.sum()), float(np.dot(pesos, pesos))
+
+
+# Função para somar pesos, contagens e pesos ao quadrado por código global de
+# um conjunto de linhas do armazenamento (todas, se linhas for None). Os três
+# bincounts usam o mesmo vetor de códigos globais.
+def _somar_linhas(store, posicoes, deslocamentos, linhas, weight_col):
+    total_codigos = int(deslocamentos[-1])
+    if linhas is None:
+        codigos = store.matriz[posicoes]
+    else:
+        codigos = store.matriz[np.ix_(posicoes, linhas)]
+    codigos = codigos.astype(np.int64)
+    globais = np.where(codigos >= 0, codigos + deslocamentos[:-1, None], total_codigos).ravel()
+
+    contagens = np.bincount(globais, minlength=total_codigos + 1)[:total_codigos]
+    pesos = store.pesos(weight_col)
+    if pesos is None:
+        return contagens.astype(float), contagens, contagens.astype(float)
+    if linhas is not None:
+        pesos = pesos[linhas]
+    pesos_repetidos = np.broadcast_to(pesos, codigos.shape).ravel()
+    somas = np.bincount(globais, weights=pesos_repetidos, minlength=total_codigos + 1)[:total_codigos]
+    quadrados_repetidos = np.broadcast_to(pesos * pesos, codigos.shape).ravel()
+    quadrados = np.bincount(globais, weights=quadrados_repetidos, minlength=total_codigos + 1)[:total_codigos]
+    return somas, contagens, quadrados
+
+
+# Função para obter, das somas já guardadas (chave (colunas, peso)), as das
+# `colunas` pedidas: a própria entrada ou o recorte dos intervalos de cada
+# coluna em uma entrada com mais colunas. Os valores de cada categoria são
+# os mesmos (o bincount soma as linhas de cada compartimento na mesma ordem).
+# None se nenhuma entrada contém todas as colunas.
+def _recortar_somas(store, guardadas, colunas, weight_col):
+    if not guardadas or not colunas:
+        return None
+    chave = (tuple(colunas), weight_col)
+    if chave in guardadas:
+        return guardadas[chave]
+    for (outras, peso), somadas in list(guardadas.items()):
+        if peso != weight_col or not set(colunas) <= set(outras):
+            continue
+        inicios = np.concatenate([[0], np.cumsum([len(store.categorias_de(c)) for c in outras])])
+        indice = {coluna: i for i, coluna in enumerate(outras)}
+        fatias = [slice(inicios[indice[c]], inicios[indice[c] + 1]) for c in colunas]
+        return tuple(np.concatenate([valores[fatia] for fatia in fatias]) for valores in somadas)
+    return None
+
+
+# Função para juntar as somas das `colunas` nas marginais de um estado do
+# cubo, ou None se não há marginais ou alguma coluna está fora do cubo
+def _somas_marginais(marginais, colunas, weight_col):
+    if not colunas or marginais is None or not all(marginais.tem(c, weight_col) for c in colunas):
+        return None
+    partes = [marginais.somar(c) for c in colunas]
+    return tuple(np.concatenate([parte[i] for parte in partes]) for i in range(3))
+
+
+# Função para calcular as somas de peso, contagens e somas de peso ao quadrado
+# de várias colunas em uma única passada. As categorias de cada coluna ocupam
+# um intervalo próprio de um espaço global de códigos; respostas inválidas
+# caem no último compartimento.
+# Retorna (colunas, deslocamentos, somas, contagens, quadrados).
+def somar_colunas(df, columns, weight_col='peso'):
+    store = df.store
+    colunas = [c for c in dict.fromkeys(columns) if c in store.posicao]
+    tamanhos = np.array([len(store.categorias_de(c)) for c in colunas], dtype=np.int64)
+    deslocamentos = np.concatenate([[0], np.cumsum(tamanhos)])
+
+    # Estado de filtros pré-calculado no cubo de marginais: só juntar as fatias
+    no_cubo = _somas_marginais(df.marginais, colunas, weight_col)
+    if no_cubo is not None:
+        return (colunas, deslocamentos) + no_cubo
+
+    posicoes = [store.posicao[c] for c in colunas]
+    chave = (tuple(colunas), weight_col)
+    ja_somadas = _recortar_somas(store, df.somas_calculadas, colunas, weight_col)
+    if ja_somadas is not None:
+        # Mesmas colunas já somadas nesta visão (por exemplo, percentual e erro
+        # padrão), ou dentro da passada única de todas as colunas de uma aba
+        return (colunas, deslocamentos) + ja_somadas
+    delta = df.delta
+    somas_base = None
+    if delta is not None:
+        somas_base = _recortar_somas(store, delta.somas_base, colunas, weight_col)
+        if somas_base is None:
+            somas_base = _somas_marginais(delta.marginais_base, colunas, weight_col)
+    if somas_base is not None:
+        # Visão próxima de uma anterior já somada (ou no cubo): atualizar as
+        # somas só com as linhas que saíram e as que entraram
+        somas, contagens, quadrados = somas_base
+        removidas = _somar_linhas(store, posicoes, deslocamentos, delta.removidas, weight_col)
+        adicionadas = _somar_linhas(store, posicoes, deslocamentos, delta.adicionadas, weight_col)
+        somas = somas - removidas[0] + adicionadas[0]
+        contagens = contagens - removidas[1] + adicionadas[1]
+        quadrados = quadrados - removidas[2] + adicionadas[2]
+        # Sem resíduo de arredondamento nas categorias que ficaram vazias
+        somas[contagens == 0] = 0.0
+        quadrados[contagens == 0] = 0.0
+    else:
+        somas, contagens, quadrados = _somar_linhas(store, posicoes, deslocamentos, df.linhas, weight_col)
+
+    if df.somas_calculadas is not None:
+        df.somas_calculadas[chave] = (somas, contagens, quadrados)
+    return colunas, deslocamentos, somas, contagens, quadrados
+
+
+# Função para calcular a distribuição ponderada de todas as colunas de uma
+# lista (por exemplo, um grupo de grupos_colunas.json) em uma única passada.
+# Retorna uma tabela longa com uma linha por (coluna, valor) presente:
+# percentual sobre o peso total e percentual sobre as respostas válidas da
+# coluna, cada um com o seu erro padrão (ver erro_padrao_percentual), e o
+# tamanho efetivo de amostra (Kish) das linhas selecionadas.
+# Com ordem_aparicao=True, os valores de cada coluna seguem a ordem em que
+# aparecem nos dados; caso contrário, a ordem das categorias.
+def weighted_frequencies(df, columns, weight_col='peso', ordem_aparicao=False):
+    colunas, deslocamentos, somas, contagens, quadrados = somar_colunas(df, columns, weight_col)
+    if not colunas:
+        return pd.DataFrame(columns=COLUNAS_TABELA)
+
+    tamanhos = np.diff(deslocamentos)
+    coluna_de = np.repeat(np.arange(len(colunas)), tamanhos)
+    presentes = np.flatnonzero(contagens)
+    if ordem_aparicao:
+        # Primeira ocorrência de cada código no bloco (coluna x linha) achatado:
+        # ordena por coluna e, dentro dela, pela ordem de aparição
+        posicoes = [df.store.posicao[c] for c in colunas]
+        codigos = df.store.matriz[posicoes] if df.linhas is None else df.store.matriz[np.ix_(posicoes, df.linhas)]
+        codigos = codigos.astype(np.int64)
+        globais = np.where(codigos >= 0, codigos + deslocamentos[:-1, None], -1).ravel()
+        codigos_vistos, primeira_ocorrencia = np.unique(globais, return_index=True)
+        validos = codigos_vistos >= 0
+        presentes = codigos_vistos[validos][np.argsort(primeira_ocorrencia[validos])]
+
+    peso_total, peso_quadrado_total = totais_de_peso(df, weight_col)
+    total_validos = np.bincount(coluna_de, weights=somas, minlength=len(colunas))
+    quadrados_validos = np.bincount(coluna_de, weights=quadrados, minlength=len(colunas))
+    todas_categorias = [valor for coluna in colunas for valor in df.categorias_de(coluna)]
+
+    base_validos = total_validos[coluna_de[presentes]]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        percentual_validos = somas[presentes] / base_validos * 100
+        percentual = somas[presentes] / peso_total * 100 if peso_total > 0 else np.nan
+    erro_padrao = erro_padrao_percentual(somas[presentes], quadrados[presentes], peso_total, peso_quadrado_total) \
+        if peso_total > 0 else np.nan
+    erro_padrao_validos = erro_padrao_percentual(somas[presentes], quadrados[presentes], base_validos,
+                                                 quadrados_validos[coluna_de[presentes]])
+
+    return pd.DataFrame({
+        'coluna': [colunas[i] for i in coluna_de[presentes]],
+        'valor': [todas_categorias[i] for i in presentes],
+        'peso': somas[presentes],
+        'contagem': contagens[presentes],
+        'peso_total': peso_total,
+        'percentual': percentual,
+        'percentual_validos': np.where(base_validos > 0, percentual_validos, np.nan),
+        'peso_quadrado': quadrados[presentes],
+        'peso_quadrado_total': peso_quadrado_total,
+        'n_efetivo': float(n_efetivo(peso_total, peso_quadrado_total)),
+        'erro_padrao': erro_padrao,
+        'erro_padrao_validos': np.where(base_validos > 0, erro_padrao_validos, np.nan),
+    }, columns=COLUNAS_TABELA)
+
+
+# Função para calcular, por coluna, o percentual ponderado das respostas em
+# `valores`. O denominador é o peso total ou, com `base`, o peso das respostas
+# em `base`. Colunas com denominador zero ficam com NaN.
+def weighted_shares(tabela, valores, base=None):
+    colunas = pd.unique(tabela['coluna'])
+    numerador = tabela[tabela['valor'].isin(valores)].groupby('coluna', sort=False)['peso'].sum()
+    numerador = numerador.reindex(colunas, fill_value=0.0)
+    if base is None:
+        denominador = tabela.groupby('coluna', sort=False)['peso_total'].first().reindex(colunas)
+    else:
+        denominador = tabela[tabela['valor'].isin(base)].groupby('coluna', sort=False)['peso'].sum()
+        denominador = denominador.reindex(colunas, fill_value=0.0)
+    return (numerador / denominador.where(denominador > 0)) * 100
+
+
+# Função para calcular, por coluna, o mesmo percentual de weighted_shares com
+# o erro padrão, o intervalo de confiança de 95% e o tamanho efetivo de
+# amostra (Kish) do denominador. Retorna um DataFrame indexado pela coluna.
+def weighted_shares_erros(tabela, valores, base=None):
+    colunas = pd.unique(tabela['coluna'])
+    numerador = tabela[tabela['valor'].isin(valores)].groupby('coluna', sort=False)[['peso', 'peso_quadrado']].sum()
+    numerador = numerador.reindex(colunas, fill_value=0.0)
+    if base is None:
+        denominador = tabela.groupby('coluna', sort=False)[['peso_total', 'peso_quadrado_total']].first()
+        denominador = denominador.reindex(colunas).set_axis(['peso', 'peso_quadrado'], axis=1)
+    else:
+        denominador = tabela[tabela['valor'].isin(base)].groupby('coluna', sort=False)[['peso', 'peso_quadrado']].sum()
+        denominador = denominador.reindex(colunas, fill_value=0.0)
+
+    peso_base = denominador['peso'].where(denominador['peso'] > 0).to_numpy()
+    percentual = numerador['peso'].to_numpy() / peso_base * 100
+    erro_padrao = erro_padrao_percentual(numerador['peso'].to_numpy(), numerador['peso_quadrado'].to_numpy(),
+                                         peso_base, denominador['peso_quadrado'].to_numpy())
+    inferior, superior = intervalo_confianca(percentual, erro_padrao)
+    return pd.DataFrame({
+        'percentual': percentual,
+        'erro_padrao': erro_padrao,
+        'ic_inferior': inferior,
+        'ic_superior': superior,
+        'n_efetivo': n_efetivo(denominador['peso'].to_numpy(), denominador['peso_quadrado'].to_numpy()),
+    }, index=pd.Index(colunas, name='coluna'))
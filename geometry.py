@@ -0,0 +1,182 @@
+# Geometrias dos municípios de Sergipe para o mapa do dashboard.
+#
+# O CSV traz, em cada linha, o polígono (texto GeoJSON) do município do
+# respondente, mas há só um polígono distinto por cidade. No armazenamento
+# codificado esses textos já são as categorias da coluna Polygon, então cada
+# polígono é lido uma única vez, associado à sua cidade pelos códigos e
+# simplificado (Douglas-Peucker) em alguns níveis de detalhe, um por faixa de
+# zoom do mapa. O resultado é um GeoJSON compacto (coordenadas arredondadas,
+# sem propriedades, id = cidade) por nível, guardado em memória e em disco
+# (chaveado pelo conteúdo dos polígonos), de modo que os workers seguintes
+# não refazem a simplificação.
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+# Níveis de detalhe: tolerância da simplificação (graus) e casas decimais das coordenadas
+NIVEIS = {
+    'estado': (0.005, 3),
+    'regiao': (0.0015, 4),
+    'municipio': (0.0003, 4),
+}
+# Escala da projeção do mapa a partir da qual cada nível é usado (em ordem crescente)
+ESCALAS_NIVEIS = [(0, 'estado'), (2.5, 'regiao'), (6, 'municipio')]
+
+
+# Função para simplificar uma sequência de pontos (N x 2) pelo algoritmo de
+# Douglas-Peucker, sem recursão (pilha de trechos)
+def simplificar_linha(pontos, tolerancia):
+    n = len(pontos)
+    if n < 3:
+        return pontos
+    manter = np.zeros(n, dtype=bool)
+    manter[0] = manter[-1] = True
+    pilha = [(0, n - 1)]
+    while pilha:
+        inicio, fim = pilha.pop()
+        if fim - inicio < 2:
+            continue
+        a, b = pontos[inicio], pontos[fim]
+        meio = pontos[inicio + 1:fim]
+        direcao = b - a
+        comprimento = np.hypot(direcao[0], direcao[1])
+        if comprimento == 0:
+            distancias = np.hypot(meio[:, 0] - a[0], meio[:, 1] - a[1])
+        else:
+            distancias = np.abs(direcao[0] * (meio[:, 1] - a[1]) - direcao[1] * (meio[:, 0] - a[0])) / comprimento
+        maior = int(np.argmax(distancias))
+        if distancias[maior] > tolerancia:
+            indice = inicio + 1 + maior
+            manter[indice] = True
+            pilha.append((inicio, indice))
+            pilha.append((indice, fim))
+    return pontos[manter]
+
+
+# Função para simplificar um anel (fechado) de um polígono. O anel é dividido
+# no ponto mais distante do primeiro, para que os dois extremos fixos do
+# algoritmo não fiquem no mesmo lugar; anéis que degenerariam (menos de 4
+# pontos) são mantidos como estão.
+def simplificar_anel(anel, tolerancia, casas):
+    pontos = np.asarray(anel, dtype=np.float64)
+    if len(pontos) > 4:
+        oposto = int(np.argmax(np.hypot(pontos[:, 0] - pontos[0, 0], pontos[:, 1] - pontos[0, 1])))
+        if 0 < oposto < len(pontos) - 1:
+            simplificado = np.concatenate([simplificar_linha(pontos[:oposto + 1], tolerancia)[:-1],
+                                           simplificar_linha(pontos[oposto:], tolerancia)])
+            if len(simplificado) >= 4:
+                pontos = simplificado
+    pontos = np.round(pontos, casas)
+    # Arredondar pode repetir pontos vizinhos
+    repetidos = np.r_[False, (np.diff(pontos, axis=0) == 0).all(axis=1)]
+    if len(pontos) - repetidos.sum() >= 4:
+        pontos = pontos[~repetidos]
+    return pontos.tolist()
+
+
+# Função para simplificar uma geometria GeoJSON (Polygon ou MultiPolygon)
+def simplificar_geometria(geometria, tolerancia, casas):
+    if geometria['type'] == 'Polygon':
+        return {'type': 'Polygon',
+                'coordinates': [simplificar_anel(anel, tolerancia, casas) for anel in geometria['coordinates']]}
+    if geometria['type'] == 'MultiPolygon':
+        return {'type': 'MultiPolygon',
+                'coordinates': [[simplificar_anel(anel, tolerancia, casas) for anel in poligono]
+                                for poligono in geometria['coordinates']]}
+    raise ValueError(f"Tipo de geometria não suportado: {geometria['type']}")
+
+
+# Função para escolher o nível de detalhe pela escala da projeção do mapa
+def nivel_da_escala(escala):
+    nivel = ESCALAS_NIVEIS[0][1]
+    for minima, nome in ESCALAS_NIVEIS:
+        if escala >= minima:
+            nivel = nome
+    return nivel
+
+
+class MunicipalityGeometry:
+    def __init__(self, municipios, geojson, tempo_construcao=0.0, do_disco=False):
+        self.municipios = municipios          # ids das features, na ordem do mapa
+        self.geojson = geojson                # nível -> FeatureCollection compacta
+        self.tempo_construcao = tempo_construcao
+        self.do_disco = do_disco
+
+    # Geometrias a partir das colunas cidade e Polygon de um armazenamento. Com
+    # `diretorio`, o GeoJSON simplificado é lido de/gravado em disco.
+    @classmethod
+    def from_store(cls, store, coluna_cidade='cidade', coluna_poligono='Polygon', diretorio=None):
+        inicio = time.perf_counter()
+        if coluna_cidade not in store.posicao or coluna_poligono not in store.posicao:
+            return cls([], {nivel: {'type': 'FeatureCollection', 'features': []} for nivel in NIVEIS})
+
+        # Primeira linha de cada polígono distinto -> cidade dessa linha
+        codigos_poligono = store.codigos(coluna_poligono)
+        codigos_cidade = store.codigos(coluna_cidade)
+        validos = np.flatnonzero((codigos_poligono >= 0) & (codigos_cidade >= 0))
+        distintos, primeiras = np.unique(codigos_poligono[validos], return_index=True)
+        cidades = store.categorias_de(coluna_cidade)
+        textos = store.categorias_de(coluna_poligono)
+        pares = sorted({str(cidades[codigos_cidade[validos[p]]]): str(textos[c])
+                        for c, p in zip(distintos, primeiras)}.items())
+
+        chave = hashlib.sha1(json.dumps([pares, NIVEIS], ensure_ascii=False).encode('utf-8')).hexdigest()[:16]
+        caminho = os.path.join(diretorio, f'geometrias-{chave}.json') if diretorio else None
+        geojson = _ler_geojson(caminho) if caminho else None
+        if geojson is not None:
+            return cls([cidade for cidade, _ in pares], geojson, time.perf_counter() - inicio, do_disco=True)
+
+        geometrias = [(cidade, json.loads(texto)) for cidade, texto in pares]
+        geojson = {}
+        for nivel, (tolerancia, casas) in NIVEIS.items():
+            geojson[nivel] = {
+                'type': 'FeatureCollection',
+                'features': [{'type': 'Feature', 'id': cidade, 'properties': {},
+                              'geometry': simplificar_geometria(geometria, tolerancia, casas)}
+                             for cidade, geometria in geometrias],
+            }
+        if caminho:
+            _gravar_geojson(caminho, geojson)
+        return cls([cidade for cidade, _ in pares], geojson, time.perf_counter() - inicio)
+
+    # Tamanho (bytes do JSON) e número de vértices de cada nível
+    def stats(self):
+        stats = {'municipios': len(self.municipios), 'construcao_ms': round(self.tempo_construcao * 1000, 2),
+                 'do_disco': self.do_disco, 'niveis': {}}
+        for nivel, colecao in self.geojson.items():
+            vertices = sum(len(anel) for feature in colecao['features']
+                           for anel in _aneis(feature['geometry']))
+            stats['niveis'][nivel] = {
+                'vertices': vertices,
+                'bytes': len(json.dumps(colecao, separators=(',', ':')).encode('utf-8')),
+            }
+        return stats
+
+
+def _aneis(geometria):
+    if geometria['type'] == 'Polygon':
+        return geometria['coordinates']
+    return [anel for poligono in geometria['coordinates'] for anel in poligono]
+
+
+def _ler_geojson(caminho):
+    try:
+        with open(caminho, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+# Gravação atômica (arquivo temporário + rename), como nos snapshots
+def _gravar_geojson(caminho, geojson):
+    diretorio = os.path.dirname(caminho)
+    os.makedirs(diretorio, exist_ok=True)
+    descritor, temporario = tempfile.mkstemp(dir=diretorio, prefix='.geometrias-')
+    with os.fdopen(descritor, 'w', encoding='utf-8') as f:
+        json.dump(geojson, f, ensure_ascii=False, separators=(',', ':'))
+    os.chmod(temporario, 0o644)
+    os.replace(temporario, caminho)
@@ -0,0 +1,32 @@
+# Configuração do gunicorn para servir o dashboard:
+#     gunicorn app:server -c gunicorn.conf.py
+#
+# O snapshot binário da pesquisa é gerado uma única vez no processo mestre, ao
+# importar o app (preload_app), e os workers o mapeiam em memória (somente
+# leitura), compartilhando as mesmas páginas em vez de cada um manter sua
+# própria cópia dos dados. Para usar um segmento de memória compartilhada,
+# aponte DASHBOARD_SNAPSHOT_DIR para /dev/shm.
+import gc
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8050')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+# Com mais de uma thread o gunicorn usa workers gthread: requisições idênticas
+# simultâneas no mesmo worker esperam um único cálculo (ver single_flight.py)
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+
+# Importar o app no mestre antes do fork: dados e layout prontos em todos os workers
+preload_app = True
+
+os.environ.setdefault('DASHBOARD_MMAP', '1')
+# Com o preload os dados são carregados no mestre e herdados pelos workers;
+# no início rápido cada worker faria a sua própria carga tardia
+os.environ.setdefault('DASHBOARD_INICIO_RAPIDO', '0')
+
+
+# Congelar os objetos já criados no mestre para que o coletor de lixo dos
+# workers não os toque (o que quebraria o compartilhamento copy-on-write)
+def pre_fork(server, worker):
+    gc.freeze()
@@ -0,0 +1,226 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+# Versão do formato do cubo gravado em disco (entra na chave do artefato)
+VERSAO_FORMATO_CUBO = 1
+MATRIZES_CUBO = ('somas', 'contagens', 'quadrados', 'peso_total', 'peso_quadrado_total')
+
+
+# Cubo de marginais pré-calculadas: para cada pergunta de grupos_colunas.json,
+# as somas de peso, contagens e somas de peso ao quadrado (para os erros
+# padrão) de cada categoria na população inteira e em cada valor isolado de
+# cada dimensão de filtro. As categorias de todas as
+# colunas ocupam um espaço global de códigos (como em frequencies.somar_colunas),
+# então o cubo é só um trio de matrizes (estado x código).
+#
+# Um estado de filtros com no máximo uma dimensão ativa é respondido por
+# consulta ao cubo; vários valores da mesma dimensão somam as linhas (os
+# respondentes de valores diferentes são disjuntos). Seleções em mais de uma
+# dimensão continuam sendo calculadas sobre os dados.
+class MarginalCube:
+    def __init__(self, store, colunas, dimensoes, weight_col='peso', limite_elementos=4_000_000):
+        inicio = time.perf_counter()
+        self.store = store
+        self.weight_col = weight_col
+        self.colunas = [c for c in dict.fromkeys(colunas) if c in store.posicao]
+        tamanhos = np.array([len(store.categorias_de(c)) for c in self.colunas], dtype=np.int64)
+        deslocamentos = np.concatenate([[0], np.cumsum(tamanhos)])
+        self.deslocamento = {c: int(deslocamentos[i]) for i, c in enumerate(self.colunas)}
+        total_codigos = int(deslocamentos[-1])
+
+        # Estado 0: população inteira; depois um estado por (dimensão, valor)
+        self.estados = {}
+        for dimensao in dimensoes:
+            for valor in store.categorias_de(dimensao):
+                self.estados[(dimensao, valor)] = len(self.estados) + 1
+        n_estados = len(self.estados) + 1
+
+        pesos = store.pesos(weight_col)
+        pesos = np.ones(store.n_linhas) if pesos is None else pesos
+        pesos_quadrados = pesos * pesos
+        self.somas = np.zeros((n_estados, total_codigos))
+        self.contagens = np.zeros((n_estados, total_codigos), dtype=np.int64)
+        self.quadrados = np.zeros((n_estados, total_codigos))
+        self.peso_total = np.zeros(n_estados)
+        self.peso_quadrado_total = np.zeros(n_estados)
+        self.peso_total[0] = pesos.sum()
+        self.peso_quadrado_total[0] = pesos_quadrados.sum()
+
+        # Dimensões como códigos; linhas sem resposta vão para um valor extra, descartado
+        codigos_dimensoes = []
+        for dimensao in dimensoes:
+            n_valores = len(store.categorias_de(dimensao))
+            codigos_dimensao = store.codigos(dimensao).astype(np.int64)
+            codigos_dimensao = np.where(codigos_dimensao >= 0, codigos_dimensao, n_valores)
+            codigos_dimensoes.append((dimensao, n_valores, codigos_dimensao))
+            totais = np.bincount(codigos_dimensao, weights=pesos, minlength=n_valores + 1)
+            totais_quadrados = np.bincount(codigos_dimensao, weights=pesos_quadrados, minlength=n_valores + 1)
+            for codigo, valor in enumerate(store.categorias_de(dimensao)):
+                self.peso_total[self.estados[(dimensao, valor)]] = totais[codigo]
+                self.peso_quadrado_total[self.estados[(dimensao, valor)]] = totais_quadrados[codigo]
+
+        # Colunas em blocos (limita a memória temporária em pesquisas grandes);
+        # em cada bloco, um bincount para a população e um por dimensão sobre o
+        # código combinado (valor da dimensão, código no bloco)
+        por_bloco = max(1, limite_elementos // max(store.n_linhas, 1))
+        for primeira in range(0, len(self.colunas), por_bloco):
+            bloco = self.colunas[primeira:primeira + por_bloco]
+            base = int(deslocamentos[primeira])
+            largura_bloco = int(deslocamentos[primeira + len(bloco)]) - base
+            largura = largura_bloco + 1
+            codigos = store.matriz[[store.posicao[c] for c in bloco]].astype(np.int64)
+            locais = np.where(codigos >= 0, codigos + (deslocamentos[primeira:primeira + len(bloco), None] - base),
+                              largura_bloco)
+            pesos_repetidos = np.broadcast_to(pesos, locais.shape).ravel()
+            quadrados_repetidos = np.broadcast_to(pesos_quadrados, locais.shape).ravel()
+            fatia = slice(base, base + largura_bloco)
+
+            self.somas[0, fatia] = np.bincount(locais.ravel(), weights=pesos_repetidos, minlength=largura)[:largura_bloco]
+            self.contagens[0, fatia] = np.bincount(locais.ravel(), minlength=largura)[:largura_bloco]
+            self.quadrados[0, fatia] = np.bincount(locais.ravel(), weights=quadrados_repetidos,
+                                                   minlength=largura)[:largura_bloco]
+            for dimensao, n_valores, codigos_dimensao in codigos_dimensoes:
+                combinado = (codigos_dimensao[None, :] * largura + locais).ravel()
+                tamanho = (n_valores + 1) * largura
+                somas = np.bincount(combinado, weights=pesos_repetidos, minlength=tamanho).reshape(n_valores + 1, largura)
+                contagens = np.bincount(combinado, minlength=tamanho).reshape(n_valores + 1, largura)
+                quadrados = np.bincount(combinado, weights=quadrados_repetidos,
+                                        minlength=tamanho).reshape(n_valores + 1, largura)
+                estados = [self.estados[(dimensao, valor)] for valor in store.categorias_de(dimensao)]
+                self.somas[estados, fatia] = somas[:n_valores, :largura_bloco]
+                self.contagens[estados, fatia] = contagens[:n_valores, :largura_bloco]
+                self.quadrados[estados, fatia] = quadrados[:n_valores, :largura_bloco]
+
+        self.tempo_construcao = time.perf_counter() - inicio
+        self.do_disco = False
+        self.consultas = 0
+        self.acertos = 0
+
+    # Cubo gravado em `diretorio` para este armazenamento, colunas e dimensões
+    # (pela versão do armazenamento), ou construído e gravado ali. Com
+    # mmap=True as matrizes ficam mapeadas em memória somente leitura, e os
+    # workers compartilham as mesmas páginas, como no snapshot.
+    @classmethod
+    def carregar_ou_construir(cls, store, colunas, dimensoes, diretorio=None, weight_col='peso', mmap=False):
+        if diretorio is None:
+            return cls(store, colunas, dimensoes, weight_col=weight_col)
+        dimensoes = list(dimensoes)
+        chave = hashlib.sha1(json.dumps([VERSAO_FORMATO_CUBO, store.versao, list(colunas), dimensoes, weight_col],
+                                        ensure_ascii=False).encode('utf-8')).hexdigest()[:16]
+        caminho = os.path.join(diretorio, f'cubo-{chave}')
+        cubo = cls._carregar(store, caminho, weight_col, mmap)
+        if cubo is None:
+            cubo = cls(store, colunas, dimensoes, weight_col=weight_col)
+            cubo._gravar(diretorio, caminho)
+        return cubo
+
+    @classmethod
+    def _carregar(cls, store, caminho, weight_col, mmap):
+        inicio = time.perf_counter()
+        try:
+            with open(os.path.join(caminho, 'meta.json'), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            matrizes = {nome: np.load(os.path.join(caminho, f'{nome}.npy'), mmap_mode='r' if mmap else None)
+                        for nome in MATRIZES_CUBO}
+        except (OSError, ValueError):
+            return None
+        cubo = cls.__new__(cls)
+        cubo.store = store
+        cubo.weight_col = weight_col
+        cubo.colunas = meta['colunas']
+        cubo.deslocamento = dict(zip(meta['colunas'], meta['deslocamentos']))
+        cubo.estados = {(dimensao, valor): i for i, (dimensao, valor) in enumerate(meta['estados'], start=1)}
+        for nome, matriz in matrizes.items():
+            setattr(cubo, nome, matriz)
+        cubo.tempo_construcao = time.perf_counter() - inicio
+        cubo.do_disco = True
+        cubo.consultas = 0
+        cubo.acertos = 0
+        return cubo
+
+    # Gravação atômica (diretório temporário + rename), como nos snapshots;
+    # se outro worker gravou antes, o dele é mantido
+    def _gravar(self, diretorio, caminho):
+        os.makedirs(diretorio, exist_ok=True)
+        temporario = tempfile.mkdtemp(dir=diretorio, prefix='.cubo-')
+        os.chmod(temporario, 0o755)
+        for nome in MATRIZES_CUBO:
+            np.save(os.path.join(temporario, f'{nome}.npy'), getattr(self, nome))
+        estados = sorted(self.estados, key=self.estados.get)
+        with open(os.path.join(temporario, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({'colunas': self.colunas, 'deslocamentos': [self.deslocamento[c] for c in self.colunas],
+                       'estados': [list(estado) for estado in estados]}, f, ensure_ascii=False)
+        try:
+            os.rename(temporario, caminho)
+        except OSError:
+            shutil.rmtree(temporario, ignore_errors=True)
+
+    # Estado do cubo para um conjunto de filtros, ou None se precisar do cálculo
+    # sobre os dados (mais de uma dimensão ativa ou valor fora do cubo)
+    def estado(self, filtros):
+        self.consultas += 1
+        ativos = [(dimensao, valores) for dimensao, valores in filtros.items() if valores and len(valores) > 0]
+        if not ativos:
+            self.acertos += 1
+            return MarginalState(self, [0])
+        if len(ativos) > 1:
+            return None
+        dimensao, valores = ativos[0]
+        linhas = [self.estados.get((dimensao, valor)) for valor in dict.fromkeys(valores)]
+        if any(linha is None for linha in linhas):
+            # Valor desconhecido (sem respondentes) ou dimensão fora do cubo
+            return None
+        self.acertos += 1
+        return MarginalState(self, linhas)
+
+    def nbytes(self):
+        return (self.somas.nbytes + self.contagens.nbytes + self.quadrados.nbytes +
+                self.peso_total.nbytes + self.peso_quadrado_total.nbytes)
+
+    def stats(self):
+        return {
+            'estados': len(self.estados) + 1,
+            'colunas': len(self.colunas),
+            'codigos': self.somas.shape[1],
+            'bytes': self.nbytes(),
+            'construcao_ms': round(self.tempo_construcao * 1000, 2),
+            'do_disco': self.do_disco,
+            'consultas': self.consultas,
+            'acertos': self.acertos,
+            'hit_ratio': round(self.acertos / self.consultas, 4) if self.consultas else None,
+        }
+
+
+# Marginais de um estado de filtros (uma ou mais linhas do cubo somadas)
+class MarginalState:
+    def __init__(self, cubo, linhas):
+        self.cubo = cubo
+        self.linhas = linhas
+
+    def tem_pesos(self, weight_col='peso'):
+        return weight_col == self.cubo.weight_col
+
+    def tem(self, coluna, weight_col='peso'):
+        return self.tem_pesos(weight_col) and coluna in self.cubo.deslocamento
+
+    # (somas, contagens, quadrados) por categoria de uma coluna, como em frequencies.somar_colunas
+    def somar(self, coluna):
+        inicio = self.cubo.deslocamento[coluna]
+        fim = inicio + len(self.cubo.store.categorias_de(coluna))
+        matrizes = (self.cubo.somas, self.cubo.contagens, self.cubo.quadrados)
+        if len(self.linhas) == 1:
+            linha = self.linhas[0]
+            return tuple(matriz[linha, inicio:fim] for matriz in matrizes)
+        return tuple(matriz[self.linhas, inicio:fim].sum(axis=0) for matriz in matrizes)
+
+    def peso_total(self):
+        return float(self.cubo.peso_total[self.linhas].sum())
+
+    def peso_quadrado_total(self):
+        return float(self.cubo.peso_quadrado_total[self.linhas].sum())
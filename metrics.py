@@ -0,0 +1,221 @@
+# Instrumentação dos callbacks do Dash: tempo de cada etapa (filtro,
+# agregação, figura e serialização da resposta), bytes da resposta e linhas
+# depois do filtro, por callback. Cada chamada gera uma linha JSON no log
+# estruturado e alimenta histogramas expostos em /metrics no formato texto do
+# Prometheus.
+#
+# Ativada com DASHBOARD_METRICAS=1; o log vai para a saída padrão ou para o
+# arquivo em DASHBOARD_METRICAS_LOG. Desativada (padrão), `instrumentar`
+# devolve a própria função e `etapa` devolve um contexto vazio compartilhado,
+# então o custo no caminho quente é uma chamada de método por etapa.
+#
+# A serialização é medida pelo próprio Flask: o callback termina dentro da
+# requisição /_dash-update-component, e o after_request mede o tempo desde o
+# fim do callback (montagem do JSON da resposta pelo Dash) e o tamanho da
+# resposta. Fora de uma requisição (benchmarks, API) o registro é fechado no
+# fim do callback, sem essa etapa. Os contadores são de cada processo: com
+# vários workers do gunicorn, cada coleta do Prometheus vê um deles (rótulo pid).
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+
+import flask
+
+from dash.exceptions import PreventUpdate
+
+BUCKETS_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_BYTES = (1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+BUCKETS_LINHAS = (10, 100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+ROTA_CALLBACKS = '/_dash-update-component'
+_NULO = contextlib.nullcontext()
+
+
+# Histograma cumulativo por conjunto de rótulos, no formato do Prometheus
+class Histograma:
+    def __init__(self, nome, descricao, buckets):
+        self.nome = nome
+        self.descricao = descricao
+        self.buckets = buckets
+        self._series = {}     # rótulos (tupla de pares) -> [contagens por bucket, soma, total]
+        self._lock = threading.Lock()
+
+    def observar(self, valor, **rotulos):
+        chave = tuple(sorted(rotulos.items()))
+        with self._lock:
+            serie = self._series.get(chave)
+            if serie is None:
+                serie = self._series[chave] = [[0] * len(self.buckets), 0.0, 0]
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie[0][i] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def texto(self, rotulos_comuns):
+        linhas = [f'# HELP {self.nome} {self.descricao}', f'# TYPE {self.nome} histogram']
+        with self._lock:
+            series = [(chave, list(contagens), soma, total) for chave, (contagens, soma, total) in self._series.items()]
+        for chave, contagens, soma, total in sorted(series):
+            rotulos = rotulos_comuns + list(chave)
+            for limite, contagem in zip(self.buckets, contagens):
+                linhas.append(f'{self.nome}_bucket{_rotulos(rotulos + [("le", _numero(limite))])} {contagem}')
+            linhas.append(f'{self.nome}_bucket{_rotulos(rotulos + [("le", "+Inf")])} {total}')
+            linhas.append(f'{self.nome}_sum{_rotulos(rotulos)} {_numero(soma)}')
+            linhas.append(f'{self.nome}_count{_rotulos(rotulos)} {total}')
+        return linhas
+
+
+def _numero(valor):
+    return repr(float(valor))
+
+
+def _rotulos(pares):
+    if not pares:
+        return ''
+    escapar = lambda texto: str(texto).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{nome}="{escapar(valor)}"' for nome, valor in pares) + '}'
+
+
+# Registro de uma chamada de callback em andamento
+class _Chamada:
+    def __init__(self, callback):
+        self.callback = callback
+        self.inicio = time.perf_counter()
+        self.fim = None
+        self.etapas = {}
+        self.linhas = None
+        self.resultado = 'ok'
+
+
+class Metrics:
+    def __init__(self, ativo=False, caminho_log=None):
+        self.ativo = ativo
+        self.caminho_log = caminho_log
+        self._local = threading.local()
+        self._lock_log = threading.Lock()
+        self.duracoes = Histograma('dashboard_callback_segundos',
+                                   'Duração de cada etapa dos callbacks do Dash (etapa="total": callback inteiro)',
+                                   BUCKETS_SEGUNDOS)
+        self.payloads = Histograma('dashboard_callback_resposta_bytes', 'Bytes da resposta de cada callback',
+                                   BUCKETS_BYTES)
+        self.linhas = Histograma('dashboard_callback_linhas_filtradas', 'Linhas selecionadas pelos filtros',
+                                 BUCKETS_LINHAS)
+
+    @classmethod
+    def from_env(cls):
+        return cls(ativo=os.environ.get('DASHBOARD_METRICAS') == '1',
+                   caminho_log=os.environ.get('DASHBOARD_METRICAS_LOG'))
+
+    # Decorador de um callback: abre o registro da chamada e mede o total
+    def instrumentar(self, nome):
+        def decorador(funcao):
+            if not self.ativo:
+                return funcao
+
+            @functools.wraps(funcao)
+            def wrapper(*args, **kwargs):
+                # Callbacks chamados dentro de outro (mesma thread) entram no registro externo
+                if getattr(self._local, 'chamada', None) is not None:
+                    return funcao(*args, **kwargs)
+                chamada = self._local.chamada = _Chamada(nome)
+                try:
+                    return funcao(*args, **kwargs)
+                except PreventUpdate:
+                    chamada.resultado = 'sem_atualizacao'
+                    raise
+                except Exception:
+                    chamada.resultado = 'erro'
+                    raise
+                finally:
+                    chamada.fim = time.perf_counter()
+                    if flask.has_request_context() and flask.request.path.endswith(ROTA_CALLBACKS):
+                        # Fechado no after_request, com a serialização da resposta
+                        flask.g.metricas_chamada = chamada
+                    else:
+                        self._fechar(chamada)
+                    self._local.chamada = None
+            return wrapper
+        return decorador
+
+    # Contexto que mede uma etapa (filtro, agregacao, figura) da chamada em andamento
+    def etapa(self, nome):
+        if not self.ativo or getattr(self._local, 'chamada', None) is None:
+            return _NULO
+        return self._medir_etapa(self._local.chamada, nome)
+
+    @contextlib.contextmanager
+    def _medir_etapa(self, chamada, nome):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            chamada.etapas[nome] = chamada.etapas.get(nome, 0.0) + time.perf_counter() - inicio
+
+    # Linhas depois do filtro na chamada em andamento
+    def registrar_linhas(self, n):
+        if self.ativo:
+            chamada = getattr(self._local, 'chamada', None)
+            if chamada is not None:
+                chamada.linhas = n
+
+    def _fechar(self, chamada, serializacao=None, resposta_bytes=None):
+        total = chamada.fim - chamada.inicio
+        self.duracoes.observar(total, callback=chamada.callback, etapa='total')
+        for etapa, segundos in chamada.etapas.items():
+            self.duracoes.observar(segundos, callback=chamada.callback, etapa=etapa)
+        if serializacao is not None:
+            self.duracoes.observar(serializacao, callback=chamada.callback, etapa='serializacao')
+        if resposta_bytes is not None:
+            self.payloads.observar(resposta_bytes, callback=chamada.callback)
+        if chamada.linhas is not None:
+            self.linhas.observar(chamada.linhas, callback=chamada.callback)
+
+        registro = {
+            'ts': round(time.time(), 3),
+            'pid': os.getpid(),
+            'callback': chamada.callback,
+            'resultado': chamada.resultado,
+            'total_ms': round(total * 1000, 3),
+            'etapas_ms': {etapa: round(segundos * 1000, 3) for etapa, segundos in chamada.etapas.items()},
+            'linhas': chamada.linhas,
+        }
+        if serializacao is not None:
+            registro['etapas_ms']['serializacao'] = round(serializacao * 1000, 3)
+            registro['resposta_bytes'] = resposta_bytes
+        linha = json.dumps(registro, ensure_ascii=False)
+        if self.caminho_log:
+            with self._lock_log, open(self.caminho_log, 'a', encoding='utf-8') as f:
+                f.write(linha + '\n')
+        else:
+            print(linha, flush=True)
+
+    # Texto do /metrics
+    def texto_prometheus(self):
+        comuns = [('pid', os.getpid())]
+        linhas = ['# HELP dashboard_metricas_ativas Instrumentação dos callbacks ativa (DASHBOARD_METRICAS=1)',
+                  '# TYPE dashboard_metricas_ativas gauge',
+                  f'dashboard_metricas_ativas{_rotulos(comuns)} {int(self.ativo)}']
+        for histograma in (self.duracoes, self.payloads, self.linhas):
+            linhas += histograma.texto(comuns)
+        return '\n'.join(linhas) + '\n'
+
+    # Rota /metrics e, com a instrumentação ativa, o fechamento das chamadas
+    # no fim de cada requisição de callback
+    def registrar(self, server):
+        @server.route('/metrics')
+        def metrics():
+            return flask.Response(self.texto_prometheus(), mimetype='text/plain; version=0.0.4')
+
+        if not self.ativo:
+            return
+
+        @server.after_request
+        def fechar_chamada(resposta):
+            chamada = flask.g.pop('metricas_chamada', None)
+            if chamada is not None:
+                self._fechar(chamada, serializacao=time.perf_counter() - chamada.fim,
+                             resposta_bytes=resposta.calculate_content_length())
+            return resposta
@@ -0,0 +1,103 @@
+# Pesos replicados (bootstrap) para a variância das estimativas ponderadas.
+# As R réplicas são geradas uma única vez por armazenamento, a partir da
+# coluna de peso: em cada réplica, cada respondente recebe o seu peso vezes o
+# número de vezes em que foi sorteado em uma reamostragem com reposição das N
+# linhas. Os pesos ficam em uma matriz (R x N) float32.
+#
+# Para uma coluna, as somas de todas as réplicas saem de um único produto de
+# matrizes entre os pesos replicados e os indicadores (one-hot) das
+# categorias, restritos às linhas selecionadas; subconjuntos (filtros) são
+# tratados como domínios da amostra inteira, sem reamostrar de novo. Com
+# workers > 1, as réplicas são divididas em blocos multiplicados em threads
+# (o produto de matrizes do NumPy libera o GIL).
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+class ReplicateWeights:
+    def __init__(self, store, replicas=1000, weight_col='peso', seed=0, workers=1, limite_elementos=4_000_000):
+        inicio = time.perf_counter()
+        self.replicas = replicas
+        self.weight_col = weight_col
+        self.workers = max(1, workers)
+        self.n_linhas = store.n_linhas
+        pesos = store.pesos(weight_col)
+        pesos = np.ones(store.n_linhas) if pesos is None else np.asarray(pesos)
+
+        # Multiplicidades da reamostragem com reposição (Multinomial(N, 1/N)),
+        # geradas em blocos de réplicas para limitar a memória temporária
+        rng = np.random.default_rng(seed)
+        self.pesos = np.empty((replicas, store.n_linhas), dtype=np.float32)
+        probabilidades = np.full(store.n_linhas, 1 / store.n_linhas) if store.n_linhas else np.ones(0)
+        por_bloco = max(1, limite_elementos // max(store.n_linhas, 1))
+        for primeira in range(0, replicas, por_bloco):
+            ultima = min(replicas, primeira + por_bloco)
+            vezes = rng.multinomial(store.n_linhas, probabilidades, size=ultima - primeira)
+            self.pesos[primeira:ultima] = vezes * pesos
+        self.tempo_geracao = time.perf_counter() - inicio
+        self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix='replicas') if self.workers > 1 else None
+
+    def nbytes(self):
+        return self.pesos.nbytes
+
+    # Produto pesos replicados (R x N) @ indicadores (N x K), em blocos de réplicas
+    def _multiplicar(self, indicadores):
+        if self._pool is None:
+            return (self.pesos @ indicadores).astype(np.float64)
+        limites = np.linspace(0, self.replicas, self.workers + 1).astype(int)
+        blocos = self._pool.map(lambda i: self.pesos[limites[i]:limites[i + 1]] @ indicadores, range(self.workers))
+        return np.concatenate(list(blocos)).astype(np.float64)
+
+    # Indicadores (N x K) das linhas selecionadas da visão com código válido
+    def _indicadores(self, view, codigos, n_categorias):
+        linhas = np.arange(self.n_linhas) if view.linhas is None else view.linhas
+        validos = codigos >= 0
+        indicadores = np.zeros((self.n_linhas, n_categorias + 1), dtype=np.float32)
+        indicadores[linhas[validos], codigos[validos]] = 1
+        # Última coluna: todas as linhas selecionadas (peso total da réplica)
+        indicadores[linhas, n_categorias] = 1
+        return indicadores
+
+    # Somas de peso por categoria de uma coluna em cada réplica (R x K) e o
+    # peso total das linhas selecionadas em cada réplica (R)
+    def somas(self, view, coluna):
+        n_categorias = len(view.categorias_de(coluna))
+        resultado = self._multiplicar(self._indicadores(view, view.codigos(coluna), n_categorias))
+        return resultado[:, :n_categorias], resultado[:, n_categorias]
+
+    # Somas de peso por célula (linha x coluna) de um crosstab em cada réplica (R x J x K)
+    def somas_crosstab(self, view, index, columns):
+        codigos_index = view.codigos(index).astype(np.int64)
+        codigos_columns = view.codigos(columns).astype(np.int64)
+        n_index, n_columns = len(view.categorias_de(index)), len(view.categorias_de(columns))
+        combinado = np.where((codigos_index >= 0) & (codigos_columns >= 0),
+                             codigos_index * n_columns + codigos_columns, -1)
+        resultado = self._multiplicar(self._indicadores(view, combinado, n_index * n_columns))
+        return resultado[:, :n_index * n_columns].reshape(self.replicas, n_index, n_columns)
+
+
+# Função para resumir as estimativas das réplicas (R x ...): erro padrão
+# (desvio padrão entre réplicas) e intervalo percentil de 95%
+def resumo_replicas(estimativas):
+    with np.errstate(invalid='ignore'):
+        erro_padrao = np.nanstd(estimativas, axis=0, ddof=1)
+        inferior, superior = np.nanpercentile(estimativas, [2.5, 97.5], axis=0)
+    return erro_padrao, inferior, superior
+
+
+_replicas = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+# Função para obter os pesos replicados de um armazenamento (gerados no primeiro uso)
+def pesos_replicados(store, replicas=1000, workers=1, weight_col='peso'):
+    chave = (replicas, weight_col)
+    with _lock:
+        por_store = _replicas.setdefault(store, {})
+        if chave not in por_store:
+            por_store[chave] = ReplicateWeights(store, replicas, weight_col=weight_col, workers=workers)
+        return por_store[chave]
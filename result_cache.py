@@ -0,0 +1,274 @@
+import functools
+import hashlib
+import json
+import os
+import pickle
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+
+from single_flight import SingleFlight
+
+
+# Função para gerar a chave canônica de um estado de filtros
+# (ordem das dimensões e dos valores não importa; filtros vazios são ignorados)
+def chave_filtros(filtros):
+    canonico = {filtro: sorted(valores) for filtro, valores in (filtros or {}).items() if valores}
+    texto = json.dumps(canonico, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(texto.encode('utf-8')).hexdigest()
+
+
+# Função para converter um argumento de função em parte da chave do cache.
+# Retorna None quando o argumento não tem chave estável (o cache é ignorado).
+def _parte_chave(valor):
+    if hasattr(valor, 'chave'):
+        return valor.chave
+    if isinstance(valor, dict):
+        return chave_filtros(valor)
+    if valor is None or isinstance(valor, (str, int, float, bool)):
+        return repr(valor)
+    if isinstance(valor, (list, tuple)):
+        partes = [_parte_chave(v) for v in valor]
+        return None if None in partes else repr(partes)
+    return None
+
+
+# Função para estimar o tamanho em memória de um valor sem serializá-lo:
+# tabelas pandas pelos índices e colunas, arrays pelos seus dados, figuras
+# plotly pelos dados dos traços (o layout é pequeno e o template é
+# compartilhado), componentes Dash pelas suas propriedades (filhos e
+# figuras incluídos) e contêineres pela soma dos itens
+def _tamanho_estimado(valor):
+    if valor is None or isinstance(valor, (str, bytes, int, float)):
+        return sys.getsizeof(valor)
+    if hasattr(valor, 'memory_usage') and hasattr(valor, 'index'):
+        partes = [valor.index] + ([valor.columns] + [coluna for _, coluna in valor.items()]
+                                  if hasattr(valor, 'columns') else [valor])
+        return sum(_tamanho_array(parte) for parte in partes)
+    if hasattr(valor, 'nbytes') and hasattr(valor, 'dtype'):
+        return _tamanho_array(valor)
+    if hasattr(valor, '_data') and hasattr(valor, 'layout'):
+        return _tamanho_estimado(valor._data)
+    if hasattr(valor, 'to_plotly_json'):
+        return sys.getsizeof(valor) + _tamanho_estimado(valor.to_plotly_json())
+    if isinstance(valor, dict):
+        return sys.getsizeof(valor) + sum(_tamanho_estimado(k) + _tamanho_estimado(v) for k, v in valor.items())
+    if isinstance(valor, (list, tuple, set, frozenset)):
+        return sys.getsizeof(valor) + sum(_tamanho_estimado(v) for v in valor)
+    return sys.getsizeof(valor)
+
+
+# Função para estimar o tamanho de um array, índice ou coluna: com objetos
+# (textos, por exemplo) soma o de cada objeto, além do ponteiro
+def _tamanho_array(valores):
+    if valores.dtype == object:
+        valores = valores.to_numpy() if hasattr(valores, 'to_numpy') else valores
+        return int(valores.nbytes) + sum(_tamanho_estimado(item) for item in valores.flat)
+    return int(valores.nbytes)
+
+
+# Backend em arquivos compartilhado entre processos. Apontado para /dev/shm,
+# funciona como memória compartilhada entre os workers do gunicorn.
+class FileBackend:
+    def __init__(self, diretorio, max_bytes):
+        self.diretorio = diretorio
+        self.max_bytes = max_bytes
+        os.makedirs(diretorio, exist_ok=True)
+
+    def _caminho(self, chave):
+        return os.path.join(self.diretorio, f'{chave}.pkl')
+
+    def get(self, chave):
+        caminho = self._caminho(chave)
+        try:
+            with open(caminho, 'rb') as f:
+                dados = f.read()
+            os.utime(caminho)  # Marcar como usado recentemente (LRU por mtime)
+            return dados
+        except OSError:
+            return None
+
+    def set(self, chave, dados):
+        fd, temporario = tempfile.mkstemp(dir=self.diretorio, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(dados)
+        os.replace(temporario, self._caminho(chave))  # Escrita atômica entre workers
+        return self._limitar_tamanho()
+
+    # Remove os arquivos menos usados até caber no limite; retorna quantos saíram
+    def _limitar_tamanho(self):
+        arquivos = []
+        for entrada in os.scandir(self.diretorio):
+            if entrada.name.endswith('.pkl'):
+                try:
+                    info = entrada.stat()
+                except OSError:
+                    continue
+                arquivos.append((info.st_mtime, info.st_size, entrada.path))
+
+        total = sum(tamanho for _, tamanho, _ in arquivos)
+        removidos = 0
+        for _, tamanho, caminho in sorted(arquivos):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(caminho)
+            except OSError:
+                pass
+            total -= tamanho
+            removidos += 1
+        return removidos
+
+
+# Cache de resultados com despejo LRU limitado por número de itens e bytes,
+# com backend opcional compartilhado entre workers. Cálculos simultâneos da
+# mesma chave são coalescidos (ver single_flight.py).
+class ResultCache:
+    def __init__(self, max_itens=512, max_bytes=64 * 1024 * 1024, backend=None, coalescer=None):
+        self.max_itens = max_itens
+        self.max_bytes = max_bytes
+        self.backend = backend
+        self.coalescer = coalescer
+        self._itens = OrderedDict()  # chave -> (valor, tamanho em bytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.backend_hits = 0
+
+    # Cria o cache a partir das variáveis de ambiente DASHBOARD_CACHE_*.
+    # A coalescência entre threads é ativada por padrão (DASHBOARD_CACHE_COALESCER=0
+    # desativa); entre workers, com DASHBOARD_CACHE_COALESCER=processos e o
+    # backend em arquivos, usando travas no diretório do cache.
+    @classmethod
+    def from_env(cls):
+        max_itens = int(os.environ.get('DASHBOARD_CACHE_ITENS', 512))
+        max_bytes = int(float(os.environ.get('DASHBOARD_CACHE_MB', 64)) * 1024 * 1024)
+        diretorio = os.environ.get('DASHBOARD_CACHE_DIR')
+        backend = FileBackend(diretorio, max_bytes) if diretorio else None
+        modo = os.environ.get('DASHBOARD_CACHE_COALESCER', 'threads')
+        if modo == '0':
+            coalescer = None
+        elif modo == 'processos' and diretorio:
+            coalescer = SingleFlight(os.path.join(diretorio, 'travas'))
+        else:
+            coalescer = SingleFlight()
+        return cls(max_itens=max_itens, max_bytes=max_bytes, backend=backend, coalescer=coalescer)
+
+    def _guardar_local(self, chave, valor, tamanho):
+        with self._lock:
+            if chave in self._itens:
+                self._bytes -= self._itens.pop(chave)[1]
+            self._itens[chave] = (valor, tamanho)
+            self._bytes += tamanho
+            while self._itens and (len(self._itens) > self.max_itens or self._bytes > self.max_bytes):
+                _, (_, tamanho_removido) = self._itens.popitem(last=False)
+                self._bytes -= tamanho_removido
+                self.evictions += 1
+
+    # Procura a chave na memória e no backend; retorna (encontrado, valor, veio do backend)
+    def _procurar(self, chave):
+        with self._lock:
+            if chave in self._itens:
+                self._itens.move_to_end(chave)
+                return True, self._itens[chave][0], False
+
+        if self.backend is not None:
+            dados = self.backend.get(chave)
+            if dados is not None:
+                valor = pickle.loads(dados)
+                self._guardar_local(chave, valor, len(dados))
+                return True, valor, True
+        return False, None, False
+
+    # Retorna (encontrado, valor)
+    def get(self, chave):
+        encontrado, valor, do_backend = self._procurar(chave)
+        with self._lock:
+            if encontrado:
+                self.hits += 1
+                self.backend_hits += do_backend
+            else:
+                self.misses += 1
+        return encontrado, valor
+
+    # Como get, sem contar hit nem miss: a nova consulta de quem esperou pela
+    # coalescência, cuja requisição já foi contada como miss
+    def espiar(self, chave):
+        encontrado, valor, _ = self._procurar(chave)
+        return encontrado, valor
+
+    # Sem backend, o tamanho na memória é estimado; com ele, os bytes gravados
+    # no arquivo já dão o tamanho
+    def set(self, chave, valor):
+        if self.backend is None:
+            self._guardar_local(chave, valor, _tamanho_estimado(valor))
+            return
+        dados = pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL)
+        self._guardar_local(chave, valor, len(dados))
+        removidos = self.backend.set(chave, dados)
+        with self._lock:
+            self.evictions += removidos
+
+    def get_or_compute(self, chave, calcular):
+        encontrado, valor = self.get(chave)
+        if encontrado:
+            return valor
+        if self.coalescer is None:
+            return self._calcular_e_guardar(chave, calcular)
+        return self.coalescer.executar(chave, lambda: self._calcular_e_guardar(chave, calcular),
+                                       consultar=lambda: self.espiar(chave))
+
+    def _calcular_e_guardar(self, chave, calcular):
+        valor = calcular()
+        self.set(chave, valor)
+        return valor
+
+    # Monta a chave a partir do nome e das partes (None desativa o cache)
+    @staticmethod
+    def chave(nome, *partes):
+        if any(parte is None for parte in partes):
+            return None
+        texto = repr((nome,) + partes)
+        return hashlib.sha1(texto.encode('utf-8')).hexdigest()
+
+    # Decorador que guarda o resultado da função pela chave de seus argumentos.
+    # Visões de dados entram pela chave do estado de filtros que as gerou.
+    def memoize(self, nome):
+        def decorador(funcao):
+            @functools.wraps(funcao)
+            def wrapper(*args, **kwargs):
+                partes = [_parte_chave(arg) for arg in args]
+                partes += [f'{k}={_parte_chave(v)}' if _parte_chave(v) is not None else None
+                           for k, v in sorted(kwargs.items())]
+                chave = self.chave(nome, *partes)
+                if chave is None:
+                    return funcao(*args, **kwargs)
+                return self.get_or_compute(chave, lambda: funcao(*args, **kwargs))
+            return wrapper
+        return decorador
+
+    def clear(self):
+        with self._lock:
+            self._itens.clear()
+            self._bytes = 0
+
+    # Contadores para dimensionar o cache
+    def stats(self):
+        with self._lock:
+            consultas = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'backend_hits': self.backend_hits,
+                'hit_ratio': round(self.hits / consultas, 4) if consultas else 0.0,
+                'itens': len(self._itens),
+                'bytes': self._bytes,
+                'max_itens': self.max_itens,
+                'max_bytes': self.max_bytes,
+                'backend': self.backend.diretorio if self.backend is not None else None,
+                'coalescencia': self.coalescer.stats() if self.coalescer is not None else None,
+            }
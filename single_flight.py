@@ -0,0 +1,143 @@
+# Coalescência de cálculos idênticos simultâneos ("single-flight"): quando
+# várias requisições pedem a mesma chave ao mesmo tempo (por exemplo, todos
+# abrindo o dashboard sem filtros no início de uma apresentação), só a primeira
+# calcula; as demais esperam por ela e recebem o mesmo resultado (ou a mesma
+# exceção).
+#
+# Dentro de um worker, a espera é por threads (workers gthread do gunicorn).
+# Entre workers, opcionalmente, por uma trava de arquivo (fcntl.flock) por
+# chave no diretório do cache compartilhado: quem obtém a trava consulta o
+# cache de novo antes de calcular, então os outros workers encontram lá o
+# resultado de quem calculou primeiro. A espera pela trava tem limite
+# (`espera_maxima`); passado o limite, o worker calcula por conta própria.
+import contextlib
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+# Cálculo em andamento de uma chave
+class _Voo:
+    def __init__(self):
+        self.evento = threading.Event()
+        self.valor = None
+        self.erro = None
+
+
+class SingleFlight:
+    def __init__(self, diretorio=None, espera_maxima=30.0):
+        self.diretorio = diretorio if fcntl is not None else None
+        self.espera_maxima = espera_maxima
+        self._voos = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self.lideres = 0
+        self.coalescidas = 0
+        self.esperas_processos = 0
+        self.esperas_esgotadas = 0
+        if self.diretorio:
+            os.makedirs(self.diretorio, exist_ok=True)
+
+    # Executa `calcular()` uma única vez por chave entre as chamadas
+    # simultâneas. `consultar()` -> (encontrado, valor) é chamado depois de
+    # obter a trava entre processos, para aproveitar o resultado de outro worker.
+    def executar(self, chave, calcular, consultar=None):
+        self._no_processo_atual()
+        with self._lock:
+            voo = self._voos.get(chave)
+            lider = voo is None
+            if lider:
+                voo = self._voos[chave] = _Voo()
+                self.lideres += 1
+            else:
+                self.coalescidas += 1
+
+        if not lider:
+            voo.evento.wait()
+            if voo.erro is not None:
+                raise voo.erro
+            return voo.valor
+
+        try:
+            with self._trava_processos(chave) as esperou:
+                encontrado, valor = consultar() if esperou and consultar is not None else (False, None)
+                voo.valor = valor if encontrado else calcular()
+            return voo.valor
+        except BaseException as erro:
+            voo.erro = erro
+            raise
+        finally:
+            with self._lock:
+                del self._voos[chave]
+            voo.evento.set()
+
+    # Depois de um fork (tarefas em segundo plano, pools de processos), os
+    # cálculos em andamento herdados pertencem a threads que não existem no
+    # processo filho: recomeçar sem eles
+    def _no_processo_atual(self):
+        if self._pid != os.getpid():
+            self._lock = threading.Lock()
+            self._voos = {}
+            self._pid = os.getpid()
+
+    # Trava exclusiva da chave entre processos; devolve se foi preciso esperar
+    # por outro processo (só então vale consultar o cache de novo)
+    @contextlib.contextmanager
+    def _trava_processos(self, chave):
+        if not self.diretorio:
+            yield False
+            return
+        caminho = os.path.join(self.diretorio, f'{chave}.lock')
+        limite = time.monotonic() + self.espera_maxima
+        esperou = False
+        while True:
+            descritor = os.open(caminho, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(descritor, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(descritor)
+                if not esperou:
+                    esperou = True
+                    with self._lock:
+                        self.esperas_processos += 1
+                if time.monotonic() > limite:
+                    with self._lock:
+                        self.esperas_esgotadas += 1
+                    yield False
+                    return
+                time.sleep(0.01)
+                continue
+            # O arquivo pode ter sido removido por quem liberou a trava entre o
+            # open e o flock: nesse caso a trava obtida não vale, tentar de novo
+            try:
+                valido = os.fstat(descritor).st_ino == os.stat(caminho).st_ino
+            except FileNotFoundError:
+                valido = False
+            if valido:
+                break
+            os.close(descritor)
+
+        try:
+            yield esperou
+        finally:
+            try:
+                os.remove(caminho)
+            except OSError:
+                pass
+            os.close(descritor)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'em_andamento': len(self._voos),
+                'lideres': self.lideres,
+                'coalescidas': self.coalescidas,
+                'esperas_processos': self.esperas_processos,
+                'esperas_esgotadas': self.esperas_esgotadas,
+                'entre_processos': self.diretorio,
+            }
@@ -0,0 +1,179 @@
+# Snapshot binário da pesquisa: a matriz de códigos e as colunas numéricas em
+# arquivos .npy (mapeáveis em memória) e as categorias em meta.json.
+# O snapshot é identificado pelo hash do CSV e reaproveitado enquanto o CSV
+# não mudar; um índice pequeno (tamanho + mtime -> hash) evita reler o CSV
+# a cada inicialização.
+#
+# O snapshot é gravado direto a partir do CSV lido em blocos (csv_ingest.py),
+# sem montar o DataFrame inteiro; com `colunas`, só essas colunas (e o peso)
+# entram no snapshot, e a seleção faz parte da identificação do snapshot.
+#
+# Uso para gerar o snapshot antes de subir os workers (com as colunas de
+# grupos_colunas.json, como o app; --todas-colunas mantém todas):
+#     python snapshot.py dados_sergipe.csv
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+
+import numpy as np
+
+from csv_ingest import colunas_dos_grupos, gravar_csv_em_blocos
+from survey_store import SurveyStore
+
+VERSAO_FORMATO = 1
+
+
+# Função para calcular o hash sha256 de um arquivo em blocos
+def hash_arquivo(caminho, tamanho_bloco=1024 * 1024):
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(tamanho_bloco), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+# Função para gravar JSON de forma atômica (seguro com vários workers)
+def _gravar_json(caminho, conteudo):
+    fd, temporario = tempfile.mkstemp(dir=os.path.dirname(caminho), suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(conteudo, f, ensure_ascii=False)
+    os.chmod(temporario, 0o644)
+    os.replace(temporario, caminho)
+
+
+def _ler_json(caminho):
+    try:
+        with open(caminho, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+# Função para gravar o armazenamento em um diretório de snapshot
+def salvar_snapshot(store, diretorio, origem=None):
+    os.makedirs(diretorio, exist_ok=True)
+    np.save(os.path.join(diretorio, 'matriz.npy'), np.ascontiguousarray(store.matriz))
+    numericas = sorted(store.numericas)
+    for i, coluna in enumerate(numericas):
+        np.save(os.path.join(diretorio, f'numerica_{i}.npy'), store.numericas[coluna])
+    _gravar_json(os.path.join(diretorio, 'meta.json'), {
+        'versao_formato': VERSAO_FORMATO,
+        'versao': store.versao,
+        'colunas': store.colunas,
+        'categorias': store.categorias,
+        'numericas': numericas,
+        'origem': origem,
+    })
+
+
+# Função para gravar o snapshot lendo o CSV em blocos (memória limitada ao bloco)
+def salvar_snapshot_csv(caminho_csv, diretorio, versao, colunas=None, linhas_por_bloco=100_000):
+    os.makedirs(diretorio, exist_ok=True)
+    resultado = gravar_csv_em_blocos(caminho_csv, diretorio, colunas=colunas, linhas_por_bloco=linhas_por_bloco)
+    _gravar_json(os.path.join(diretorio, 'meta.json'), {
+        'versao_formato': VERSAO_FORMATO,
+        'versao': versao,
+        'colunas': resultado['colunas'],
+        'categorias': resultado['categorias'],
+        'numericas': resultado['numericas'],
+        'origem': os.path.basename(caminho_csv),
+    })
+
+
+# Função para identificar uma seleção de colunas no nome do snapshot
+def _sufixo_colunas(colunas):
+    if colunas is None:
+        return ''
+    texto = json.dumps(sorted(set(colunas)), ensure_ascii=False)
+    return '-' + hashlib.sha1(texto.encode('utf-8')).hexdigest()[:8]
+
+
+# Função para carregar um snapshot; com mmap=True os arrays ficam mapeados
+# em memória (somente leitura) em vez de copiados para o processo
+def carregar_snapshot(diretorio, mmap=False):
+    meta = _ler_json(os.path.join(diretorio, 'meta.json'))
+    if meta is None or meta.get('versao_formato') != VERSAO_FORMATO:
+        return None
+    modo = 'r' if mmap else None
+    try:
+        matriz = np.load(os.path.join(diretorio, 'matriz.npy'), mmap_mode=modo)
+        numericas = {
+            coluna: np.load(os.path.join(diretorio, f'numerica_{i}.npy'), mmap_mode=modo)
+            for i, coluna in enumerate(meta['numericas'])
+        }
+    except (OSError, ValueError):
+        # Snapshot incompleto ou removido por outro worker
+        return None
+    return SurveyStore(meta['colunas'], meta['categorias'], matriz, numericas, versao=meta['versao'])
+
+
+# Função para remover snapshots antigos do mesmo CSV e da mesma seleção de
+# colunas (`{nome}-<hash de 16>{sufixo}`); os de outras seleções e os de CSVs
+# com nome parecido (onda e onda-2) ficam
+def _remover_antigos(raiz, nome, sufixo, atual):
+    padrao = re.compile(rf'{re.escape(nome)}-[0-9a-f]{{16}}{re.escape(sufixo)}')
+    for entrada in os.scandir(raiz):
+        if entrada.is_dir() and padrao.fullmatch(entrada.name) and entrada.name != atual:
+            shutil.rmtree(entrada.path, ignore_errors=True)
+
+
+# Função para construir (se necessário) e carregar o snapshot de um CSV.
+# O snapshot é refeito automaticamente quando o conteúdo do CSV muda.
+# `construir(caminho_csv)` -> SurveyStore substitui a leitura em blocos.
+def carregar_dados(caminho_csv, raiz=None, mmap=False, construir=None, colunas=None):
+    raiz = raiz or os.path.join(os.path.dirname(os.path.abspath(caminho_csv)), '.snapshot')
+    os.makedirs(raiz, exist_ok=True)
+    nome = os.path.splitext(os.path.basename(caminho_csv))[0]
+    sufixo = _sufixo_colunas(colunas)
+    caminho_indice = os.path.join(raiz, f'{nome}{sufixo}.json')
+
+    info = os.stat(caminho_csv)
+    indice = _ler_json(caminho_indice) or {}
+    if indice.get('tamanho') == info.st_size and indice.get('mtime') == info.st_mtime:
+        store = carregar_snapshot(os.path.join(raiz, indice.get('diretorio', '')), mmap=mmap)
+        if store is not None:
+            return store
+
+    # CSV novo ou alterado (ou só com mtime diferente): identificar pelo conteúdo
+    sha = hash_arquivo(caminho_csv)
+    diretorio = f'{nome}-{sha[:16]}{sufixo}'
+    caminho = os.path.join(raiz, diretorio)
+    store = carregar_snapshot(caminho, mmap=mmap)
+    if store is None:
+        temporario = tempfile.mkdtemp(dir=raiz, prefix=f'.{diretorio}-')
+        os.chmod(temporario, 0o755)
+        if construir is None:
+            salvar_snapshot_csv(caminho_csv, temporario, versao=sha[:16], colunas=colunas)
+        else:
+            salvar_snapshot(construir(caminho_csv), temporario, origem=os.path.basename(caminho_csv))
+        try:
+            os.rename(temporario, caminho)
+        except OSError:
+            # Outro worker terminou antes; usar o snapshot dele
+            shutil.rmtree(temporario, ignore_errors=True)
+        _remover_antigos(raiz, nome, sufixo, diretorio)
+        store = carregar_snapshot(caminho, mmap=mmap)
+
+    _gravar_json(caminho_indice, {
+        'tamanho': info.st_size,
+        'mtime': info.st_mtime,
+        'sha256': sha,
+        'diretorio': diretorio,
+    })
+    return store
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('csv', nargs='*', default=['dados_sergipe.csv'])
+    parser.add_argument('--todas-colunas', action='store_true')
+    args = parser.parse_args()
+    colunas = None if args.todas_colunas else colunas_dos_grupos()
+    for caminho_csv in args.csv:
+        store = carregar_dados(caminho_csv, colunas=colunas)
+        print(f'{caminho_csv}: {store.n_linhas} linhas, {len(store.colunas)} colunas, '
+              f'{store.nbytes() / 1024:.1f} KiB (versão {store.versao})')
@@ -0,0 +1,108 @@
+# Inicialização do app: perfil do tempo de cada etapa e artefato do layout.
+#
+# O perfil mede cada etapa da importação do app.py (importações, layout,
+# dados, índice de filtros e cubo, geometrias, callbacks) e, no modo de
+# início rápido, o carregamento tardio dos dados no primeiro uso. Fica
+# exposto em /cache-stats e, com DASHBOARD_PERFIL_INICIO=1, é impresso como
+# uma linha JSON no fim da inicialização. Para o tempo de cada módulo
+# importado, use `python -X importtime -c "import app"`.
+#
+# O artefato do layout guarda o que o layout precisa dos dados (opções dos
+# filtros, colunas presentes e versão dos dados) e a estrutura pronta de
+# cada aba, já serializada como o Dash a envia, em um JSON junto dos
+# snapshots. Ele é identificado pelo CSV (tamanho + mtime), pela seleção de
+# colunas, pelos arquivos do código que montam o layout e pela configuração
+# que muda as abas: com ele, o layout e as abas saem sem carregar os dados.
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+VERSAO_FORMATO_LAYOUT = 2
+
+
+class StartupProfile:
+    def __init__(self, imprimir=False):
+        self.inicio = time.perf_counter()
+        self._ultima = self.inicio
+        self.etapas = {}
+        self.total = None
+        self.imprimir = imprimir
+
+    @classmethod
+    def from_env(cls):
+        return cls(imprimir=os.environ.get('DASHBOARD_PERFIL_INICIO') == '1')
+
+    # Fecha a etapa `nome`: o tempo desde a marca anterior
+    def marcar(self, nome):
+        agora = time.perf_counter()
+        self.registrar(nome, agora - self._ultima)
+        self._ultima = agora
+
+    # Soma a duração de uma etapa
+    def registrar(self, nome, segundos):
+        self.etapas[nome] = self.etapas.get(nome, 0.0) + segundos
+
+    # Sequência de etapas fora da inicialização (carregamento tardio): devolve
+    # um `marcar(nome)` que mede desde agora, com `prefixo` no nome das etapas
+    def cronometro(self, prefixo=''):
+        ultima = [time.perf_counter()]
+
+        def marcar(nome):
+            agora = time.perf_counter()
+            self.registrar(prefixo + nome, agora - ultima[0])
+            ultima[0] = agora
+        return marcar
+
+    # Fim da inicialização: imprime o perfil (se ativo)
+    def concluir(self):
+        self.total = time.perf_counter() - self.inicio
+        if self.imprimir:
+            print(json.dumps(dict(self.stats(), pid=os.getpid()), ensure_ascii=False), flush=True)
+
+    def stats(self):
+        return {
+            'total_ms': round(self.total * 1000, 1) if self.total is not None else None,
+            'etapas_ms': {nome: round(segundos * 1000, 1) for nome, segundos in self.etapas.items()},
+        }
+
+
+# Função para obter o caminho do artefato do layout de um CSV, ou None sem
+# diretório (snapshots desativados). `arquivos`: código e configuração que
+# montam o layout (entram pelo tamanho + mtime); `configuracao`: valores do
+# ambiente que mudam as abas
+def caminho_artefato_layout(diretorio, caminho_csv, colunas, dimensoes, arquivos=(), configuracao=None):
+    if not diretorio:
+        return None
+    assinaturas = []
+    for caminho in [caminho_csv] + list(arquivos):
+        info = os.stat(caminho)
+        assinaturas.append([os.path.abspath(caminho), info.st_size, info.st_mtime])
+    texto = json.dumps([VERSAO_FORMATO_LAYOUT, assinaturas, sorted(colunas) if colunas is not None else None,
+                        list(dimensoes), configuracao], ensure_ascii=False)
+    chave = hashlib.sha1(texto.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(diretorio, f'layout-{chave}.json')
+
+
+# Função para ler o artefato do layout (None se ausente ou ilegível)
+def ler_artefato_layout(caminho):
+    if caminho is None:
+        return None
+    try:
+        with open(caminho, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+# Função para gravar o artefato do layout (gravação atômica: arquivo temporário + rename)
+def gravar_artefato_layout(caminho, conteudo):
+    if caminho is None:
+        return
+    diretorio = os.path.dirname(caminho)
+    os.makedirs(diretorio, exist_ok=True)
+    descritor, temporario = tempfile.mkstemp(dir=diretorio, prefix='.layout-', suffix='.json')
+    with os.fdopen(descritor, 'w', encoding='utf-8') as f:
+        json.dump(conteudo, f, ensure_ascii=False)
+    os.replace(temporario, caminho)
@@ -0,0 +1,169 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+# Códigos reservados para respostas que não entram nas agregações
+SEM_RESPOSTA = -1      # NaN ou célula em branco
+NAO_SE_APLICA = -2     # '.' (pergunta não aplicável ao respondente)
+
+# Colunas mantidas como float64 em vez de codificadas
+COLUNAS_PESO = ['peso']
+
+
+# Função para ler o CSV da pesquisa (utf-8, com latin1 como alternativa)
+def ler_csv(caminho):
+    try:
+        return pd.read_csv(caminho, delimiter=';', encoding='utf-8')
+    except Exception as e:
+        print(f"Erro ao carregar o CSV: {e}")
+        # Se falhar, tente outra codificação
+        return pd.read_csv(caminho, delimiter=';', encoding='latin1')
+
+
+# Função para escolher o menor tipo inteiro capaz de guardar os códigos
+def tipo_codigo(max_categorias):
+    for tipo in (np.int8, np.int16, np.int32):
+        if max_categorias <= np.iinfo(tipo).max:
+            return tipo
+    raise ValueError(f'Coluna com categorias demais para codificar: {max_categorias}')
+
+
+# Função para codificar uma coluna em (códigos, categorias ordenadas)
+def codificar_coluna(serie):
+    texto = serie.astype(str).str.strip()
+    ponto = serie.notna() & (texto == '.')
+    vazio = serie.isna() | (serie.notna() & (texto == ''))
+    validos = ~(ponto | vazio)
+
+    codigos = np.full(len(serie), SEM_RESPOSTA, dtype=np.int64)
+    codigos[ponto.to_numpy()] = NAO_SE_APLICA
+    # sort=True mantém a mesma ordem de categorias que o groupby do pandas
+    codigos_validos, categorias = pd.factorize(serie[validos], sort=True)
+    codigos[validos.to_numpy()] = codigos_validos
+    return codigos, categorias.tolist()
+
+
+# Armazenamento colunar da pesquisa: uma matriz de códigos inteiros pequenos
+# (uma linha por pergunta) com o dicionário de categorias de cada coluna,
+# e os pesos amostrais em float64
+class SurveyStore:
+    # Sem marginais pré-calculadas nem somas reaproveitáveis (ver SurveyView)
+    marginais = None
+    delta = None
+    somas_calculadas = None
+
+    def __init__(self, colunas, categorias, matriz, numericas, versao=None):
+        self.colunas = list(colunas)
+        self.posicao = {coluna: i for i, coluna in enumerate(self.colunas)}
+        self.categorias = [list(cats) for cats in categorias]
+        self.matriz = matriz
+        self.numericas = dict(numericas)
+        self.n_linhas = matriz.shape[1]
+        self._indice_categorias = [
+            {valor: codigo for codigo, valor in enumerate(cats)} for cats in self.categorias
+        ]
+        # Identifica o conteúdo dos dados (entra nas chaves de cache)
+        self.versao = versao or self._calcular_versao()
+
+    def _calcular_versao(self):
+        h = hashlib.sha1()
+        h.update(repr((self.colunas, self.categorias)).encode('utf-8'))
+        h.update(np.ascontiguousarray(self.matriz).tobytes())
+        for coluna in sorted(self.numericas):
+            h.update(coluna.encode('utf-8'))
+            h.update(np.ascontiguousarray(self.numericas[coluna]).tobytes())
+        return h.hexdigest()[:16]
+
+    @classmethod
+    def from_dataframe(cls, df, colunas_peso=COLUNAS_PESO, versao=None):
+        # Descartar as colunas vazias geradas por ';' sobrando no fim das linhas
+        vazias = [c for c in df.columns if str(c).startswith('Unnamed:') and df[c].isna().all()]
+        df = df.drop(columns=vazias)
+        colunas = [c for c in df.columns if c not in colunas_peso]
+        codificadas = [codificar_coluna(df[coluna]) for coluna in colunas]
+        categorias = [cats for _, cats in codificadas]
+
+        tipo = tipo_codigo(max([len(cats) for cats in categorias], default=0))
+        matriz = np.empty((len(colunas), len(df)), dtype=tipo)
+        for i, (codigos, _) in enumerate(codificadas):
+            matriz[i] = codigos
+
+        numericas = {
+            coluna: pd.to_numeric(df[coluna], errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+            for coluna in colunas_peso if coluna in df.columns
+        }
+        return cls(colunas, categorias, matriz, numericas, versao=versao)
+
+    # Nomes de todas as colunas disponíveis (compatível com `in df.columns`)
+    @property
+    def columns(self):
+        return self.colunas + list(self.numericas)
+
+    def __len__(self):
+        return self.n_linhas
+
+    def codigos(self, coluna):
+        return self.matriz[self.posicao[coluna]]
+
+    def categorias_de(self, coluna):
+        return self.categorias[self.posicao[coluna]]
+
+    # Converte valores de resposta em códigos (valores desconhecidos são ignorados)
+    def codificar(self, coluna, valores):
+        indice = self._indice_categorias[self.posicao[coluna]]
+        return np.array([indice[v] for v in valores if v in indice], dtype=np.int64)
+
+    def pesos(self, weight_col='peso'):
+        return self.numericas.get(weight_col)
+
+    def view(self, linhas=None, chave=None, marginais=None, delta=None):
+        return SurveyView(self, linhas, chave, marginais, delta)
+
+    # Memória ocupada pelos arrays (códigos + colunas numéricas)
+    def nbytes(self):
+        return self.matriz.nbytes + sum(arr.nbytes for arr in self.numericas.values())
+
+
+# Subconjunto de linhas do armazenamento, sem cópia das colunas.
+# `chave` identifica o estado de filtros que gerou a visão (None se não houver)
+# e `marginais`, quando o estado está no cubo de marginais, dá as somas de peso
+# por categoria sem percorrer as linhas (ver marginal_cube.py).
+# `delta` liga a visão a uma visão anterior com quase as mesmas linhas, cujas
+# somas são atualizadas só com as linhas diferentes; as somas calculadas
+# sobre a visão ficam em `somas_calculadas` para as visões seguintes.
+class SurveyView:
+    def __init__(self, store, linhas=None, chave=None, marginais=None, delta=None):
+        self.store = store
+        self.linhas = linhas
+        self.chave = chave
+        self.marginais = marginais
+        self.delta = delta
+        self.somas_calculadas = {}
+
+    @property
+    def columns(self):
+        return self.store.columns
+
+    def __len__(self):
+        return self.store.n_linhas if self.linhas is None else len(self.linhas)
+
+    def codigos(self, coluna):
+        codigos = self.store.codigos(coluna)
+        return codigos if self.linhas is None else codigos[self.linhas]
+
+    def categorias_de(self, coluna):
+        return self.store.categorias_de(coluna)
+
+    def pesos(self, weight_col='peso'):
+        pesos = self.store.pesos(weight_col)
+        if pesos is None or self.linhas is None:
+            return pesos
+        return pesos[self.linhas]
+
+    # Restringe a visão às linhas onde a máscara (relativa à visão) é verdadeira
+    def subconjunto(self, mascara):
+        linhas = np.flatnonzero(mascara)
+        if self.linhas is not None:
+            linhas = self.linhas[linhas]
+        return SurveyView(self.store, linhas)
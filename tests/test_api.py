@@ -0,0 +1,81 @@
+import json
+
+import flask
+import pandas as pd
+import pytest
+
+from api import criar_api
+
+
+def percentual(df, coluna):
+    return pd.DataFrame({'percentual': [100.0], 'erro_padrao': [0.0], 'ic_inferior': [100.0],
+                         'ic_superior': [100.0], 'n_efetivo': [float(len(df))]}, index=['A'])
+
+
+@pytest.fixture
+def cliente():
+    visoes = []
+
+    def visao(filtros, onda):
+        visoes.append(filtros)
+        return pd.DataFrame({'região': ['A', 'A'], 'sexo': ['F', 'M']})
+
+    app = flask.Flask(__name__)
+    app.register_blueprint(criar_api(
+        visao=visao,
+        dimensoes={'região': {}, 'sexo': {}},
+        assinatura=lambda onda: 'v1',
+        ondas=lambda: ['atual'],
+        onda_padrao='atual',
+        percentual=percentual,
+        crosstab=None,
+        crosstab_erros=None,
+    ))
+    cliente = app.test_client()
+    cliente.visoes = visoes
+    return cliente
+
+
+def test_filtros_validos(cliente):
+    resposta = cliente.get('/api/freq', query_string={'col': 'sexo', 'filters': json.dumps({'região': ['A']})})
+
+    assert resposta.status_code == 200
+    assert cliente.visoes == [{'região': ['A']}]
+
+
+@pytest.mark.parametrize('filtros', [
+    {'cidade': ['Aracaju']},             # dimensão desconhecida
+    {'região': ['A', 1]},                # valores de tipos misturados
+    {'região': [None]},
+    {'região': 'A'},                     # valor fora de uma lista
+    ['região'],                          # filters fora de um objeto
+])
+def test_filtros_invalidos_respondem_400(cliente, filtros):
+    resposta = cliente.get('/api/freq', query_string={'col': 'sexo', 'filters': json.dumps(filtros)})
+
+    assert resposta.status_code == 400
+    assert 'erro' in resposta.get_json()
+    assert cliente.visoes == []
+
+
+def test_batch_com_dimensao_desconhecida_responde_400(cliente):
+    resposta = cliente.post('/api/batch', json={'filters': {'cidade': ['Aracaju']}, 'freq': ['sexo']})
+
+    assert resposta.status_code == 400
+    assert cliente.visoes == []
+
+
+@pytest.mark.parametrize('pedido', [
+    {'freq': 'sexo'},                            # texto em vez de lista
+    {'freq': ['sexo', 1]},
+    {'crosstab': 'região'},
+    {'crosstab': [['região', 'sexo'], 5]},       # item que não é lista
+    {'crosstab': [['região']]},                  # par incompleto
+    {'crosstab': [['região', ['sexo']]]},
+])
+def test_batch_com_corpo_malformado_responde_400(cliente, pedido):
+    resposta = cliente.post('/api/batch', json=pedido)
+
+    assert resposta.status_code == 400
+    assert 'erro' in resposta.get_json()
+    assert cliente.visoes == []
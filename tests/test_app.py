@@ -0,0 +1,54 @@
+import importlib
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from survey_store import SurveyStore
+
+
+@pytest.fixture(scope='module')
+def app():
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv('DASHBOARD_SNAPSHOT', '0')
+        monkeypatch.setenv('DASHBOARD_SEGUNDO_PLANO', '0')
+        return importlib.import_module('app')
+
+
+def test_percentual_sem_peso_ignora_nao_se_aplica(app):
+    respostas = pd.Series(['B', '.', 'A', 'B', None, 'A', 'C', '.', '.', 'B'])
+    store = SurveyStore.from_dataframe(pd.DataFrame({'q': respostas}))
+
+    percentual = app.weighted_percentage(store.view(), 'q')
+
+    # Como o ramo ponderado: o '.' fica fora da base, maiores primeiro
+    esperado = (respostas[respostas != '.'].value_counts(normalize=True) * 100).round(2)
+    assert percentual.index.tolist() == ['B', 'A', 'C']
+    pd.testing.assert_series_equal(percentual, esperado, check_names=False)
+
+
+# Crosstab ponderado como era calculado antes da vetorização: uma máscara por par de categorias
+def crosstab_por_pares(df, index, columns):
+    validos = df[df[index].notna() & (df[index] != '.') & df[columns].notna() & (df[columns] != '.')]
+    linhas = [{'index': i, 'column': c,
+               'weight': validos.loc[(validos[index] == i) & (validos[columns] == c), 'peso'].sum()}
+              for i in validos[index].unique() for c in validos[columns].unique()]
+    pivot = pd.DataFrame(linhas).pivot(index='index', columns='column', values='weight')
+    totais = pivot.sum(axis=1)
+    return (pivot.div(totais.where(totais > 0), axis=0) * 100).round(2)
+
+
+def test_crosstab_vetorizado_igual_ao_por_pares(app):
+    rng = np.random.default_rng(4)
+    n = 500
+    dados = pd.DataFrame({
+        'região': rng.choice(['Agreste', 'Leste', 'Sertão', None], n),
+        'voto': rng.choice(['A', 'B', 'C', '.'], n),
+        'peso': rng.gamma(2.0, 0.5, n),
+    })
+    dados.loc[dados['região'] == 'Sertão', 'peso'] = 0.0   # linha de soma zero vira NaN
+
+    tabela = app.weighted_crosstab(SurveyStore.from_dataframe(dados).view(), 'região', 'voto')
+
+    pd.testing.assert_frame_equal(tabela.sort_index().sort_index(axis=1),
+                                  crosstab_por_pares(dados, 'região', 'voto'))
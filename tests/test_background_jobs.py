@@ -0,0 +1,35 @@
+import importlib
+import sys
+
+import pytest
+
+import background_jobs
+
+pytest.importorskip('diskcache')
+
+
+def test_resultado_no_disco_nao_abre_processo(tmp_path):
+    tarefas = background_jobs.BackgroundJobs(str(tmp_path), cache_by=[lambda: 'v1'])
+    tarefas.handle.set('chave', 'resultado')
+
+    job = tarefas.call_job_fn('chave', None, (), {})
+
+    assert job == background_jobs.SEM_PROCESSO
+    assert job  # o navegador só guarda e reenvia ids verdadeiros
+    assert not tarefas.job_running(job)
+    assert not tarefas.terminate_unhealthy_job(job)
+    tarefas.terminate_job(job)
+    assert tarefas.get_result('chave', job) == 'resultado'
+    assert tarefas.stats()['reaproveitadas'] == 1
+
+
+@pytest.mark.parametrize('dependencia', ['diskcache', 'multiprocess', 'psutil'])
+def test_sem_dependencia_desativa_segundo_plano(monkeypatch, dependencia):
+    monkeypatch.delenv('DASHBOARD_SEGUNDO_PLANO', raising=False)
+    monkeypatch.setitem(sys.modules, dependencia, None)
+    try:
+        modulo = importlib.reload(background_jobs)
+        assert modulo.BackgroundJobs.from_env() is None
+    finally:
+        monkeypatch.undo()
+        importlib.reload(background_jobs)
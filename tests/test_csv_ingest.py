@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from snapshot import carregar_snapshot, salvar_snapshot_csv
+from survey_store import SurveyStore, ler_csv
+
+# Categorias que só aparecem em blocos posteriores, números, '.', vazios,
+# espaços, peso inválido e o ';' sobrando no fim das linhas
+CSV = (
+    "região;idade;voto;nota;peso;\n"
+    "Leste;25;Sim;.;1,5;\n"
+    "Sertão;3;Não;10;2;\n"
+    "Agreste;;Sim; ;x;\n"
+    "Leste;100; Talvez ;2;0.5;\n"
+    "São Cristóvão;7;.;10;1;\n"
+    "Agreste;25;Não;;3;\n"
+    "Leste;3;Sim;2;1;\n"
+)
+
+
+@pytest.mark.parametrize('colunas', [None, ['voto', 'idade']])
+def test_leitura_em_blocos_igual_a_from_dataframe(tmp_path, colunas):
+    caminho = tmp_path / 'dados.csv'
+    caminho.write_text(CSV, encoding='utf-8')
+
+    salvar_snapshot_csv(str(caminho), str(tmp_path / 'snapshot'), 'v1', colunas=colunas, linhas_por_bloco=2)
+    em_blocos = carregar_snapshot(str(tmp_path / 'snapshot'))
+
+    df = ler_csv(str(caminho))
+    if colunas is not None:
+        df = df[[c for c in df.columns if c in colunas or c == 'peso']]
+    esperado = SurveyStore.from_dataframe(df)
+    assert em_blocos.colunas == esperado.colunas
+    assert em_blocos.categorias == esperado.categorias
+    np.testing.assert_array_equal(em_blocos.matriz, esperado.matriz)
+    assert em_blocos.numericas.keys() == esperado.numericas.keys()
+    for coluna in esperado.numericas:
+        np.testing.assert_array_equal(em_blocos.numericas[coluna], esperado.numericas[coluna])
@@ -0,0 +1,31 @@
+import pytest
+
+from figure_executor import FigureExecutor
+
+
+def dobro(x):
+    return 2 * x
+
+
+def falha(x):
+    raise TypeError('erro da função')
+
+
+@pytest.fixture
+def executor():
+    executor = FigureExecutor('process', 2)
+    yield executor
+    executor.encerrar()
+
+
+def test_erro_da_funcao_e_propagado(executor):
+    with pytest.raises(TypeError, match='erro da função'):
+        executor.mapear(falha, [1, 2])
+
+    assert executor.modo == 'process'
+
+
+def test_lote_nao_serializavel_roda_em_serie(executor):
+    assert executor.mapear(lambda x: x + 1, [1, 2]) == [2, 3]
+    assert executor.mapear(dobro, [1, 2, 3]) == [2, 4, 6]
+    assert executor.modo == 'process'
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+
+import frequencies
+from filter_index import FilterIndex
+from frequencies import _somar_linhas, somar_colunas
+from survey_store import SurveyStore
+
+
+# Pesquisa sintética: três regiões, sexo com 'F' em 3/4 das linhas
+def criar_store(n=2000):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        'região': rng.choice(['A', 'B', 'C'], n),
+        'sexo': np.where(rng.random(n) < 0.75, 'F', 'M'),
+        'religião': rng.choice(['x', 'y', 'z', None], n),
+        'peso': rng.uniform(0.5, 2.0, n),
+    })
+    return SurveyStore.from_dataframe(df)
+
+
+def test_refinar_estado_do_cubo_usa_delta():
+    store = criar_store()
+    indice = FilterIndex(store, ['região', 'sexo'], colunas_cubo=['religião'])
+
+    base = indice.filtrar({'região': ['A'], 'sexo': []})
+    assert base.marginais is not None
+    refinado = indice.filtrar({'região': ['A'], 'sexo': ['F']})
+
+    assert refinado.marginais is None
+    assert indice.deltas == 1
+    assert refinado.delta.marginais_base is not None
+    assert len(refinado.delta.removidas) + len(refinado.delta.adicionadas) < len(refinado)
+
+    colunas, deslocamentos, somas, contagens, quadrados = somar_colunas(refinado, ['religião'])
+    esperado = _somar_linhas(store, [store.posicao['religião']], deslocamentos, refinado.linhas, 'peso')
+    np.testing.assert_allclose(somas, esperado[0])
+    np.testing.assert_array_equal(contagens, esperado[1])
+    np.testing.assert_allclose(quadrados, esperado[2])
+
+
+def test_delta_mais_caro_que_soma_nova_e_recusado():
+    store = criar_store()
+    indice = FilterIndex(store, ['região', 'sexo'], colunas_cubo=['religião'])
+
+    indice.filtrar({'região': ['A'], 'sexo': []})
+    # Saem 3/4 das linhas da base: somar a seleção nova é mais barato
+    refinado = indice.filtrar({'região': ['A'], 'sexo': ['M']})
+
+    assert refinado.delta is None
+    assert indice.deltas == 0
+
+
+def test_visao_sem_filtro_guarda_a_passada_da_aba(monkeypatch):
+    store = criar_store()
+    indice = FilterIndex(store, ['região', 'sexo'])
+    passadas = []
+    somar_linhas = frequencies._somar_linhas
+    monkeypatch.setattr(frequencies, '_somar_linhas', lambda *args: passadas.append(args) or somar_linhas(*args))
+
+    # Cada card filtra de novo e soma as colunas da aba; só o primeiro percorre as linhas
+    for coluna in ['religião', 'sexo', 'região']:
+        view = indice.filtrar({'região': [], 'sexo': []})
+        frequencies.somar_colunas(view, ['religião', 'sexo', 'região'])
+        frequencies.somar_colunas(view, [coluna])
+
+    assert len(passadas) == 1
+
+
+def test_estado_sem_filtro_somado_serve_de_base_sem_cubo():
+    store = criar_store()
+    indice = FilterIndex(store, ['região', 'sexo'])
+    somar_colunas(indice.filtrar({}), ['religião'])
+
+    refinado = indice.filtrar({'sexo': ['F']})
+
+    assert indice.deltas == 1
+    colunas, deslocamentos, somas, contagens, quadrados = somar_colunas(refinado, ['religião'])
+    esperado = _somar_linhas(store, [store.posicao['religião']], deslocamentos, refinado.linhas, 'peso')
+    np.testing.assert_allclose(somas, esperado[0])
+    np.testing.assert_array_equal(contagens, esperado[1])
@@ -0,0 +1,33 @@
+import math
+
+import pandas as pd
+import pytest
+
+from frequencies import Z_95, erro_padrao_percentual, weighted_frequencies, weighted_shares_erros
+from survey_store import SurveyStore
+
+
+def test_erro_padrao_sem_pesos_e_binomial():
+    # w = 1: p(1 - p) / n, com p = 2/4 e n = 4
+    assert erro_padrao_percentual(2.0, 2.0, 4.0, 4.0) == pytest.approx(25.0)
+
+
+def test_weighted_shares_erros_igual_ao_calculo_a_mao():
+    # Pesos 1, 2, 3, 4: Σw = 10, Σw² = 30; 'S' nas linhas de peso 1 e 2 (Σw = 3, Σw² = 5)
+    store = SurveyStore.from_dataframe(pd.DataFrame({'q': ['S', 'S', 'N', '.'], 'peso': [1.0, 2.0, 3.0, 4.0]}))
+    tabela = weighted_frequencies(store.view(), ['q'])
+
+    # Base: todas as linhas. p = 0,3; Var = [5 × 0,7² + 25 × 0,3²] / 10²
+    sobre_total = weighted_shares_erros(tabela, ['S']).loc['q']
+    erro = math.sqrt((5 * 0.7 ** 2 + 25 * 0.3 ** 2) / 100) * 100
+    assert sobre_total['percentual'] == pytest.approx(30.0)
+    assert sobre_total['erro_padrao'] == pytest.approx(erro)
+    assert sobre_total['ic_inferior'] == 0.0   # limitado a 0%
+    assert sobre_total['ic_superior'] == pytest.approx(30.0 + Z_95 * erro)
+    assert sobre_total['n_efetivo'] == pytest.approx(10 ** 2 / 30)
+
+    # Base: respostas 'S' e 'N' (Σw = 6, Σw² = 14). p = 0,5; Var = [5 × 0,5² + 9 × 0,5²] / 6²
+    sobre_validos = weighted_shares_erros(tabela, ['S'], base=['S', 'N']).loc['q']
+    assert sobre_validos['percentual'] == pytest.approx(50.0)
+    assert sobre_validos['erro_padrao'] == pytest.approx(math.sqrt(14 * 0.25 / 36) * 100)
+    assert sobre_validos['n_efetivo'] == pytest.approx(6 ** 2 / 14)
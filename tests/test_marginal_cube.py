@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from frequencies import somar_colunas
+from marginal_cube import MarginalCube
+from survey_store import SurveyStore
+
+
+def criar_store(n=1500):
+    rng = np.random.default_rng(13)
+    df = pd.DataFrame({
+        'região': rng.choice(['A', 'B', 'C'], n),
+        'sexo': rng.choice(['F', 'M'], n),
+        'voto': rng.choice(['x', 'y', 'z', '.', None], n),
+        'religião': rng.choice(['católica', 'evangélica', None], n),
+        'peso': rng.uniform(0.5, 2.0, n),
+    })
+    return SurveyStore.from_dataframe(df)
+
+
+@pytest.mark.parametrize('filtros', [
+    {},
+    {'região': ['B'], 'sexo': []},
+    {'região': ['A', 'C']},
+    {'sexo': ['M']},
+])
+def test_estado_do_cubo_igual_a_soma_sobre_as_linhas(filtros):
+    store = criar_store()
+    colunas = ['voto', 'religião']
+    cubo = MarginalCube(store, colunas, ['região', 'sexo'])
+
+    estado = cubo.estado(filtros)
+
+    mascara = np.ones(len(store), dtype=bool)
+    for dimensao, valores in filtros.items():
+        if valores:
+            mascara &= np.isin(store.codigos(dimensao), store.codificar(dimensao, valores))
+    linhas = np.flatnonzero(mascara)
+    _, deslocamentos, somas, contagens, quadrados = somar_colunas(store.view(linhas), colunas)
+    for i, coluna in enumerate(colunas):
+        fatia = slice(deslocamentos[i], deslocamentos[i + 1])
+        no_cubo = estado.somar(coluna)
+        np.testing.assert_allclose(no_cubo[0], somas[fatia])
+        np.testing.assert_array_equal(no_cubo[1], contagens[fatia])
+        np.testing.assert_allclose(no_cubo[2], quadrados[fatia])
+    pesos = store.pesos('peso')[linhas]
+    assert estado.peso_total() == pytest.approx(pesos.sum())
+    assert estado.peso_quadrado_total() == pytest.approx((pesos ** 2).sum())
+
+
+def test_estado_fora_do_cubo_volta_para_os_dados():
+    cubo = MarginalCube(criar_store(), ['voto'], ['região', 'sexo'])
+
+    assert cubo.estado({'região': ['A'], 'sexo': ['F']}) is None
+    assert cubo.estado({'região': ['D']}) is None
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+from frequencies import somar_colunas
+from replicate_weights import ReplicateWeights
+from survey_store import SurveyStore
+
+
+def criar_store(n=300):
+    rng = np.random.default_rng(17)
+    return SurveyStore.from_dataframe(pd.DataFrame({
+        'voto': rng.choice(['A', 'B', 'C', '.', None], n),
+        'peso': rng.uniform(0.5, 2.0, n),
+    }))
+
+
+def test_replicas_com_a_mesma_semente_sao_iguais():
+    store = criar_store()
+
+    replicas = ReplicateWeights(store, replicas=50, seed=1)
+
+    assert replicas.pesos.shape == (50, len(store))
+    assert replicas.pesos.dtype == np.float32
+    np.testing.assert_array_equal(replicas.pesos, ReplicateWeights(store, replicas=50, seed=1).pesos)
+    assert not np.array_equal(replicas.pesos, ReplicateWeights(store, replicas=50, seed=2).pesos)
+    # Cada réplica sorteia N linhas com reposição
+    vezes = replicas.pesos / store.pesos('peso')
+    np.testing.assert_allclose(vezes.sum(axis=1), len(store), rtol=1e-5)
+    np.testing.assert_allclose(vezes, np.round(vezes), atol=1e-4)
+
+
+def test_somas_com_multiplicidades_unitarias_sao_os_totais_ponderados():
+    store = criar_store()
+    replicas = ReplicateWeights(store, replicas=4, workers=2)
+    replicas.pesos = np.tile(store.pesos('peso').astype(np.float32), (4, 1))
+    linhas = np.flatnonzero(np.arange(len(store)) % 3 != 0)
+    view = store.view(linhas)
+
+    somas, totais = replicas.somas(view, 'voto')
+
+    _, _, esperadas, _, _ = somar_colunas(view, ['voto'])
+    np.testing.assert_allclose(somas, np.tile(esperadas, (4, 1)), rtol=1e-5)
+    np.testing.assert_allclose(totais, store.pesos('peso')[linhas].sum(), rtol=1e-5)
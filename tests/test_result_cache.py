@@ -0,0 +1,65 @@
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import pytest
+from dash import dcc, html
+
+from result_cache import FileBackend, ResultCache
+from single_flight import SingleFlight
+
+
+def test_set_sem_backend_nao_serializa():
+    cache = ResultCache()
+    tabela = pd.DataFrame({'percentual': np.arange(10.0)}, index=[f'categoria {i}' for i in range(10)])
+
+    cache.set('tabela', tabela)
+    cache.set('nao_serializavel', {'trava': threading.Lock()})
+
+    assert cache.get('nao_serializavel')[0]
+    assert cache.stats()['bytes'] >= tabela.size * 8
+
+
+def test_set_sem_backend_mede_componentes_e_indices_de_texto():
+    rotulos = [f'categoria de resposta número {i}' for i in range(200)]
+    figura = go.Figure(go.Bar(x=rotulos, y=np.arange(200.0)))
+    cache = ResultCache()
+
+    cache.set('card', html.Div([html.H3('Título'), dcc.Graph(figure=figura)]))
+    bytes_card = cache.stats()['bytes']
+    cache.set('serie', pd.Series(np.arange(200.0), index=rotulos))
+    bytes_serie = cache.stats()['bytes'] - bytes_card
+
+    texto = sum(len(rotulo) for rotulo in rotulos)
+    assert bytes_card >= texto + 200 * 8
+    assert bytes_serie >= texto + 200 * 8
+
+
+def test_consulta_depois_da_trava_nao_conta_outro_miss(tmp_path):
+    fcntl = pytest.importorskip('fcntl')
+    diretorio = str(tmp_path / 'cache')
+    cache = ResultCache(backend=FileBackend(diretorio, 1 << 20), coalescer=SingleFlight(str(tmp_path / 'travas')))
+    outro_worker = ResultCache(backend=FileBackend(diretorio, 1 << 20))
+
+    # Outro worker está calculando a chave: segura a trava entre processos
+    caminho_trava = str(tmp_path / 'travas' / 'chave.lock')
+    descritor = os.open(caminho_trava, os.O_RDWR | os.O_CREAT, 0o644)
+    fcntl.flock(descritor, fcntl.LOCK_EX)
+    resultado = []
+    thread = threading.Thread(target=lambda: resultado.append(
+        cache.get_or_compute('chave', lambda: 'calculado aqui')))
+    thread.start()
+    while cache.coalescer.stats()['esperas_processos'] == 0:
+        time.sleep(0.01)
+
+    outro_worker.set('chave', 'calculado pelo outro worker')
+    os.remove(caminho_trava)
+    os.close(descritor)
+    thread.join()
+
+    assert resultado == ['calculado pelo outro worker']
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses']) == (0, 1)
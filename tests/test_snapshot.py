@@ -0,0 +1,33 @@
+import os
+
+from snapshot import _remover_antigos
+
+SHA_ANTIGO = '0123456789abcdef'
+SHA_ATUAL = 'fedcba9876543210'
+
+
+def test_remover_antigos_so_da_mesma_selecao_de_colunas(tmp_path):
+    nomes = [
+        f'onda-{SHA_ANTIGO}-1a2b3c4d',     # mesmo CSV e mesma seleção: antigo
+        f'onda-{SHA_ATUAL}-1a2b3c4d',      # atual
+        f'onda-{SHA_ANTIGO}',              # mesmo CSV, todas as colunas
+        f'onda-{SHA_ANTIGO}-99999999',     # mesmo CSV, outra seleção
+        f'onda-2-{SHA_ANTIGO}-1a2b3c4d',   # outro CSV com o mesmo prefixo
+        'cubo-0123',
+    ]
+    for nome in nomes:
+        os.mkdir(tmp_path / nome)
+
+    _remover_antigos(tmp_path, 'onda', '-1a2b3c4d', f'onda-{SHA_ATUAL}-1a2b3c4d')
+
+    assert sorted(os.listdir(tmp_path)) == sorted(nomes[1:])
+
+
+def test_remover_antigos_sem_selecao_mantem_selecoes(tmp_path):
+    nomes = [f'onda-{SHA_ANTIGO}', f'onda-{SHA_ATUAL}', f'onda-{SHA_ANTIGO}-1a2b3c4d']
+    for nome in nomes:
+        os.mkdir(tmp_path / nome)
+
+    _remover_antigos(tmp_path, 'onda', '', f'onda-{SHA_ATUAL}')
+
+    assert sorted(os.listdir(tmp_path)) == sorted(nomes[1:])
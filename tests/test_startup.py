@@ -0,0 +1,25 @@
+import os
+
+from startup import caminho_artefato_layout, gravar_artefato_layout, ler_artefato_layout
+
+
+def test_artefato_do_layout_muda_com_o_codigo_e_a_configuracao(tmp_path):
+    csv = tmp_path / 'dados.csv'
+    csv.write_text('a;peso\n1;1\n')
+    codigo = tmp_path / 'app.py'
+    codigo.write_text('x = 1\n')
+    diretorio = str(tmp_path / 'snapshot')
+
+    def caminho(configuracao=None):
+        return caminho_artefato_layout(diretorio, str(csv), ['a'], ['a'], arquivos=[str(codigo)],
+                                       configuracao=configuracao)
+
+    original = caminho()
+    gravar_artefato_layout(original, {'versao': 'v1', 'cascas': {'tab-a': {'type': 'Div'}}})
+
+    assert ler_artefato_layout(original)['cascas'] == {'tab-a': {'type': 'Div'}}
+    assert caminho(['tab-a']) != original
+    codigo.write_text('x = 2\n')
+    os.utime(codigo, (1, 1))
+    assert caminho() != original
+    assert caminho_artefato_layout(None, str(csv), ['a'], ['a']) is None
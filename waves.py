@@ -0,0 +1,130 @@
+# Registro de ondas da pesquisa: arquivos CSV com o mesmo esquema de
+# grupos_colunas.json, carregados (via snapshot) só no primeiro uso e
+# descartados por LRU quando a soma dos dados em memória passa do orçamento.
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from filter_index import FilterIndex
+from snapshot import carregar_dados
+
+
+class WaveRegistry:
+    def __init__(self, orcamento_bytes=256 * 1024 * 1024, dimensoes=(), raiz_snapshot=None, mmap=False,
+                 colunas_cubo=None, colunas=None):
+        self.orcamento_bytes = orcamento_bytes
+        self.dimensoes = list(dimensoes)
+        self.colunas = colunas
+        self.colunas_cubo = colunas_cubo
+        self.raiz_snapshot = raiz_snapshot
+        self.mmap = mmap
+        self._caminhos = {}                 # nome -> caminho do CSV
+        self._assinaturas = {}              # nome -> (tamanho, mtime) no registro
+        self._fixas = {}                    # nome -> (store, índice), nunca descartadas
+        self._tardias = {}                  # nome -> carregar() -> (store, índice), fixada no primeiro uso
+        self._carregadas = OrderedDict()    # nome -> (store, índice), em ordem de uso
+        self._lock = threading.Lock()
+        self.carregamentos = 0
+        self.descartes = 0
+
+    # Cria o registro com todos os CSVs de um diretório (uma onda por arquivo)
+    @classmethod
+    def from_diretorio(cls, diretorio, **kwargs):
+        registro = cls(raiz_snapshot=os.path.join(diretorio, '.snapshot'), **kwargs)
+        if os.path.isdir(diretorio):
+            for arquivo in sorted(os.listdir(diretorio)):
+                if arquivo.endswith('.csv'):
+                    registro.registrar(os.path.splitext(arquivo)[0], os.path.join(diretorio, arquivo))
+        return registro
+
+    def registrar(self, nome, caminho):
+        info = os.stat(caminho)
+        self._caminhos[nome] = caminho
+        self._assinaturas[nome] = (info.st_size, info.st_mtime)
+
+    # Registra uma onda já carregada (por exemplo, os dados principais)
+    def fixar(self, nome, store, indice=None):
+        self._fixas[nome] = (store, indice or FilterIndex(store, self.dimensoes, self.colunas_cubo))
+        self._assinaturas[nome] = store.versao
+
+    # Registra uma onda fixa carregada só no primeiro uso: `versao` identifica
+    # o conteúdo sem carregá-lo e `carregar()` -> (store, índice)
+    def fixar_tardia(self, nome, versao, carregar):
+        self._tardias[nome] = carregar
+        self._assinaturas[nome] = versao
+
+    def nomes(self):
+        return list(dict.fromkeys(list(self._caminhos) + list(self._fixas) + list(self._tardias)))
+
+    # Identifica o conteúdo registrado de uma onda sem carregá-la
+    def assinatura(self, nome):
+        return f'{nome}:{self._assinaturas[nome]}'
+
+    # Identifica o conjunto de ondas registradas (entra nas chaves de cache)
+    @property
+    def versao(self):
+        texto = '|'.join(self.assinatura(nome) for nome in self.nomes())
+        return hashlib.sha1(texto.encode('utf-8')).hexdigest()[:16]
+
+    def _entrada(self, nome):
+        if nome in self._fixas:
+            return self._fixas[nome]
+        if nome in self._tardias:
+            with self._lock:
+                if nome not in self._fixas:
+                    self._fixas[nome] = self._tardias[nome]()
+                    self.carregamentos += 1
+            return self._fixas[nome]
+        with self._lock:
+            if nome in self._carregadas:
+                self._carregadas.move_to_end(nome)
+                return self._carregadas[nome]
+
+        store = carregar_dados(self._caminhos[nome], raiz=self.raiz_snapshot, mmap=self.mmap, colunas=self.colunas)
+        entrada = (store, FilterIndex(store, self.dimensoes, self.colunas_cubo, diretorio_cubo=self.raiz_snapshot,
+                                      mmap=self.mmap))
+        with self._lock:
+            self._carregadas[nome] = entrada
+            self.carregamentos += 1
+            self._respeitar_orcamento(manter=nome)
+        return entrada
+
+    # Descarta as ondas menos usadas até caber no orçamento de memória
+    def _respeitar_orcamento(self, manter):
+        while self._bytes_carregados() > self.orcamento_bytes and len(self._carregadas) > 1:
+            nome = next(iter(self._carregadas))
+            if nome == manter:
+                break
+            del self._carregadas[nome]
+            self.descartes += 1
+
+    def _bytes_carregados(self):
+        return sum(store.nbytes() + indice.nbytes() for store, indice in self._carregadas.values())
+
+    # Dados de uma onda (carregados no primeiro uso)
+    def obter(self, nome):
+        return self._entrada(nome)[0]
+
+    # (store, índice) de uma onda já carregada, ou None, sem carregá-la
+    def carregada(self, nome):
+        with self._lock:
+            return self._fixas.get(nome) or self._carregadas.get(nome)
+
+    # Índice de filtros da onda a que pertence o armazenamento (None se não registrado)
+    def indice_de(self, store):
+        for entrada in list(self._fixas.values()) + list(self._carregadas.values()):
+            if entrada[0] is store:
+                return entrada[1]
+        return None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'ondas': self.nomes(),
+                'carregadas': list(self._fixas) + list(self._carregadas),
+                'bytes_carregados': self._bytes_carregados(),
+                'orcamento_bytes': self.orcamento_bytes,
+                'carregamentos': self.carregamentos,
+                'descartes': self.descartes,
+            }